@@ -66,3 +66,18 @@ datafile_ext = ".txt"
 #########################################
 # PROJECT-SPECIFIC VARS
 #########################################
+spectrum_resolution = 1.0 # angular distance (in degrees) between wheel hues
+idle_wake_ms = 0 # max sleep (in ms) between input checks during trials (0 = busy-wait; sleeping delays RTs by up to this plus OS wake-up latency)
+gaze_break_ms = 10 # time (in ms) gaze must stay outside fixation to count as a break
+log_gaze_samples = True # write every gaze sample recorded during each trial to the database
+db_queue_size = 1000 # max number of pending background database writes
+pupil_ramp_duration = 4.25 # duration (in sec) of pupil calibration luminance ramps
+text_cache_size = 50 # max number of rendered messages to keep in memory
+dirty_rect_updates = False # only redraw the cue/probe regions at probe onset/offset
+defer_gc = True # disable garbage collection during trials, collecting between trials instead
+profile_startup = False # print how long each phase of startup takes (or set CWE_PROFILE_STARTUP=1)
+record_sessions = False # log the inputs of each session to ExpAssets/Data/sessions for replaying with scripts/replay.py
+adaptive_drift_correct = False # skip drift correction before trials while recent gaze error stays low
+drift_skip_threshold = 0.5 # max fixation error (in degrees) on recent trials for skipping drift correction
+drift_skip_window = 5 # number of trials since the last drift correction that must be under the threshold
+drift_max_skips = 20 # max number of trials in a row to skip drift correction for
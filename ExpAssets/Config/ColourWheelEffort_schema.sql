@@ -71,3 +71,112 @@ CREATE TABLE trials (
 	trial_err text not null        /* the type of error (if any) that occurred */
 );
 
+CREATE TABLE trial_timing (
+	id integer primary key autoincrement not null,
+	participant_id integer not null references participants(id),
+	block_num integer not null,
+	trial_num integer not null,
+	event text not null,            /* the stimulus event being timed */
+	relative_to text not null,      /* the event the interval is measured from */
+	requested_ms float not null,    /* requested interval between events (in ms) */
+	measured_ms float not null,     /* measured interval between flips (in ms) */
+	requested_frames integer not null, /* requested interval (in frames) */
+	measured_frames float not null  /* measured interval (in frames) */
+);
+
+CREATE TABLE gaze_samples (
+	id integer primary key autoincrement not null,
+	participant_id integer not null references participants(id),
+	block_num integer not null,
+	trial_num integer not null,
+	time float not null,            /* tracker timestamp of the sample (in ms) */
+	x float,                        /* horizontal gaze position (in px), null if missing */
+	y float,                        /* vertical gaze position (in px), null if missing */
+	pupil float,                    /* pupil size (in tracker units), null if missing */
+	in_bounds boolean not null      /* whether the sample was within the fixation boundary */
+);
+
+CREATE TABLE pupil_range (
+	id integer primary key autoincrement not null,
+	participant_id integer not null references participants(id),
+	n integer not null,             /* number of valid pupil samples during calibration */
+	mean float,                     /* mean pupil size (in tracker units) */
+	min float,                      /* smallest pupil size */
+	max float,                      /* largest pupil size */
+	p05 float,                      /* 5th percentile pupil size */
+	median float,                   /* median pupil size */
+	p95 float                       /* 95th percentile pupil size */
+);
+
+CREATE TABLE pupil_luminance (
+	id integer primary key autoincrement not null,
+	participant_id integer not null references participants(id),
+	phase text not null,            /* calibration phase (START, INCREASE, MAXIMUM, etc.) */
+	luminance integer not null,     /* grey level of the screen (0 = black, 255 = white) */
+	n integer not null,             /* number of valid pupil samples at this step */
+	mean float,
+	min float,
+	max float,
+	p05 float,
+	median float,
+	p95 float
+);
+
+CREATE TABLE luminance_log (
+	id integer primary key autoincrement not null,
+	participant_id integer not null references participants(id),
+	phase text not null,            /* calibration ramp (INCREASE or DECREASE) */
+	frame integer not null,         /* frame of the ramp the level was scheduled for */
+	luminance integer not null,     /* grey level presented (0 = black, 255 = white) */
+	flip_time float not null        /* time of the flip (in ms) since the start of the ramp */
+);
+
+CREATE TABLE trial_plan (
+	id integer primary key autoincrement not null,
+	participant_id integer not null references participants(id),
+	block_num integer not null,
+	trial_num integer not null,
+	seed text not null,              /* seed of the block's trial planner */
+	plan_index integer not null,     /* index of the trial in the block's plan */
+	wheel_rotation integer not null, /* rotation (in degrees) of the colour wheel */
+	probe_angle float not null,      /* angle of the probe colour on the unrotated wheel */
+	probe_onset integer not null     /* planned cue-probe interval (in ms) */
+);
+
+CREATE TABLE trial_memory (
+	id integer primary key autoincrement not null,
+	participant_id integer not null references participants(id),
+	block_num integer not null,
+	trial_num integer not null,
+	alloc_blocks integer not null,   /* net change in allocated memory blocks over the trial */
+	gc_collections integer not null, /* number of garbage collections during the trial */
+	gc_deferred boolean not null     /* whether garbage collection was deferred during the trial */
+);
+
+CREATE TABLE trial_events (
+	id integer primary key autoincrement not null,
+	participant_id integer not null references participants(id),
+	block_num integer not null,
+	trial_num integer not null,
+	label text not null,         /* stimulus event (e.g. cue_on) marked in the EDF */
+	flip_time float not null,    /* time of the event's flip (in ms) since the start of the trial */
+	offset integer not null      /* how far (in ms) the event's EDF message was backdated */
+);
+
+CREATE TABLE trial_prep_timing (
+	id integer primary key autoincrement not null,
+	participant_id integer not null references participants(id),
+	block_num integer not null,
+	trial_num integer not null,
+	plan float not null,             /* ms to get the trial's plan and recolour the probe */
+	wheel_render float not null,     /* ms to render the colour wheel */
+	stim_render float not null,      /* ms to recolour the fixation and cue stimuli */
+	tickets float not null,          /* ms to register the trial's event tickets */
+	data_writes float not null,      /* ms to queue the trial's timing requests and plan */
+	break_msg float not null,        /* ms spent on a break message (0 if none) */
+	drift_correct float not null,    /* ms spent on drift correction (0 if skipped) */
+	drift_outcome text not null,     /* whether drift correction was done or skipped */
+	gaze_error float,                /* largest fixation error (in degrees) over recent trials */
+	prep_total float not null,       /* ms for all of trial_prep */
+	iti float                        /* ms from the end of the last trial to fixation onset */
+);
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import re
+from collections import deque
+
+import numpy as np
+
+TRIAL_MSG = re.compile(r"^(trial_start|cue_on|probe_on|probe_off|wheel_on) b(\d+) t(\d+)$")
+BASELINE_MSG = re.compile(r"^PUPIL_BASELINE (\w+)$")
+OFFSET_MSG = re.compile(r"^(-?\d+) (.*)$")
+
+
+def iter_asc(path):
+    """Lazily parses the samples and messages of an EyeLink ASC file.
+
+    The file is read one line at a time, so memory use doesn't depend on the
+    size of the recording. For binocular recordings, only the first recorded
+    eye is used. Messages starting with an integer offset (e.g. '12 cue_on
+    b1 t5') are backdated by that many ms, so their times are those of the
+    events they mark rather than when they were received.
+
+    Args:
+        path (str): The path of the ASC file to parse.
+
+    Yields:
+        tuple: ('sample', time, pupil) for each sample (with NaN for missing
+        pupil data), ('msg', time, text) for each message, and
+        ('rate', None, hz) whenever a new sampling rate is reported.
+
+    """
+    with open(path, "r", errors="replace") as f:
+        for line in f:
+            c = line[:1]
+            if c.isdigit():
+                fields = line.split()
+                try:
+                    pupil = float(fields[3])
+                except (IndexError, ValueError):
+                    pupil = 0.0
+                yield ("sample", int(fields[0]), pupil if pupil > 0 else np.nan)
+            elif c == "M" and line.startswith("MSG"):
+                parts = line.rstrip().split(None, 2)
+                if len(parts) == 3:
+                    t, text = int(parts[1]), parts[2]
+                    offset = OFFSET_MSG.match(text)
+                    if offset:
+                        t -= int(offset.group(1))
+                        text = offset.group(2)
+                    yield ("msg", t, text)
+            elif c == "S" and line.startswith("SAMPLES"):
+                fields = line.split()
+                if "RATE" in fields:
+                    yield ("rate", None, float(fields[fields.index("RATE") + 1]))
+
+
+class _Epoch(object):
+
+    def __init__(self, block, trial, onset, start, n_samples, dt):
+        self.block = block
+        self.trial = trial
+        self.onset = onset
+        self.start = start
+        self.end = start + n_samples * dt
+        self.dt = dt
+        self.data = np.full(n_samples, np.nan, dtype=np.float32)
+        self.cutoff = None
+
+    def add(self, t, pupil):
+        i = int(round((t - self.start) / self.dt))
+        if 0 <= i < len(self.data):
+            self.data[i] = pupil
+
+
+def epoch_asc(path, align="cue_on", pre=1000, post=1500, truncate="probe_on",
+              max_delay=10000):
+    """Cuts pupil epochs around a trial marker from an ASC file in one pass.
+
+    Epochs are taken from ``pre`` ms before to ``post`` ms after each trial's
+    alignment marker (e.g. 'cue_on b1 t5'). If ``truncate`` is given, samples
+    at or after that trial's ``truncate`` marker are left as NaN, so that
+    epochs only contain pre-target data.
+
+    Since trial markers are sent to the tracker in batches and backdated to
+    their flip times, they can appear in the file after samples that follow
+    them. Samples are kept for ``max_delay`` ms so that epochs can still be
+    cut around markers that arrive late.
+
+    Mean, minimum, and maximum pupil sizes are also computed for each phase of
+    the pupil baseline calibration (PUPIL_BASELINE START/INCREASE/...).
+
+    Args:
+        path (str): The path of the ASC file to parse.
+        align (str, optional): The marker to align epochs to. Defaults to
+            'cue_on'.
+        pre (int, optional): The duration of the epoch before the alignment
+            marker (in ms). Defaults to 1000.
+        post (int, optional): The duration of the epoch after the alignment
+            marker (in ms). Defaults to 1500.
+        truncate (str, optional): The marker at which to stop each epoch.
+            Defaults to 'probe_on'.
+        max_delay (int, optional): The longest a marker can arrive after
+            the event it marks (in ms). Defaults to 10000.
+
+    Returns:
+        tuple: An (n_epochs, n_samples) float32 array of pupil data, a list of
+        (block, trial, onset time, truncation time) tuples for each epoch,
+        and a dict of (mean, min, max) pupil sizes for each baseline phase.
+
+    """
+    rate = 1000.0
+    dt = 1000.0 / rate
+    history = deque(maxlen=int((pre + max_delay) / dt) + 1)
+    open_epochs = []
+    epochs = []
+    by_trial = {}
+    last_t = None
+    baseline = {}
+    phase = None
+
+    for kind, t, value in iter_asc(path):
+        if kind == "sample":
+            history.append((t, value))
+            last_t = t
+            for ep in open_epochs:
+                if ep.cutoff is None or t < ep.cutoff:
+                    ep.add(t, value)
+            if open_epochs and t >= open_epochs[0].end:
+                epochs += [ep for ep in open_epochs if t >= ep.end]
+                open_epochs = [ep for ep in open_epochs if t < ep.end]
+            if phase and not np.isnan(value):
+                stats = baseline[phase]
+                stats[0] += value
+                stats[1] += 1
+                stats[2] = min(stats[2], value)
+                stats[3] = max(stats[3], value)
+
+        elif kind == "msg":
+            trial_msg = TRIAL_MSG.match(value)
+            if trial_msg:
+                marker, block, trial = trial_msg.groups()
+                block, trial = int(block), int(trial)
+                if marker == align:
+                    n_samples = int(round((pre + post) / dt))
+                    ep = _Epoch(block, trial, t, t - pre, n_samples, dt)
+                    for ht, hp in history:
+                        ep.add(ht, hp)
+                    by_trial[(block, trial)] = ep
+                    if last_t is not None and last_t >= ep.end:
+                        # Marker arrived after the whole epoch was recorded
+                        epochs.append(ep)
+                    else:
+                        open_epochs.append(ep)
+                        open_epochs.sort(key=lambda e: e.end)
+                elif marker == truncate:
+                    ep = by_trial.get((block, trial))
+                    if ep is not None:
+                        ep.cutoff = t
+                        ep.data[max(0, int(round((t - ep.start) / dt))):] = np.nan
+                continue
+            baseline_msg = BASELINE_MSG.match(value)
+            if baseline_msg:
+                phase = baseline_msg.group(1)
+                if phase == "END":
+                    phase = None
+                else:
+                    baseline[phase] = [0.0, 0, np.inf, -np.inf]
+
+        elif kind == "rate":
+            rate = value
+            dt = 1000.0 / rate
+            history = deque(history, maxlen=int((pre + max_delay) / dt) + 1)
+
+    epochs += open_epochs
+    data = np.stack([ep.data for ep in epochs]) if epochs else np.empty((0, 0), np.float32)
+    info = [(ep.block, ep.trial, ep.onset, ep.cutoff) for ep in epochs]
+    baseline_stats = {
+        p: (s[0] / s[1] if s[1] else np.nan, s[2], s[3]) for p, s in baseline.items()
+    }
+    return data, info, baseline_stats
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """A size-bounded key/value cache that evicts the least-recently used item.
+
+    Args:
+        max_items (int): The maximum number of items to keep in the cache.
+
+    """
+    def __init__(self, max_items):
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def get(self, key):
+        """Retrieves an item from the cache, returning None if not present.
+        """
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        """Adds an item to the cache, evicting the oldest item if full.
+        """
+        self._items[key] = value
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_items:
+            self._items.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._items.clear()
+
+    @property
+    def stats(self):
+        """dict: The current size and hit/miss/eviction counts for the cache.
+        """
+        return {
+            'size': len(self._items),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+        }
+
+
+class TextCache(LRUCache):
+    """An LRU cache of rendered text surfaces.
+
+    Text is keyed by its content, style, and alignment, and is rendered on
+    demand with the provided render function when not already cached.
+    Strings that are known in advance can be rendered ahead of time with
+    :meth:`prefill` so that they can be shown without any layout delay.
+
+    Args:
+        render_func (callable): A function that takes a string, a text style
+            name (or None for the default style), and an alignment, and
+            returns the rendered text.
+        max_items (int): The maximum number of rendered strings to keep in
+            the cache.
+
+    """
+    def __init__(self, render_func, max_items):
+        super(TextCache, self).__init__(max_items)
+        self._render = render_func
+
+    def text(self, text, style=None, align="left"):
+        """Retrieves a rendered string from the cache, rendering it if needed.
+
+        Args:
+            text (str): The text to render.
+            style (str, optional): The name of the text style to use. Defaults
+                to the default style.
+            align (str, optional): The alignment of multi-line text. Defaults
+                to 'left'.
+
+        Returns:
+            The rendered text.
+
+        """
+        key = (text, style, align)
+        rendered = self.get(key)
+        if rendered is None:
+            rendered = self._render(text, style, align)
+            self.put(key, rendered)
+        return rendered
+
+    def prefill(self, strings):
+        """Renders a list of (text, style, align) tuples into the cache.
+        """
+        for text, style, align in strings:
+            key = (text, style, align)
+            if key not in self._items:
+                self.put(key, self._render(text, style, align))
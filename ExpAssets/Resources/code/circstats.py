@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import numpy as np
+
+TWO_PI = 2 * np.pi
+
+# Upper limit for fitted concentrations (keeps I0(kappa) well within float range)
+MAX_KAPPA = 500.0
+
+
+def wrap(angles):
+    """Wraps angles (in radians) to the range [-pi, pi).
+    """
+    return (np.asarray(angles) + np.pi) % TWO_PI - np.pi
+
+
+def a1inv(r):
+    """Gets the von Mises concentration (kappa) for a mean resultant length.
+
+    Uses the piecewise approximation from Fisher (1993), and works on arrays
+    of any shape.
+    """
+    r = np.clip(np.asarray(r, dtype=np.float64), 1e-9, 1 - 1e-9)
+    k = np.where(
+        r < 0.53, 2 * r + r ** 3 + 5 * r ** 5 / 6,
+        np.where(r < 0.85, -0.4 + 1.39 * r + 0.43 / (1 - r), 1 / (r ** 3 - 4 * r ** 2 + 3 * r))
+    )
+    return np.minimum(k, MAX_KAPPA)
+
+
+def vonmises_pdf(x, kappa):
+    """Gets the density of a zero-centred von Mises distribution.
+
+    Args:
+        x (:obj:`numpy.ndarray`): The angles (in radians) to get densities for.
+        kappa (float or :obj:`numpy.ndarray`): The concentration of the
+            distribution, broadcastable against ``x``.
+
+    """
+    return np.exp(kappa * np.cos(x)) / (TWO_PI * np.i0(kappa))
+
+
+def fit_mixture(errors, max_iter=500, tol=1e-6):
+    """Fits a von Mises + uniform mixture model to response errors.
+
+    The model is the one from Zhang & Luck (2008): responses are either drawn
+    from a von Mises distribution centred on the target (with concentration
+    kappa), or are random guesses drawn from a uniform distribution (with
+    probability g). Parameters are fit by maximum likelihood using
+    expectation-maximization.
+
+    Fits are vectorized over all leading dimensions of ``errors``, so a whole
+    set of bootstrap resamples can be fit at once by passing a 2D array with
+    one resample per row.
+
+    Args:
+        errors (:obj:`numpy.ndarray`): Response errors (in radians), with the
+            responses for each fit along the last axis.
+        max_iter (int, optional): The maximum number of EM iterations.
+        tol (float, optional): The change in parameters at which a fit is
+            considered converged.
+
+    Returns:
+        dict: The guess rate ('g'), concentration ('kappa'), circular SD of
+        the von Mises component in radians ('sd'), and log-likelihood ('ll')
+        of each fit.
+
+    """
+    x = wrap(errors)
+    cos_x = np.cos(x)
+    shape = x.shape[:-1]
+
+    # Start from the mean resultant length of all responses
+    r = np.clip(np.abs(np.mean(np.exp(1j * x), axis=-1)), 0.05, 0.95)
+    kappa = a1inv(r)
+    g = np.full(shape, 0.5)
+    for i in range(max_iter):
+        # E-step: get the probability of each response not being a guess
+        vm = (1 - g)[..., None] * vonmises_pdf(x, kappa[..., None])
+        w = vm / (vm + (g / TWO_PI)[..., None])
+        # M-step: update the guess rate and the concentration
+        w_sum = np.maximum(np.sum(w, axis=-1), 1e-12)
+        new_g = 1 - w_sum / x.shape[-1]
+        r = np.clip(np.sum(w * cos_x, axis=-1) / w_sum, 0.0, None)
+        new_kappa = a1inv(r)
+        done = np.all(np.abs(new_g - g) < tol) and np.all(np.abs(new_kappa - kappa) < tol * 100)
+        g, kappa = new_g, new_kappa
+        if done:
+            break
+
+    vm = (1 - g)[..., None] * vonmises_pdf(x, kappa[..., None])
+    ll = np.sum(np.log(vm + (g / TWO_PI)[..., None]), axis=-1)
+    sd = np.sqrt(-2 * np.log(np.clip(r, 1e-9, 1.0)))
+    return {"g": g, "kappa": kappa, "sd": sd, "ll": ll}
+
+
+def bootstrap_mixture(errors, n_boot=1000, alpha=0.05, seed=None):
+    """Gets percentile bootstrap confidence intervals for a mixture model fit.
+
+    Args:
+        errors (:obj:`numpy.ndarray`): A 1D array of response errors (in radians).
+        n_boot (int, optional): The number of bootstrap resamples.
+        alpha (float, optional): The alpha level of the intervals (e.g. 0.05
+            for 95% intervals).
+        seed (int, optional): The seed for the resampling random generator.
+
+    Returns:
+        dict: The (lower, upper) bounds of the interval for each parameter
+        returned by :func:`fit_mixture` (except 'll').
+
+    """
+    errors = np.asarray(errors, dtype=np.float64)
+    rng = np.random.default_rng(seed)
+    samples = errors[rng.integers(0, len(errors), size=(n_boot, len(errors)))]
+    fits = fit_mixture(samples)
+    bounds = [100 * alpha / 2, 100 * (1 - alpha / 2)]
+    return {
+        name: tuple(np.percentile(fits[name], bounds))
+        for name in ("g", "kappa", "sd")
+    }
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import os
+import json
+
+import numpy as np
+
+try:
+    from klibs.KLConstants import TIMEOUT
+except ImportError:
+    TIMEOUT = "TIMEOUT" # KLibs' value, for when it isn't installed
+
+# Text columns in the trials table that hold numbers (or NA/timeout sentinels)
+NUMERIC_TEXT_COLS = ["probe_rt", "wheel_rt", "angle_err", "probe_angle", "response_angle"]
+
+# Columns with a timeout sentinel that get an extra boolean timeout column
+TIMEOUT_COLS = {"probe_rt": "probe_timeout", "wheel_rt": "wheel_timeout"}
+
+TRUE_VALUES = ("1", "true", "t", "yes")
+
+
+def _to_float(values):
+    out = np.empty(len(values), dtype=np.float64)
+    for i, v in enumerate(values):
+        try:
+            out[i] = float(v)
+        except (TypeError, ValueError):
+            out[i] = np.nan
+    return out
+
+
+def is_timeout(value):
+    """Checks whether a value is a timeout sentinel, ignoring case (probe
+    timeouts are recorded as KLibs' 'TIMEOUT' and wheel timeouts as 'timeout').
+    """
+    return isinstance(value, str) and value.lower() == TIMEOUT.lower()
+
+
+def _to_bool(values):
+    return np.array([str(v).lower() in TRUE_VALUES for v in values], dtype=np.bool_)
+
+
+def column_kind(name, decl_type):
+    """Gets the columnar storage kind for a database column.
+
+    Args:
+        name (str): The name of the column.
+        decl_type (str): The declared SQLite type of the column.
+
+    Returns:
+        str: One of 'int', 'float', 'bool', or 'category'.
+
+    """
+    decl_type = decl_type.lower()
+    if name in NUMERIC_TEXT_COLS or decl_type in ("float", "real", "double"):
+        return "float"
+    elif decl_type == "integer":
+        return "int"
+    elif decl_type == "boolean":
+        return "bool"
+    return "category"
+
+
+DTYPES = {"int": "<i8", "float": "<f8", "bool": "|b1", "category": "<i4"}
+
+
+class ColumnStore(object):
+    """A typed, append-only columnar data store backed by raw binary files.
+
+    Each column is stored in its own file in the store's folder, with the
+    column types, categorical levels, and row count kept in a JSON manifest.
+    New rows are appended to the end of each column file, and columns can be
+    read back as memory-mapped NumPy arrays without loading them into memory.
+
+    Numeric columns are stored as floats with NaN for missing values, boolean
+    columns as bools, and text columns as int32 category codes (with -1 for
+    missing values) that index into the column's list of levels.
+
+    Args:
+        path (str): The folder containing (or that will contain) the store.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self._manifest_path = os.path.join(path, "manifest.json")
+        if os.path.isfile(self._manifest_path):
+            with open(self._manifest_path, "r") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"rows": 0, "columns": {}, "order": [], "meta": {}}
+
+    @property
+    def rows(self):
+        return self.manifest["rows"]
+
+    @property
+    def columns(self):
+        return list(self.manifest["order"])
+
+    @property
+    def meta(self):
+        """dict: Arbitrary JSON-serializable metadata stored with the data.
+        """
+        return self.manifest["meta"]
+
+    def _file(self, name):
+        return os.path.join(self.path, name + ".bin")
+
+    def define(self, name, kind):
+        """Adds a new (empty) column of a given kind to the store.
+        """
+        if name in self.manifest["columns"]:
+            return
+        if self.rows > 0:
+            raise ValueError("Cannot add column '{0}' to a non-empty store.".format(name))
+        self.manifest["columns"][name] = {"kind": kind, "levels": []}
+        self.manifest["order"].append(name)
+
+    def append(self, data):
+        """Appends a chunk of rows to the store.
+
+        Args:
+            data (dict): A dict of equal-length lists of raw values for every
+                column in the store.
+
+        """
+        n = len(data[self.columns[0]]) if self.columns else 0
+        if not n:
+            return
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        for name in self.columns:
+            info = self.manifest["columns"][name]
+            values = data[name]
+            if len(values) != n:
+                raise ValueError("Column '{0}' has the wrong number of rows.".format(name))
+            if info["kind"] == "float":
+                arr = _to_float(values)
+            elif info["kind"] == "bool":
+                arr = _to_bool(values)
+            elif info["kind"] == "int":
+                arr = np.array([-1 if v is None else int(v) for v in values])
+            else:
+                levels = info["levels"]
+                lookup = {lvl: i for i, lvl in enumerate(levels)}
+                arr = np.empty(n, dtype=np.int32)
+                for i, v in enumerate(values):
+                    if v is None:
+                        arr[i] = -1
+                        continue
+                    v = str(v)
+                    if v not in lookup:
+                        lookup[v] = len(levels)
+                        levels.append(v)
+                    arr[i] = lookup[v]
+            dtype = np.dtype(DTYPES[info["kind"]])
+            with open(self._file(name), "ab") as f:
+                # Drop any partial writes from an interrupted append
+                f.truncate(self.rows * dtype.itemsize)
+                f.write(arr.astype(dtype).tobytes())
+        self.manifest["rows"] += n
+
+    def save(self):
+        """Writes the store's manifest to disk. Should be called after appending.
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self._manifest_path)
+
+    def column(self, name):
+        """Gets a column from the store as a read-only memory-mapped array.
+
+        Category columns are returned as their integer codes (see
+        :meth:`levels` and :meth:`decode`).
+        """
+        dtype = np.dtype(DTYPES[self.manifest["columns"][name]["kind"]])
+        if self.rows == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._file(name), dtype=dtype, mode="r", shape=(self.rows, ))
+
+    def levels(self, name):
+        """Gets the list of category levels for a category column.
+        """
+        return list(self.manifest["columns"][name]["levels"])
+
+    def decode(self, name):
+        """Gets a category column as an array of strings (None for missing).
+        """
+        levels = np.array(self.levels(name) + [None], dtype=object)
+        return levels[self.column(name)]
+
+    def load(self):
+        """Gets all columns in the store as a dict of memory-mapped arrays.
+        """
+        return {name: self.column(name) for name in self.columns}
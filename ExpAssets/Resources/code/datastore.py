@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import time
+import queue
+import atexit
+import sqlite3
+import threading
+
+
+def _insert_sql(table, columns):
+    return "INSERT INTO {0} ({1}) VALUES ({2})".format(
+        table, ", ".join(columns), ", ".join(["?"] * len(columns))
+    )
+
+
+def insert_rows(conn, table, columns, rows, chunk_size=1000):
+    """Inserts rows into a database table in chunked transactions.
+
+    Args:
+        conn (:obj:`sqlite3.Connection`): The database connection to use.
+        table (str): The name of the table to insert rows into.
+        columns (list): The names of the columns being inserted.
+        rows (list): A list of row tuples, with values in the same order as
+            ``columns``.
+        chunk_size (int, optional): The maximum number of rows to insert per
+            transaction. Defaults to 1000.
+
+    """
+    sql = _insert_sql(table, columns)
+    for i in range(0, len(rows), chunk_size):
+        with conn:
+            conn.executemany(sql, rows[i:i + chunk_size])
+
+
+class AsyncWriter(object):
+    """Writes rows to an SQLite database on a background thread.
+
+    Rows are queued without blocking (unless the queue is full) and written by
+    a worker thread, which batches everything waiting in the queue into a
+    single transaction. The database is switched to WAL mode so that commits
+    don't block readers or require as many fsyncs.
+
+    Each queued write is made within its own savepoint, so if a write fails
+    (e.g. a constraint violation) only its failing rows are lost, not the
+    rest of the batch. The error from a failed write is raised by the next
+    call to :meth:`insert`, :meth:`insert_many`, :meth:`flush`, or
+    :meth:`close`. If the database can't be opened at all, that error is
+    raised by every following call instead.
+
+    Any rows still queued are written when :meth:`close` is called, which is
+    also registered to run automatically when Python exits (e.g. after a
+    crash).
+
+    Args:
+        db_path (str): The path of the SQLite database to write to.
+        max_queue (int, optional): The maximum number of queued writes before
+            :meth:`insert` blocks. Defaults to 1000.
+
+    """
+    def __init__(self, db_path, max_queue=1000):
+        self.db_path = db_path
+        self.rows_queued = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+        self.max_depth = 0
+        self.commits = 0
+        self.commit_time = 0.0
+        self.max_commit_time = 0.0
+        self._error = None
+        self._fatal = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="AsyncWriter")
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def insert(self, table, row):
+        """Queues a single row (as a dict of column/value pairs) for writing.
+        """
+        self.insert_many(table, list(row.keys()), [tuple(row.values())])
+
+    def insert_many(self, table, columns, rows):
+        """Queues multiple rows with the same columns for writing.
+
+        Args:
+            table (str): The name of the table to insert rows into.
+            columns (list): The names of the columns being inserted.
+            rows (list): A list of row tuples, with values in the same order
+                as ``columns``.
+
+        """
+        self._check_error()
+        if not len(rows):
+            return
+        self._queue.put((_insert_sql(table, columns), rows))
+        self.rows_queued += len(rows)
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def flush(self):
+        """Blocks until all queued rows have been written to the database.
+        """
+        self._queue.join()
+        self._check_error()
+
+    def close(self):
+        """Writes any remaining rows and stops the writer thread.
+
+        Raises:
+            RuntimeError: If any queued rows could not be written.
+
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        atexit.unregister(self.close)
+        self._check_error()
+        unwritten = self.rows_queued - self.rows_written - self.rows_failed
+        if unwritten:
+            raise RuntimeError(
+                "{0} queued rows were never written to '{1}'.".format(unwritten, self.db_path)
+            )
+
+    def _check_error(self):
+        if self._fatal:
+            raise self._fatal
+        if self._error:
+            err, self._error = self._error, None
+            raise err
+
+    def _write(self, conn, sql, rows):
+        # Makes a single queued write within a savepoint, falling back to
+        # writing its rows one at a time if it fails so only bad rows are lost.
+        # Returns the number of rows written
+        try:
+            conn.execute("SAVEPOINT write")
+            conn.executemany(sql, rows)
+            conn.execute("RELEASE write")
+            return len(rows)
+        except sqlite3.Error:
+            conn.execute("ROLLBACK TO write")
+            conn.execute("RELEASE write")
+        written = 0
+        for row in rows:
+            try:
+                conn.execute("SAVEPOINT row")
+                conn.execute(sql, row)
+                conn.execute("RELEASE row")
+                written += 1
+            except sqlite3.Error as e:
+                conn.execute("ROLLBACK TO row")
+                conn.execute("RELEASE row")
+                self._error = e
+        return written
+
+    def _run(self):
+        try:
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except Exception as e:
+            # Without a database nothing can be written, so stop accepting
+            # writes (unblocking any waiting on a full queue)
+            self._fatal = e
+            while True:
+                try:
+                    self._queue.get_nowait()
+                    self._queue.task_done()
+                except queue.Empty:
+                    break
+            return
+        running = True
+        while running:
+            # Wait for a write, then grab everything else already in the queue
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            writes = [w for w in batch if w is not None]
+            running = len(writes) == len(batch)
+            n_rows = sum(len(rows) for _, rows in writes)
+            try:
+                start = time.perf_counter()
+                conn.execute("BEGIN")
+                written = sum(self._write(conn, sql, rows) for sql, rows in writes)
+                conn.execute("COMMIT")
+                elapsed = time.perf_counter() - start
+                self.commits += 1
+                self.commit_time += elapsed
+                self.max_commit_time = max(self.max_commit_time, elapsed)
+                self.rows_written += written
+                self.rows_failed += n_rows - written
+            except Exception as e:
+                # The transaction itself failed (e.g. disk full), so none of
+                # the batch was written
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                self.rows_failed += n_rows
+                self._error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        conn.close()
+
+    @property
+    def stats(self):
+        """dict: Queue depth, row counts, and commit latency (in ms) for the writer.
+        """
+        mean = self.commit_time / self.commits if self.commits else 0.0
+        return {
+            'queued': self.rows_queued,
+            'written': self.rows_written,
+            'failed': self.rows_failed,
+            'depth': self._queue.qsize(),
+            'max_depth': self.max_depth,
+            'commits': self.commits,
+            'mean_commit_ms': mean * 1000,
+            'max_commit_ms': self.max_commit_time * 1000,
+        }
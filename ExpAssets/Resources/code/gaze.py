@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import time
+from collections import deque
+
+import numpy as np
+
+# pylink data type codes and missing value (see the EyeLink API docs)
+SAMPLE_TYPE = 200
+MISSING_DATA = -32768.0
+
+
+def read_eyelink_samples(el):
+    """Drains all pending samples from an EyeLink's link data queue.
+
+    Args:
+        el: A connected :class:`pylink.EyeLink` (or KLibs EyeLink) object.
+
+    Returns:
+        list: A list of (time, x, y, pupil) tuples, with missing values as NaN.
+
+    """
+    samples = []
+    while True:
+        dtype = el.getNextData()
+        if not dtype:
+            break
+        if dtype != SAMPLE_TYPE:
+            continue
+        s = el.getFloatData()
+        eye = s.getRightEye() if s.isRightSample() else s.getLeftEye()
+        x, y = eye.getGaze()
+        pupil = eye.getPupilSize()
+        samples.append((s.getTime(), x, y, pupil))
+    return samples
+
+
+def read_mouse_samples(el):
+    """Reads the current simulated gaze position from a TryLink object.
+    """
+    x, y = el.gaze()
+    return [(time.perf_counter() * 1000, x, y, np.nan)]
+
+
+class GazeStream(object):
+    """A buffered reader that checks batches of gaze samples against a fixation
+    boundary.
+
+    Each call to :meth:`poll` pulls every sample that has arrived since the
+    last call and tests them all against the fixation circle at once. Gaze is
+    considered to have left fixation once valid samples have been outside the
+    circle continuously for at least ``break_ms``. Blinks and other missing
+    samples end any run of out-of-bounds samples.
+
+    Args:
+        reader (callable): A function that returns a list of new
+            (time, x, y, pupil) samples, with times in ms.
+        center (tuple): The (x, y) pixel coordinates of the fixation circle.
+        radius (float): The radius of the fixation circle (in pixels).
+        break_ms (float, optional): How long gaze needs to stay outside the
+            fixation circle to count as a fixation break. Defaults to 0.
+
+    """
+    def __init__(self, reader, center, radius, break_ms=0):
+        self.reader = reader
+        self.center = center
+        self.radius = radius
+        self.break_ms = break_ms
+        self._chunks = []
+        self._run_start = None
+
+    def start_trial(self):
+        """Clears the sample buffer and fixation state from the last trial.
+
+        Any samples still queued from before the trial (e.g. from the last
+        trial's colour wheel, feedback, or error message) are read and thrown
+        away, so they can't be mistaken for a fixation break early in the
+        trial.
+        """
+        self.reader()
+        self._chunks = []
+        self._run_start = None
+
+    def poll(self):
+        """Reads all new samples and checks them against the fixation boundary.
+
+        Returns:
+            bool: True if gaze has left fixation, otherwise False.
+
+        """
+        new = self.reader()
+        if not len(new):
+            return False
+        samples = np.asarray(new, dtype=np.float64)
+        samples[samples == MISSING_DATA] = np.nan
+        t, x, y = samples[:, 0], samples[:, 1], samples[:, 2]
+
+        # Check all samples against the fixation circle at once
+        dist = np.hypot(x - self.center[0], y - self.center[1])
+        valid = np.isfinite(dist)
+        inside = np.where(valid, dist <= self.radius, True)
+        self._chunks.append(np.column_stack([samples, inside]))
+
+        # Work out when each run of out-of-bounds samples started, carrying
+        # over any run that was still going at the end of the last batch
+        idx = np.arange(len(t))
+        last_in = np.maximum.accumulate(np.where(inside, idx, -1))
+        first_out = np.minimum(last_in + 1, len(t) - 1)
+        carried = t[0] if self._run_start is None else self._run_start
+        run_start = np.where(last_in >= 0, t[first_out], carried)
+        self._run_start = None if inside[-1] else run_start[-1]
+
+        out_for = np.where(inside, -1.0, t - run_start)
+        return bool(np.any(out_for >= self.break_ms))
+
+    def samples(self):
+        """Gets all samples recorded so far during the trial.
+
+        Returns:
+            :obj:`numpy.ndarray`: An (n, 5) array of time, x, y, pupil size,
+            and whether each sample was within the fixation boundary.
+
+        """
+        if not self._chunks:
+            return np.empty((0, 5))
+        return np.concatenate(self._chunks)
+
+    def fixation_error(self):
+        """Gets the distance between the median gaze position during the trial
+        and the centre of fixation.
+
+        Returns:
+            float: The distance (in pixels), or NaN if no valid samples have
+            been recorded during the trial.
+
+        """
+        samples = self.samples()
+        valid = np.isfinite(samples[:, 1]) & np.isfinite(samples[:, 2])
+        if not np.any(valid):
+            return np.nan
+        x = np.median(samples[valid, 1])
+        y = np.median(samples[valid, 2])
+        return float(np.hypot(x - self.center[0], y - self.center[1]))
+
+
+class DriftCorrectPolicy(object):
+    """Decides whether drift correction can be skipped before a trial, based on
+    the gaze error of recent trials.
+
+    Drift correction is only skipped once the fixation error of each of the
+    last ``window`` trials (see :meth:`GazeStream.fixation_error`) has been
+    under ``threshold``, and for no more than ``max_skips`` trials in a row.
+    When a full window of errors fails this check, those errors are forgotten,
+    so skipping only resumes once another ``window`` trials (each drift
+    corrected) have all been under the threshold.
+
+    Args:
+        enabled (bool): Whether drift correction can be skipped at all. If
+            False, :meth:`skip` always returns False, but the errors of the
+            last ``window`` trials are still tracked (regardless of drift
+            corrections) so the policy can be evaluated.
+        threshold (float): The largest fixation error (in pixels) that allows
+            drift correction to be skipped.
+        window (int, optional): The number of recent trials that need to be
+            under the threshold. Defaults to 5.
+        max_skips (int, optional): The most trials in a row that drift
+            correction can be skipped for. Defaults to 20.
+
+    """
+    def __init__(self, enabled, threshold, window=5, max_skips=20):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.max_skips = max_skips
+        self.skipped = 0
+        self._errors = deque(maxlen=window)
+        self._run = 0
+
+    @property
+    def recent_error(self):
+        """float: The largest fixation error (in pixels) over the recent trials,
+        or NaN if not enough trials have been recorded (or any of them had no
+        valid gaze samples).
+        """
+        if len(self._errors) < self._errors.maxlen:
+            return np.nan
+        return float(np.max(self._errors))
+
+    def record(self, error):
+        """Records the fixation error (in pixels) of a trial.
+        """
+        self._errors.append(error)
+
+    def reset(self):
+        """Forgets all recorded errors (e.g. after a break, when the participant
+        may have moved), so the next trial is always drift corrected.
+        """
+        self._errors.clear()
+
+    def skip(self):
+        """Decides whether to skip drift correction before the next trial. If
+        not, drift correction is assumed to be performed.
+
+        Returns:
+            bool: True if drift correction should be skipped, otherwise False.
+
+        """
+        if not self.enabled:
+            return False
+        if self.recent_error < self.threshold and self._run < self.max_skips:
+            self._run += 1
+            self.skipped += 1
+            return True
+        self._run = 0
+        if len(self._errors) == self._errors.maxlen:
+            self._errors.clear()
+        return False
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import numpy as np
+
+
+def _as_array(stim):
+    # Gets the rendered RGBA pixels of a Drawbject or array
+    if isinstance(stim, np.ndarray):
+        return stim
+    rendered = getattr(stim, "rendered", None)
+    return rendered if rendered is not None else stim.render()
+
+
+class StaticLayout(object):
+    """Pre-composites the static elements of a screen into a single surface.
+
+    Stimuli are added with the screen locations of their centres, and are
+    alpha-blended onto a background-coloured canvas covering the smallest
+    region that contains all of them. The composited surface is cached until
+    the layout is changed, so drawing the layout only takes a single blit
+    (after filling the screen with the background colour).
+
+    Rectangular patches of the composited layout can also be taken with
+    :meth:`patch`, for restoring small regions of the screen (e.g. where a
+    target was shown) without redrawing everything else.
+
+    Args:
+        bg_color (tuple): The RGB(A) background colour of the screen.
+
+    """
+    def __init__(self, bg_color):
+        self.bg_color = tuple(bg_color[:3]) + (255, )
+        self._items = []
+        self._surface = None
+        self._origin = (0, 0)
+        self._patches = {}
+
+    def add(self, stim, location):
+        """Adds a stimulus to the layout, centred on a given (x, y) location.
+        """
+        self._items.append((stim, location))
+        self.invalidate()
+
+    def clear(self):
+        """Removes all stimuli from the layout.
+        """
+        self._items = []
+        self.invalidate()
+
+    def invalidate(self):
+        """Marks the composited layout as out of date, e.g. after one of its
+        stimuli has been changed.
+        """
+        self._surface = None
+        self._patches = {}
+
+    def _compose(self):
+        # Work out the screen region covered by all stimuli in the layout
+        placed = []
+        for stim, (x, y) in self._items:
+            arr = _as_array(stim)
+            h, w = arr.shape[:2]
+            placed.append((arr, int(x - w // 2), int(y - h // 2)))
+        if not placed:
+            self._surface = np.empty((0, 0, 4), dtype=np.uint8)
+            self._origin = (0, 0)
+            return
+        x0 = min(p[1] for p in placed)
+        y0 = min(p[2] for p in placed)
+        x1 = max(p[1] + p[0].shape[1] for p in placed)
+        y1 = max(p[2] + p[0].shape[0] for p in placed)
+
+        # Alpha-blend each stimulus onto the background in the order added
+        canvas = np.empty((y1 - y0, x1 - x0, 3), dtype=np.float32)
+        canvas[:] = self.bg_color[:3]
+        for arr, x, y in placed:
+            h, w = arr.shape[:2]
+            region = canvas[y - y0:y - y0 + h, x - x0:x - x0 + w]
+            alpha = arr[:, :, 3:4].astype(np.float32) / 255.0
+            region *= 1.0 - alpha
+            region += arr[:, :, :3] * alpha
+        surface = np.empty(canvas.shape[:2] + (4, ), dtype=np.uint8)
+        surface[:, :, :3] = np.round(canvas)
+        surface[:, :, 3] = 255
+        self._surface = surface
+        self._origin = (x0, y0)
+
+    @property
+    def surface(self):
+        """:obj:`numpy.ndarray`: The composited RGBA layout.
+        """
+        if self._surface is None:
+            self._compose()
+        return self._surface
+
+    @property
+    def origin(self):
+        """tuple: The (x, y) screen location of the top-left corner of the
+        composited layout.
+        """
+        if self._surface is None:
+            self._compose()
+        return self._origin
+
+    def patch(self, location, size):
+        """Gets a rectangular patch of the composited layout.
+
+        Any part of the patch outside the layout's region is filled with the
+        background colour. Patches are cached until the layout changes.
+
+        Args:
+            location (tuple): The (x, y) screen location of the patch's centre.
+            size (tuple): The (width, height) of the patch (in pixels).
+
+        Returns:
+            tuple: The RGBA pixels of the patch, and the (x, y) screen location
+            of its top-left corner.
+
+        """
+        key = (tuple(location), tuple(size))
+        if key not in self._patches:
+            surface, (ox, oy) = self.surface, self.origin
+            w, h = size
+            x, y = int(location[0] - w // 2), int(location[1] - h // 2)
+            out = np.empty((h, w, 4), dtype=np.uint8)
+            out[:] = self.bg_color
+            sx0, sy0 = max(x, ox), max(y, oy)
+            sx1 = min(x + w, ox + surface.shape[1])
+            sy1 = min(y + h, oy + surface.shape[0])
+            if sx1 > sx0 and sy1 > sy0:
+                out[sy0 - y:sy1 - y, sx0 - x:sx1 - x] = surface[sy0 - oy:sy1 - oy, sx0 - ox:sx1 - ox]
+            self._patches[key] = (out, (x, y))
+        return self._patches[key]
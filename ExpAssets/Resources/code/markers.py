@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import time
+
+
+class MarkerChannel(object):
+    """Queues timestamped event markers and sends them to the eye tracker in
+    batches.
+
+    Adding a marker only stores its label and timestamp (e.g. the time a
+    stimulus flip returned), so no string formatting or tracker communication
+    happens during time-critical loops. When flushed, each marker is sent as
+    a message backdated to its timestamp: EyeLink software treats a message
+    starting with an integer offset (e.g. '12 cue_on b1 t5') as having
+    happened that many ms before the message was received.
+
+    Args:
+        write (callable): A function that sends a message string to the
+            eye tracker.
+
+    """
+    def __init__(self, write):
+        self._write = write
+        self._pending = []
+        self.sent = []
+
+    def clear(self):
+        """Clears all queued and sent markers (e.g. at the start of a trial).
+        """
+        self._pending = []
+        self.sent = []
+
+    def add(self, label, t=None):
+        """Queues a marker for an event.
+
+        Args:
+            label (str): The label of the event (e.g. 'cue_on').
+            t (float, optional): The :func:`time.perf_counter` timestamp of
+                the event. Defaults to the current time.
+
+        """
+        self._pending.append((label, time.perf_counter() if t is None else t))
+
+    def flush(self, suffix=""):
+        """Sends all queued markers to the tracker, backdated to their timestamps.
+
+        Args:
+            suffix (str, optional): Text to add to the end of each marker's
+                label in the message (e.g. ' b1 t5').
+
+        Returns:
+            list: The (label, timestamp, offset) of each marker sent, where
+            offset is how far the message was backdated (in ms). Sent markers
+            are also added to :attr:`sent` until :meth:`clear` is called.
+
+        """
+        now = time.perf_counter()
+        sent = []
+        for label, t in self._pending:
+            offset = int(round((now - t) * 1000))
+            self._write("{0} {1}{2}".format(offset, label, suffix))
+            sent.append((label, t, offset))
+        self._pending = []
+        self.sent += sent
+        return sent
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import random
+
+
+class BlockPlanner(object):
+    """Pre-generates the randomized parameters of every trial in a block.
+
+    Trial parameters are drawn in order from a private random generator
+    seeded with ``seed``, so the plan for a block can be regenerated exactly
+    from its seed regardless of anything else using the global :mod:`random`
+    state.
+
+    If more trials are requested than were planned (e.g. due to recycled
+    trials), the plan is extended by drawing further trials from the same
+    generator, so extra trials are also reproducible.
+
+    Args:
+        seed (str or int): The seed for the block's random generator.
+        generate (callable): A function that takes a :class:`random.Random`
+            and returns a dict of parameters for a single trial.
+
+    """
+    def __init__(self, seed, generate):
+        self.seed = seed
+        self.trials = []
+        self._rng = random.Random(seed)
+        self._generate = generate
+        self._next = 0
+
+    def plan(self, n):
+        """Plans the parameters for the next ``n`` trials of the block.
+
+        Args:
+            n (int): The number of trials to plan.
+
+        Returns:
+            list: The parameters for each newly-planned trial.
+
+        """
+        start = len(self.trials)
+        for i in range(n):
+            trial = self._generate(self._rng)
+            trial['plan_index'] = start + i
+            self.trials.append(trial)
+        return self.trials[start:]
+
+    def next(self):
+        """Gets the parameters for the next trial, planning another trial if
+        all planned trials have been used.
+
+        Returns:
+            dict: The parameters for the trial.
+
+        """
+        if self._next >= len(self.trials):
+            self.plan(1)
+        self._next += 1
+        return self.trials[self._next - 1]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import numpy as np
+
+from klibs.KLGraphics import KLDraw as kld
+
+
+class StimulusPool(object):
+    """A fixed set of RGBA buffers for single-colour stimuli, recoloured in place.
+
+    Each stimulus is rendered once and its buffer is reused for every colour
+    it's shown in, so changing a stimulus's colour between trials doesn't
+    allocate any new memory. Only works for stimuli where every pixel has the
+    same RGB value (e.g. the output of :func:`stimuli.dot_grid`), with shape
+    coming from the alpha channel alone.
+
+    Note that recolouring a stimulus changes every reference to its buffer.
+
+    Args:
+        stimuli (dict): The rendered RGBA arrays to pool, keyed by name.
+
+    """
+    def __init__(self, stimuli):
+        self._buffers = {name: np.array(arr, copy=True) for name, arr in stimuli.items()}
+
+    def recolor(self, name, color):
+        """Changes the colour of a pooled stimulus.
+
+        Args:
+            name (str): The name of the stimulus to recolour.
+            color (tuple): The new RGB(A) colour of the stimulus.
+
+        Returns:
+            :obj:`numpy.ndarray`: The stimulus's (reused) RGBA buffer.
+
+        """
+        buf = self._buffers[name]
+        buf[:, :, :3] = color[:3]
+        return buf
+
+
+class RecolorableEllipse(kld.Ellipse):
+    """A filled ellipse that is only drawn once and then recoloured in place.
+
+    Takes the same arguments as :class:`~klibs.KLGraphics.KLDraw.Ellipse`, but
+    should not be given a stroke.
+
+    """
+    def __init__(self, *args, **kwargs):
+        self._buffer = None
+        super(RecolorableEllipse, self).__init__(*args, **kwargs)
+
+    def recolor(self, color):
+        """Changes the fill colour of the ellipse without redrawing it.
+        """
+        self.fill = color
+        if self._buffer is None:
+            self._buffer = np.array(super(RecolorableEllipse, self).render(), copy=True)
+        self._buffer[:, :, :3] = color[:3]
+        self.rendered = self._buffer
+
+    def render(self):
+        if self._buffer is None:
+            return super(RecolorableEllipse, self).render()
+        self.rendered = self._buffer
+        return self._buffer
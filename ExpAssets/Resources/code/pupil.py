@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import math
+import bisect
+
+import numpy as np
+
+
+class P2Quantile(object):
+    """Estimates a quantile of a data stream in constant memory.
+
+    The first ``exact_n`` values are kept in a sorted buffer and the quantile
+    is computed exactly from them, since P-square estimates are strongly
+    biased towards the median with only a few samples. After that, the
+    P-square algorithm (Jain & Chlamtac, 1985) is used: five markers are
+    initialized from the buffer and their heights are adjusted with
+    piecewise-parabolic interpolation as new values arrive.
+
+    Args:
+        p (float): The quantile to estimate (greater than 0 and less than 1).
+        exact_n (int, optional): The number of values to compute the quantile
+            exactly from before switching to P-square. Defaults to 50.
+
+    """
+    def __init__(self, p, exact_n=50):
+        self.p = p
+        self.n = 0
+        self.exact_n = max(exact_n, 5)
+        self._buffer = []
+        self._q = None
+        self._pos = None
+        self._desired = None
+        self._inc = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def _init_markers(self):
+        # Places the five markers at their desired positions in the buffer,
+        # with heights interpolated between the buffered values
+        n = len(self._buffer)
+        self._desired = [1 + (n - 1) * f for f in self._inc]
+        self._pos = list(self._desired)
+        self._q = np.percentile(self._buffer, [f * 100 for f in self._inc]).tolist()
+        self._buffer = None
+
+    def add(self, x):
+        self.n += 1
+        if self._buffer is not None:
+            bisect.insort(self._buffer, x)
+            if self.n > self.exact_n:
+                self._init_markers()
+            return
+        q, pos = self._q, self._pos
+
+        # Find the cell containing x, extending the extreme markers if needed
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            pos[i] += 1
+        for i in range(5):
+            self._desired[i] += self._inc[i]
+
+        # Adjust the heights of the middle markers if they're out of place
+        for i in (1, 2, 3):
+            d = self._desired[i] - pos[i]
+            if (d >= 1 and pos[i + 1] - pos[i] > 1) or (d <= -1 and pos[i - 1] - pos[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (pos[i + 1] - pos[i - 1]) * (
+                    (pos[i] - pos[i - 1] + d) * (q[i + 1] - q[i]) / (pos[i + 1] - pos[i]) +
+                    (pos[i + 1] - pos[i] - d) * (q[i] - q[i - 1]) / (pos[i] - pos[i - 1])
+                )
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (pos[i + d] - pos[i])
+                q[i] = qp
+                pos[i] += d
+
+    @property
+    def value(self):
+        """float: The current estimate of the quantile (NaN if no data).
+        """
+        if self.n == 0:
+            return float('nan')
+        if self._buffer is not None:
+            return float(np.percentile(self._buffer, self.p * 100))
+        return self._q[2]
+
+
+class RunningStats(object):
+    """Running count, mean, min, max, and 5th/50th/95th percentiles of a data
+    stream, kept in constant memory. NaN values are ignored.
+    """
+    def __init__(self):
+        self.n = 0
+        self.mean = float('nan')
+        self.min = float('nan')
+        self.max = float('nan')
+        self._quantiles = [P2Quantile(p) for p in (0.05, 0.5, 0.95)]
+
+    def add(self, x):
+        if math.isnan(x):
+            return
+        self.n += 1
+        if self.n == 1:
+            self.mean = self.min = self.max = x
+        else:
+            self.mean += (x - self.mean) / self.n
+            self.min = min(self.min, x)
+            self.max = max(self.max, x)
+        for q in self._quantiles:
+            q.add(x)
+
+    @property
+    def p05(self):
+        return self._quantiles[0].value
+
+    @property
+    def median(self):
+        return self._quantiles[1].value
+
+    @property
+    def p95(self):
+        return self._quantiles[2].value
+
+    def summary(self):
+        """dict: The current statistics, with None in place of NaN.
+        """
+        out = {
+            'n': self.n, 'mean': self.mean, 'min': self.min, 'max': self.max,
+            'p05': self.p05, 'median': self.median, 'p95': self.p95,
+        }
+        return {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in out.items()}
+
+
+class PupilCalibration(object):
+    """Collects live pupil size statistics for each step of a luminance sequence.
+
+    Statistics are kept for every (phase, luminance) step as well as across
+    the whole calibration, so memory use doesn't grow with recording length.
+    """
+    def __init__(self):
+        self.overall = RunningStats()
+        self.steps = {}
+
+    def add(self, phase, luminance, pupil_sizes):
+        """Adds a batch of pupil samples recorded during a given step.
+        """
+        key = (phase, luminance)
+        if key not in self.steps:
+            self.steps[key] = RunningStats()
+        stats = self.steps[key]
+        for x in pupil_sizes:
+            stats.add(x)
+            self.overall.add(x)
+
+    @property
+    def range(self):
+        """tuple: The participant's (5th, 95th) percentile pupil sizes.
+        """
+        return (self.overall.p05, self.overall.p95)
+
+    def normalize(self, pupil):
+        """Scales a pupil size relative to the participant's pupil range, such
+        that 0 is the 5th percentile and 1 is the 95th percentile size.
+        """
+        low, high = self.range
+        return (pupil - low) / (high - low)
+
+    def curve(self):
+        """Gets the luminance-response curve as a list of per-step summaries.
+        """
+        rows = []
+        for (phase, luminance), stats in self.steps.items():
+            row = {'phase': phase, 'luminance': luminance}
+            row.update(stats.summary())
+            rows.append(row)
+        return rows
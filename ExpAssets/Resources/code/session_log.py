@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import os
+import json
+import time
+import struct
+
+import numpy as np
+
+MAGIC = b"CWES"
+VERSION = 1
+
+# File header: magic, version, random seed, screen width/height, px per degree,
+# and refresh rate
+HEADER = struct.Struct("<4sHqHHdd")
+
+# Record header: record type, anchor event, and time since the anchor (in s)
+RECORD = struct.Struct("<BBd")
+
+# Record types
+TRIAL, KEY, CLICK, GAZE, DATA = 1, 2, 3, 4, 5
+
+# Events that input times are recorded relative to
+ANCHORS = ["trial_start", "fix_on", "cue_on", "probe_on", "wheel_on"]
+
+GAZE_SAMPLE = np.dtype([("t", "<f8"), ("x", "<f4"), ("y", "<f4"), ("pupil", "<f4")])
+
+
+class SessionRecorder(object):
+    """Records the inputs of each trial in a session to a compact binary log.
+
+    Key presses, mouse clicks, and batches of gaze samples are recorded with
+    their times relative to the most recent stimulus event (see :meth:`mark`),
+    along with the factors and resulting data of each trial, so that the
+    session can later be replayed exactly (see ``scripts/replay.py``).
+    Records are buffered in memory during each trial and only written to
+    disk by :meth:`flush`.
+
+    Each recording method returns its input unchanged, so inputs can be
+    passed through the recorder where they're used. If no path is given,
+    recording is disabled and inputs are just passed through.
+
+    Args:
+        path (str, optional): The file to write the log to. If None, nothing
+            will be recorded.
+        seed (int, optional): The random seed of the session.
+        screen (tuple, optional): The (width, height) of the screen in pixels.
+        ppd (float, optional): The pixels per degree of the display.
+        refresh_rate (float, optional): The refresh rate of the display.
+
+    """
+    def __init__(self, path=None, seed=0, screen=(0, 0), ppd=0.0, refresh_rate=0.0):
+        self.path = path
+        self.enabled = path is not None
+        self._buffer = bytearray()
+        self._in_trial = False
+        self._anchor = 0
+        self._anchor_t = time.perf_counter()
+        if self.enabled:
+            folder = os.path.dirname(path)
+            if folder and not os.path.isdir(folder):
+                os.makedirs(folder)
+            self._buffer += HEADER.pack(
+                MAGIC, VERSION, int(seed), int(screen[0]), int(screen[1]),
+                float(ppd), float(refresh_rate)
+            )
+            self.flush()
+
+    def _record(self, kind, payload, offset=None):
+        if offset is None:
+            offset = time.perf_counter() - self._anchor_t
+        self._buffer += RECORD.pack(kind, self._anchor, offset)
+        self._buffer += payload
+
+    def start_trial(self, block, trial, factors):
+        """Starts recording a new trial.
+
+        Args:
+            block (int): The block number of the trial.
+            trial (int): The trial number of the trial.
+            factors (dict): The trial's factor levels (and anything else needed
+                to recreate the trial), as JSON-serializable values.
+
+        """
+        if not self.enabled:
+            return
+        self._in_trial = True
+        self.mark("trial_start")
+        info = json.dumps(factors).encode("utf-8")
+        self._record(TRIAL, struct.pack("<HHI", block, trial, len(info)) + info)
+
+    def mark(self, event):
+        """Marks the onset of a stimulus event, which the times of all following
+        inputs will be recorded relative to. Must be one of :data:`ANCHORS`.
+        """
+        if self._in_trial:
+            self._anchor = ANCHORS.index(event)
+            self._anchor_t = time.perf_counter()
+
+    def key(self, key, pressed):
+        """Records a key press (if the key was pressed).
+
+        Returns:
+            bool: Whether the key was pressed.
+
+        """
+        if pressed and self._in_trial:
+            self._record(KEY, struct.pack("<I", ord(key)))
+        return pressed
+
+    def click(self, pos, offset=None):
+        """Records the (x, y) screen location of a mouse click.
+
+        Args:
+            pos (tuple): The screen location of the click.
+            offset (float, optional): The time of the click (in seconds) since
+                the last marked event. Defaults to the current time.
+
+        """
+        if self._in_trial:
+            self._record(CLICK, struct.pack("<hh", int(pos[0]), int(pos[1])), offset)
+        return pos
+
+    def gaze(self, samples):
+        """Records a batch of (time, x, y, pupil) gaze samples.
+        """
+        if self._in_trial and len(samples):
+            s = np.asarray(samples, dtype=np.float64)
+            arr = np.empty(len(s), dtype=GAZE_SAMPLE)
+            for i, name in enumerate(GAZE_SAMPLE.names):
+                arr[name] = s[:, i]
+            self._record(GAZE, struct.pack("<I", len(arr)) + arr.tobytes())
+        return samples
+
+    def trial_data(self, data):
+        """Records the data for the current trial and ends the trial.
+        """
+        if not self._in_trial:
+            return
+        info = json.dumps(data, default=str).encode("utf-8")
+        self._record(DATA, struct.pack("<I", len(info)) + info)
+        self._in_trial = False
+
+    def flush(self):
+        """Writes all buffered records to the log.
+        """
+        if self.enabled and len(self._buffer):
+            with open(self.path, "ab") as f:
+                f.write(self._buffer)
+            del self._buffer[:]
+
+    def close(self):
+        """Writes any remaining records to the log.
+        """
+        self.flush()
+
+
+class TrialInputs(object):
+    """The recorded inputs for a single trial of a session.
+
+    Keys, clicks, and gaze batches are lists of (anchor, offset, value)
+    tuples, where ``anchor`` is the name of the event the input's time is
+    relative to and ``offset`` is its time (in seconds) since that event.
+    """
+    def __init__(self, block, trial, factors):
+        self.block = block
+        self.trial = trial
+        self.factors = factors
+        self.keys = []
+        self.clicks = []
+        self.gaze = []
+        self.data = None
+
+
+def read_session(path):
+    """Reads a session log written by :class:`SessionRecorder`.
+
+    If the log ends partway through a record (e.g. if the session crashed),
+    everything up to that record is returned.
+
+    Args:
+        path (str): The path of the log file.
+
+    Returns:
+        tuple: A dict with the session's seed and display info, and a list of
+        :class:`TrialInputs` for each recorded trial.
+
+    """
+    with open(path, "rb") as f:
+        buf = f.read()
+    magic, version, seed, screen_x, screen_y, ppd, refresh_rate = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError("'{0}' is not a session log.".format(path))
+    if version != VERSION:
+        raise ValueError("Unsupported session log version ({0}).".format(version))
+    info = {
+        "seed": seed, "screen": (screen_x, screen_y), "ppd": ppd,
+        "refresh_rate": refresh_rate,
+    }
+
+    trials = []
+    pos = HEADER.size
+    try:
+        while pos < len(buf):
+            # Work out the size of the record's payload
+            kind, anchor, offset = RECORD.unpack_from(buf, pos)
+            pos += RECORD.size
+            if kind == TRIAL:
+                block, trial, n = struct.unpack_from("<HHI", buf, pos)
+                pos += 8
+            elif kind in (KEY, CLICK):
+                n = 4
+            elif kind == GAZE:
+                count = struct.unpack_from("<I", buf, pos)[0]
+                pos += 4
+                n = count * GAZE_SAMPLE.itemsize
+            elif kind == DATA:
+                n = struct.unpack_from("<I", buf, pos)[0]
+                pos += 4
+            else:
+                raise ValueError("Unknown record type ({0}) in '{1}'.".format(kind, path))
+            if pos + n > len(buf):
+                break
+            payload = buf[pos:pos + n]
+            pos += n
+
+            # Add the record to its trial
+            anchor = ANCHORS[anchor]
+            if kind == TRIAL:
+                trials.append(TrialInputs(block, trial, json.loads(payload.decode("utf-8"))))
+            elif kind == KEY:
+                key = chr(struct.unpack("<I", payload)[0])
+                trials[-1].keys.append((anchor, offset, key))
+            elif kind == CLICK:
+                trials[-1].clicks.append((anchor, offset, struct.unpack("<hh", payload)))
+            elif kind == GAZE:
+                s = np.frombuffer(payload, dtype=GAZE_SAMPLE)
+                samples = np.column_stack([s[name].astype(np.float64) for name in GAZE_SAMPLE.names])
+                trials[-1].gaze.append((anchor, offset, samples))
+            else:
+                trials[-1].data = json.loads(payload.decode("utf-8"))
+    except struct.error:
+        # The log was cut off partway through a record header
+        pass
+    return info, trials
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import os
+import numpy as np
+
+
+# CIE 1931 (2°) reference whites, matching the values used by colormath
+ILLUMINANTS = {
+    'a': (1.09850, 1.0, 0.35585),
+    'b': (0.99072, 1.0, 0.85223),
+    'c': (0.98074, 1.0, 1.18232),
+    'd50': (0.96422, 1.0, 0.82521),
+    'd55': (0.95682, 1.0, 0.92149),
+    'd65': (0.95047, 1.0, 1.08883),
+    'd75': (0.94972, 1.0, 1.22638),
+    'e': (1.00000, 1.0, 1.00000),
+}
+
+# Bradford cone response matrix for chromatic adaptation
+BRADFORD = np.array([
+    [ 0.8951,  0.2664, -0.1614],
+    [-0.7502,  1.7135,  0.0367],
+    [ 0.0389, -0.0685,  1.0296],
+])
+
+# Linear XYZ (D65) -> linear sRGB matrix
+XYZ_TO_SRGB = np.array([
+    [ 3.24071,   -1.53726,  -0.498571 ],
+    [-0.969258,   1.87599,   0.0415557],
+    [ 0.0556352, -0.203996,  1.05707  ],
+])
+
+CIE_E = 216.0 / 24389.0
+CIE_K = 24389.0 / 27.0
+
+
+def _adaptation_matrix(src, dst):
+    # Bradford transform between two reference whites
+    cone_src = BRADFORD.dot(ILLUMINANTS[src])
+    cone_dst = BRADFORD.dot(ILLUMINANTS[dst])
+    scale = np.diag(cone_dst / cone_src)
+    return np.linalg.pinv(BRADFORD).dot(scale).dot(BRADFORD)
+
+
+def lchuv_to_srgb(l, c, h, illuminant='d65'):
+    """Converts one or more CIE LCHuv colours to 8-bit sRGB in a single pass.
+
+    Gives the same results as converting with colormath's
+    ``convert_color(LCHuvColor(...), sRGBColor)`` and upscaling its clamped
+    RGB values, but works on whole arrays at once instead of one colour object
+    at a time. For non-D65 illuminants, colours are Bradford-adapted to D65
+    first (as colormath does), which can push them out of the sRGB gamut.
+    Out-of-gamut values are clipped to [0, 255], so they differ from
+    colormath's ``get_upscaled_value_tuple()``, which doesn't clamp.
+
+    Args:
+        l (float or :obj:`numpy.ndarray`): The lightness value(s) of the colours.
+        c (float or :obj:`numpy.ndarray`): The chroma value(s) of the colours.
+        h (float or :obj:`numpy.ndarray`): The hue angle(s) of the colours, in
+            degrees.
+        illuminant (str, optional): The reference white of the LCHuv colours.
+            Defaults to 'd65'.
+
+    Returns:
+        :obj:`numpy.ndarray`: An (n, 3) array of uint8 RGB values.
+
+    """
+    l, c, h = np.broadcast_arrays(
+        np.asarray(l, dtype=np.float64),
+        np.asarray(c, dtype=np.float64),
+        np.asarray(h, dtype=np.float64),
+    )
+    l, c, h = l.ravel(), c.ravel(), h.ravel()
+    wx, wy, wz = ILLUMINANTS[illuminant.lower()]
+
+    # LCHuv -> Luv
+    u = c * np.cos(np.radians(h))
+    v = c * np.sin(np.radians(h))
+
+    # Luv -> XYZ
+    denom = wx + 15.0 * wy + 3.0 * wz
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var_u = u / (13.0 * l) + (4.0 * wx) / denom
+        var_v = v / (13.0 * l) + (9.0 * wy) / denom
+        y = np.where(l > CIE_K * CIE_E, ((l + 16.0) / 116.0) ** 3, l / CIE_K)
+        x = y * 9.0 * var_u / (4.0 * var_v)
+        z = y * (12.0 - 3.0 * var_u - 20.0 * var_v) / (4.0 * var_v)
+    xyz = np.stack([x, y, z])
+    xyz[:, l <= 0] = 0.0
+
+    # XYZ -> linear sRGB, adapting to sRGB's native white if needed
+    if illuminant.lower() != 'd65':
+        xyz = _adaptation_matrix(illuminant.lower(), 'd65').dot(xyz)
+    rgb = XYZ_TO_SRGB.dot(xyz)
+
+    # Linear sRGB -> gamma-companded 8-bit sRGB
+    companded = np.where(
+        rgb <= 0.0031308, rgb * 12.92, 1.055 * np.abs(rgb) ** (1 / 2.4) - 0.055
+    )
+    upscaled = np.floor(0.5 + companded * 255)
+    return np.clip(upscaled, 0, 255).astype(np.uint8).T
+
+
+def build_spectrum(l, c, resolution=1.0, illuminant='d65'):
+    """Generates a constant-lightness, constant-chroma LCHuv hue spectrum.
+
+    Args:
+        l (float): The lightness of the spectrum.
+        c (float): The chroma of the spectrum.
+        resolution (float, optional): The angular distance (in degrees) between
+            adjacent hues. Must divide evenly into 360. Defaults to 1.0.
+        illuminant (str, optional): The reference white of the spectrum.
+            Defaults to 'd65'.
+
+    Returns:
+        :obj:`numpy.ndarray`: An (n, 3) array of uint8 RGB values, where n is
+        the number of hues in the spectrum.
+
+    """
+    steps = 360.0 / resolution
+    if abs(steps - round(steps)) > 1e-9:
+        raise ValueError("Spectrum resolution must divide evenly into 360.")
+    hues = np.arange(int(round(steps))) * resolution
+    return lchuv_to_srgb(l, c, hues, illuminant)
+
+
+def nearest_color_index(palette, colors):
+    """Finds the closest palette entry for each of a set of RGB colours.
+
+    Distances are computed in RGB space for every colour at once. Duplicate
+    colours are only looked up once, so large images with few distinct colours
+    are cheap to match.
+
+    Args:
+        palette (array-like): An (n, 3) array of RGB palette colours.
+        colors (array-like): An (m, 3) array of RGB colours to match.
+
+    Returns:
+        tuple: An (m,) int array of palette indices and an (m,) float array of
+        the RGB distances between each colour and its closest palette entry.
+
+    """
+    palette = np.asarray(palette, dtype=np.float64)[:, :3]
+    colors = np.asarray(colors).reshape(-1, np.shape(colors)[-1])[:, :3]
+    unique, inverse = np.unique(colors, axis=0, return_inverse=True)
+    diffs = unique[:, None, :].astype(np.float64) - palette[None, :, :]
+    dists = (diffs ** 2).sum(axis=2)
+    nearest = dists.argmin(axis=1)
+    err = np.sqrt(dists[np.arange(len(unique)), nearest])
+    inverse = inverse.ravel()
+    return nearest[inverse], err[inverse]
+
+
+class HueIndex(object):
+    """A constant-time lookup from RGB colour to angle on an unrotated wheel.
+
+    Exact matches are looked up in a hash table built from the spectrum.
+    Colours not in the spectrum fall back to a vectorized nearest-colour search.
+
+    Args:
+        colors (list): The RGB(A) colours of the spectrum, in order of hue.
+
+    """
+    def __init__(self, colors):
+        self.palette = np.asarray([c[:3] for c in colors], dtype=np.uint8)
+        self.step = 360.0 / len(colors)
+        self._index = {}
+        for i, rgb in enumerate(self.palette.tolist()):
+            self._index.setdefault(tuple(rgb), i)
+
+    def hue(self, color):
+        """Gets the spectrum index of the closest hue to a given RGB(A) colour.
+        """
+        try:
+            return self._index[tuple(color[:3])]
+        except KeyError:
+            return int(nearest_color_index(self.palette, [color[:3]])[0][0])
+
+    def angle(self, color):
+        """Gets the angle (in degrees) of a given RGB(A) colour on the
+        unrotated colour wheel.
+        """
+        angle = self.hue(color) * self.step
+        return int(angle) if angle.is_integer() else angle
+
+
+def load_spectrum(l, c, resolution=1.0, illuminant='d65', cache_dir=None):
+    """Loads an LCHuv hue spectrum from disk, generating and caching it if needed.
+
+    Cached spectra are keyed by their lightness, chroma, illuminant, and
+    resolution, so changing any of these will generate a new spectrum.
+
+    Args:
+        l (float): The lightness of the spectrum.
+        c (float): The chroma of the spectrum.
+        resolution (float, optional): The angular distance (in degrees) between
+            adjacent hues. Defaults to 1.0.
+        illuminant (str, optional): The reference white of the spectrum.
+            Defaults to 'd65'.
+        cache_dir (str, optional): The folder in which to cache the spectrum.
+            If None, the spectrum will not be cached.
+
+    Returns:
+        list: A list of (r, g, b) tuples, one per hue in the spectrum.
+
+    """
+    illuminant = illuminant.lower()
+    spectrum = None
+    if cache_dir:
+        fname = "spectrum_L{0}_C{1}_{2}_r{3}.npy".format(l, c, illuminant, resolution)
+        cache_path = os.path.join(cache_dir, fname)
+        if os.path.isfile(cache_path):
+            spectrum = np.load(cache_path)
+    if spectrum is None:
+        spectrum = build_spectrum(l, c, resolution, illuminant)
+        if cache_dir:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            # Write to a temporary file first so an interrupted launch can't
+            # leave a truncated cache behind
+            tmp_path = cache_path + ".tmp.npy"
+            np.save(tmp_path, spectrum)
+            os.replace(tmp_path, cache_path)
+    return [tuple(rgb) for rgb in spectrum.tolist()]
@@ -0,0 +1,420 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import gc
+import sys
+import time
+import math
+
+
+class PresentationLog(object):
+    """Records the timing of stimulus flips and compares them to their requested
+    onsets and durations.
+
+    After each :func:`flip` for a stimulus event of interest, :meth:`stamp`
+    should be called with the event's label. Intervals are measured between
+    pairs of stamped events, so all timings are based on when flips actually
+    returned rather than when they were requested.
+
+    Args:
+        refresh_rate (float): The refresh rate of the display (in Hz).
+
+    """
+    def __init__(self, refresh_rate):
+        self.frame_ms = 1000.0 / refresh_rate
+        self.intervals = []
+        self._stamps = {}
+        self._requests = []
+
+    def start_trial(self):
+        """Clears any flip timestamps and requests from the previous trial.
+        """
+        self._stamps = {}
+        self._requests = []
+
+    def request(self, event, relative_to, interval):
+        """Registers the requested interval (in ms) between two events.
+        """
+        self._requests.append((event, relative_to, interval))
+
+    def stamp(self, event):
+        """Records the time of the most recent flip for a given event.
+
+        Returns:
+            float: The recorded :func:`time.perf_counter` timestamp.
+
+        """
+        t = self._stamps[event] = time.perf_counter()
+        return t
+
+    def trial_intervals(self):
+        """Computes the requested vs. measured intervals for the current trial.
+
+        Intervals for events that never occurred during the trial (e.g. a probe
+        offset after an early response) are skipped.
+
+        Returns:
+            list: A list of dicts, one per measured interval.
+
+        """
+        rows = []
+        for event, relative_to, requested in self._requests:
+            if event not in self._stamps or relative_to not in self._stamps:
+                continue
+            measured = (self._stamps[event] - self._stamps[relative_to]) * 1000
+            rows.append({
+                'event': event,
+                'relative_to': relative_to,
+                'requested_ms': requested,
+                'measured_ms': round(measured, 3),
+                'requested_frames': int(round(requested / self.frame_ms)),
+                'measured_frames': round(measured / self.frame_ms, 2),
+            })
+        self.intervals += rows
+        return rows
+
+    def summary(self):
+        """Summarizes timing accuracy for each event across the whole session.
+
+        Returns:
+            dict: The number of samples, mean and SD of the timing error, and
+            the maximum overshoot (all in ms) for each event.
+
+        """
+        errs = {}
+        for row in self.intervals:
+            err = row['measured_ms'] - row['requested_ms']
+            errs.setdefault(row['event'], []).append(err)
+        out = {}
+        for event, e in errs.items():
+            mean = sum(e) / len(e)
+            sd = math.sqrt(sum((x - mean) ** 2 for x in e) / (len(e) - 1)) if len(e) > 1 else 0.0
+            out[event] = {'n': len(e), 'mean': mean, 'sd': sd, 'max_over': max(e)}
+        return out
+
+
+class FrameScheduler(object):
+    """Plans trial events on display frames and idles between input checks.
+
+    Event onsets are converted from ms into whole frames relative to a
+    reference flip (see :meth:`start`), and each event's deadline is set half
+    a frame before the target frame so that a flip issued at the deadline is
+    presented on that frame. By default, :meth:`idle` only keeps track of the
+    gaps between input checks, so trial loops busy-wait. If a
+    ``max_wake_latency`` is given, it sleeps for up to that long instead of
+    spinning, so a core isn't kept fully busy. However, response times read
+    after waking are then late by up to that much plus the OS wake-up latency.
+
+    Args:
+        refresh_rate (float): The refresh rate of the display (in Hz).
+        max_wake_latency (float, optional): The longest time (in seconds) to
+            sleep between input checks. If 0, :meth:`idle` never sleeps.
+            Defaults to 0.
+
+    """
+    # Upper edges (in ms) of the wake-up latency histogram bins
+    latency_bins = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, float('inf'))
+
+    def __init__(self, refresh_rate, max_wake_latency=0.0):
+        self.frame_s = 1.0 / refresh_rate
+        self.max_wake_latency = max_wake_latency
+        self.latency_counts = [0] * len(self.latency_bins)
+        self.max_poll_gap = 0.0
+        self.cpu_time = 0.0
+        self.wall_time = 0.0
+        self._deadlines = {}
+        self._t0 = None
+        self._cpu0 = None
+        self._last_poll = None
+
+    def frames(self, ms):
+        """Converts a duration in ms to the closest whole number of frames.
+        """
+        return int(round(ms / (self.frame_s * 1000)))
+
+    def lead_time(self, ms):
+        """Gets the time (in seconds) after a flip at which to issue the flip
+        for an event ``ms`` later, so that it lands on the intended frame.
+        """
+        return max(0.0, (self.frames(ms) - 0.5) * self.frame_s)
+
+    def plan(self, events):
+        """Plans the deadlines for a set of [onset_ms, label] event pairs.
+        """
+        self._deadlines = {}
+        for onset, label in events:
+            self._deadlines[label] = self.lead_time(onset)
+
+    def start(self, t0=None):
+        """Starts the scheduler's clock from a reference flip.
+
+        Args:
+            t0 (float, optional): The :func:`time.perf_counter` timestamp of
+                the reference flip. Defaults to the current time.
+
+        """
+        self._t0 = time.perf_counter() if t0 is None else t0
+        self._cpu0 = time.process_time()
+        self._last_poll = None
+
+    def stop(self):
+        """Stops the scheduler's clock, adding the elapsed wall and CPU time
+        to the session totals.
+        """
+        if self._t0 is None:
+            return
+        self.wall_time += time.perf_counter() - self._t0
+        self.cpu_time += time.process_time() - self._cpu0
+        self._t0 = None
+
+    def elapsed(self):
+        return time.perf_counter() - self._t0
+
+    def before(self, label):
+        """Checks whether the deadline for a planned event has yet to pass.
+        """
+        return self.elapsed() < self._deadlines[label]
+
+    def idle(self, until=None):
+        """Sleeps until the next input check, waking early for a deadline.
+
+        Args:
+            until (str or float, optional): The label of a planned event, or a
+                :func:`time.perf_counter` timestamp, to wake up in time for.
+
+        """
+        now = time.perf_counter()
+        wait = self.max_wake_latency
+        if until is not None:
+            deadline = self._t0 + self._deadlines[until] if isinstance(until, str) else until
+            wait = min(wait, deadline - now)
+        if wait > 0:
+            time.sleep(wait)
+            woke = time.perf_counter()
+            late_ms = (woke - (now + wait)) * 1000
+            for i, edge in enumerate(self.latency_bins):
+                if late_ms <= edge:
+                    self.latency_counts[i] += 1
+                    break
+            now = woke
+        if self._last_poll is not None:
+            self.max_poll_gap = max(self.max_poll_gap, now - self._last_poll)
+        self._last_poll = now
+
+    def report(self):
+        """Summarizes CPU use and wake-up latency across the session.
+
+        Returns:
+            dict: The CPU utilisation (as a proportion of one core) while the
+            scheduler was running, the maximum gap between input checks (in ms),
+            and the wake-up latency histogram as (bin upper edge, count) pairs.
+
+        """
+        util = self.cpu_time / self.wall_time if self.wall_time else 0.0
+        return {
+            'cpu_utilisation': util,
+            'max_poll_gap_ms': self.max_poll_gap * 1000,
+            'wake_latency_ms': list(zip(self.latency_bins, self.latency_counts)),
+        }
+
+
+class LuminanceRamp(object):
+    """A luminance ramp that runs for a fixed duration at any refresh rate.
+
+    The grey level for every frame of the ramp is computed in advance, and
+    the frame to show next is picked from the time elapsed since the first
+    flip, so dropped frames don't stretch the ramp out. The level and flip
+    time of every frame shown are recorded in :attr:`flips`.
+
+    Args:
+        start (int): The grey level at the start of the ramp (0-255).
+        end (int): The grey level at the end of the ramp (0-255).
+        duration (float): The duration of the ramp (in seconds).
+        refresh_rate (float): The refresh rate of the display (in Hz).
+
+    """
+    def __init__(self, start, end, duration, refresh_rate):
+        self.frame_s = 1.0 / refresh_rate
+        n_frames = max(1, int(round(duration * refresh_rate)))
+        step = (end - start) / float(n_frames)
+        self.levels = [int(round(start + step * i)) for i in range(n_frames + 1)]
+        self.flips = []
+
+    def run(self, present):
+        """Runs the ramp, calling ``present`` to draw and flip each grey level.
+
+        Args:
+            present (callable): A function that takes a grey level and
+                presents it on the screen, returning after the flip.
+
+        Returns:
+            list: A list of (frame, level, flip time) tuples for every frame
+            presented, with flip times as :func:`time.perf_counter` values.
+
+        """
+        self.flips = []
+        last = len(self.levels) - 1
+        frame, t0 = 0, None
+        while True:
+            present(self.levels[frame])
+            t = time.perf_counter()
+            t0 = t if t0 is None else t0
+            self.flips.append((frame, self.levels[frame], t))
+            if frame == last:
+                break
+            elapsed_frames = int(round((t - t0) / self.frame_s))
+            frame = min(last, max(frame + 1, elapsed_frames + 1))
+        return self.flips
+
+
+class AllocationMonitor(object):
+    """Counts memory allocations and garbage collections during each trial.
+
+    Allocations are measured as the net change in the number of memory blocks
+    allocated by the interpreter between :meth:`start` and :meth:`stop`. This
+    includes memory freed by other threads (e.g. a background database writer)
+    in the meantime, so counts can be negative. If
+    ``defer_gc`` is True, automatic garbage collection is disabled from
+    :meth:`hold` until :meth:`stop`, and the young generations are collected
+    when the trial ends instead, so that collections can't happen during
+    timed parts of a trial.
+
+    Args:
+        defer_gc (bool, optional): Whether to defer garbage collection until
+            the end of each trial. Defaults to False.
+
+    """
+    def __init__(self, defer_gc=False):
+        self.defer_gc = defer_gc
+        self.alloc_blocks = []
+        self.collections = []
+        self._start = None
+        self._held = False
+
+    def _collections(self):
+        return sum(gen['collections'] for gen in gc.get_stats())
+
+    def freeze(self):
+        """Moves all current objects (e.g. from setup) out of the collector's
+        reach, so later collections have fewer objects to check.
+        """
+        if self.defer_gc:
+            gc.collect()
+            gc.freeze()
+
+    def start(self):
+        """Starts counting allocations and collections for a trial.
+        """
+        self._start = (sys.getallocatedblocks(), self._collections())
+
+    def hold(self):
+        """Disables automatic garbage collection until the end of the trial
+        (if deferring garbage collection).
+        """
+        if self.defer_gc and gc.isenabled():
+            gc.disable()
+            self._held = True
+
+    def stop(self):
+        """Stops counting for the trial and re-enables garbage collection.
+
+        Returns:
+            dict: The net number of memory blocks allocated and the number of
+            garbage collections that ran during the trial.
+
+        """
+        blocks = sys.getallocatedblocks() - self._start[0]
+        collections = self._collections() - self._start[1]
+        if self._held:
+            gc.enable()
+            gc.collect(1)
+            self._held = False
+        self.alloc_blocks.append(blocks)
+        self.collections.append(collections)
+        return {'alloc_blocks': blocks, 'gc_collections': collections}
+
+    def summary(self):
+        """Summarizes allocations and collections across all trials.
+        """
+        n = len(self.alloc_blocks)
+        return {
+            'n': n,
+            'mean_blocks': sum(self.alloc_blocks) / n if n else 0.0,
+            'max_blocks': max(self.alloc_blocks) if n else 0,
+            'collections': sum(self.collections),
+            'trials_with_gc': sum(1 for c in self.collections if c),
+        }
+
+
+class StartupProfiler(object):
+    """Records how long each phase of the experiment's startup takes.
+
+    Phases are timed as laps: each call to :meth:`lap` records the time since
+    the previous lap (or since the profiler was created) under a given label.
+
+    Args:
+        enabled (bool, optional): Whether :meth:`report` should print the
+            recorded timings. Defaults to True.
+
+    """
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.phases = []
+        self._start = time.perf_counter()
+        self._last = self._start
+
+    def add(self, label, seconds):
+        """Records the duration (in seconds) of a phase timed elsewhere.
+        """
+        self.phases.append((label, seconds))
+
+    def lap(self, label):
+        """Records the time since the last lap as the duration of a phase.
+        """
+        now = time.perf_counter()
+        self.phases.append((label, now - self._last))
+        self._last = now
+
+    def report(self):
+        """Prints the duration of each phase and the total time elapsed by the
+        end of each phase (if enabled).
+        """
+        if not self.enabled:
+            return
+        print("Startup profile (ms):")
+        print("  {0:<44}{1:>10}{2:>10}".format("phase", "duration", "elapsed"))
+        elapsed = 0.0
+        for label, t in self.phases:
+            elapsed += t
+            print("  {0:<44}{1:>10.1f}{2:>10.1f}".format(label, t * 1000, elapsed * 1000))
+
+
+class StageTimer(object):
+    """Times the stages of a process that runs repeatedly (e.g. each trial's
+    preparation).
+
+    Each call to :meth:`lap` records the time since the previous lap (or
+    since :meth:`start`) as the duration of a stage.
+    """
+    def __init__(self):
+        self.stages = {}
+        self._start = self._last = time.perf_counter()
+
+    def start(self):
+        """Clears all recorded stages and starts timing the first one.
+        """
+        self.stages = {}
+        self._start = self._last = time.perf_counter()
+
+    def lap(self, stage):
+        """Records the time since the last lap as the duration of a stage.
+        """
+        now = time.perf_counter()
+        self.stages[stage] = (now - self._last) * 1000
+        self._last = now
+
+    def total(self):
+        """Gets the time (in ms) from :meth:`start` to the most recent lap.
+        """
+        return (self._last - self._start) * 1000
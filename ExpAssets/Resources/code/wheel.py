@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import os
+import hashlib
+
+import numpy as np
+
+from klibs.KLGraphics import KLDraw as kld
+
+from spectrum import nearest_color_index
+
+
+class IndexedColorWheel(kld.ColorWheel):
+    """A colour wheel that only needs to be fully drawn once.
+
+    On the first render, the wheel is drawn normally at a rotation of 0 and
+    each pixel of the ring is mapped to the index of its hue in the wheel's
+    colour list. After that, rendering the wheel at a new rotation just shifts
+    the hue index of every ring pixel and looks up the new colours with a
+    single array operation, instead of redrawing the whole ring.
+
+    The direction of the index shift is calibrated against a regular render
+    of the wheel at a known rotation, so the remapped wheel always matches
+    what :meth:`color_from_angle` and :meth:`angle_from_color` expect. If the
+    calibration fails for any reason, or the wheel's rotation doesn't fall on
+    a hue boundary, the wheel falls back to regular rendering.
+
+    Building the index also builds a per-pixel polar lookup table over the
+    wheel's bounding box, mapping every pixel to the hue index under it (or
+    -1 if outside the ring), so that :meth:`hue_at` can look up the colour
+    at a screen location with a single array index, and :meth:`location_of`
+    can find where on the ring a colour is.
+
+    Takes the same arguments as :class:`~klibs.KLGraphics.KLDraw.ColorWheel`.
+
+    """
+    def __init__(self, *args, **kwargs):
+        self._base = None
+        self._ring_px = None
+        self._ring_hues = None
+        self._shift_sign = 0
+        self._lut = None
+        self._args = repr((args, sorted((k, v) for k, v in kwargs.items() if k != 'colors')))
+        super(IndexedColorWheel, self).__init__(*args, **kwargs)
+
+    def build_index(self, tolerance=8.0, cache_dir=None):
+        """Renders the wheel once and builds the per-pixel hue index used for
+        fast re-rendering at new rotations.
+
+        Args:
+            tolerance (float, optional): The maximum RGB distance between a
+                rendered pixel and its closest wheel colour for that pixel to
+                be treated as part of the ring. Defaults to 8.0.
+            cache_dir (str, optional): The folder in which to cache the index,
+                so that it only needs to be built on first launch. Cached
+                indexes are keyed by the wheel's arguments and colours. If
+                None, the index will not be cached.
+
+        Returns:
+            bool: True if the index was built and calibrated successfully,
+            otherwise False.
+
+        """
+        rotation = self.rotation
+        n_hues = len(self.colors)
+        palette = np.asarray([c[:3] for c in self.colors], dtype=np.uint8)
+        cache_path = None
+        if cache_dir:
+            key = hashlib.md5((self._args + repr(tolerance)).encode() + palette.tobytes())
+            cache_path = os.path.join(cache_dir, "wheel_{0}.npz".format(key.hexdigest()))
+            if os.path.isfile(cache_path):
+                self._load_index(cache_path, palette)
+                return True
+
+        # Render the unrotated wheel and work out the hue of each ring pixel
+        self.rotation = 0
+        base = np.array(super(IndexedColorWheel, self).render(), copy=True)
+        flat = base.reshape(-1, base.shape[-1])
+        visible = np.flatnonzero(flat[:, 3] > 0)
+        hues, err = nearest_color_index(palette, flat[visible, :3])
+        ring_px = visible[err <= tolerance]
+        ring_hues = hues[err <= tolerance]
+
+        # Calibrate which direction hues shift as the wheel rotates by
+        # comparing the remapped wheel to a normal render at a known rotation
+        shift = n_hues // 4
+        self.rotation = shift * (360.0 / n_hues)
+        reference = super(IndexedColorWheel, self).render()
+        ref_px = reference.reshape(-1, base.shape[-1])[ring_px, :3]
+        best_sign, best_match = 0, 0.0
+        for sign in (1, -1):
+            remapped = palette[(ring_hues + sign * shift) % n_hues]
+            match = np.mean(np.all(remapped == ref_px, axis=1))
+            if match > best_match:
+                best_sign, best_match = sign, match
+        self.rotation = rotation
+
+        # Only enable fast rendering if the remapped wheel closely matches the
+        # normal render (allowing for anti-aliasing at hue boundaries)
+        if best_match < 0.95:
+            self._base = None
+            return False
+        self._base = base
+        self._ring_px = ring_px
+        self._ring_hues = ring_hues
+        self._shift_sign = best_sign
+        self._palette = palette
+        self._lut = self._build_lut(base.shape[:2], ring_px, ring_hues)
+        if cache_path:
+            self._save_index(cache_path)
+        return True
+
+    def _save_index(self, path):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        # Write to a temporary file first so an interrupted launch can't leave a
+        # truncated cache behind
+        tmp_path = path + ".tmp.npz"
+        np.savez(
+            tmp_path, base=self._base, ring_px=self._ring_px, ring_hues=self._ring_hues,
+            shift_sign=self._shift_sign, lut=self._lut
+        )
+        os.replace(tmp_path, path)
+
+    def _load_index(self, path, palette):
+        with np.load(path) as cached:
+            self._base = cached['base']
+            self._ring_px = cached['ring_px']
+            self._ring_hues = cached['ring_hues']
+            self._shift_sign = int(cached['shift_sign'])
+            self._lut = cached['lut']
+        self._palette = palette
+
+    def _build_lut(self, shape, ring_px, ring_hues):
+        # Maps every pixel of the wheel's bounding box to the hue of the ring at
+        # that pixel's angle (or -1 if the pixel isn't within the ring)
+        n_hues = len(self.colors)
+        h, w = shape
+        y, x = np.mgrid[0:h, 0:w]
+        x = x - (w - 1) / 2.0
+        y = y - (h - 1) / 2.0
+        radius = np.hypot(x, y)
+        theta = np.degrees(np.arctan2(y, x)) / (360.0 / n_hues)
+
+        # Work out how hue indices map onto pixel angles from the rendered ring
+        ring_r = radius.flat[ring_px]
+        ring_theta = theta.flat[ring_px]
+        best = (-1.0, 1, 0)
+        for sign in (1, -1):
+            offsets = np.round(ring_hues - sign * ring_theta).astype(np.int64) % n_hues
+            offset = np.argmax(np.bincount(offsets, minlength=n_hues))
+            diff = (offsets - offset + n_hues // 2) % n_hues - n_hues // 2
+            fit = np.mean(np.abs(diff) <= 1)
+            if fit > best[0]:
+                best = (fit, sign, offset)
+        _, sign, offset = best
+
+        lut = np.round(sign * theta + offset).astype(np.int16) % n_hues
+        in_ring = (radius >= ring_r.min() - 0.5) & (radius <= ring_r.max() + 0.5)
+        lut[~in_ring] = -1
+        lut.flat[ring_px] = ring_hues
+        return lut
+
+    def hue_at(self, pos, location):
+        """Gets the index of the wheel colour at a given screen location.
+
+        Args:
+            pos (tuple): The (x, y) screen coordinates to check (e.g. the
+                location of a mouse click).
+            location (tuple): The (x, y) screen coordinates of the centre of
+                the wheel.
+
+        Returns:
+            int: The index of the colour at the given location in the wheel's
+            list of colours, or -1 if the location isn't on the ring.
+
+        """
+        if self._lut is None:
+            return self._rendered_hue_at(pos, location)
+        steps = self.rotation * len(self.colors) / 360.0
+        if abs(steps - round(steps)) > 1e-6:
+            return self._rendered_hue_at(pos, location)
+        h, w = self._lut.shape
+        x = int(pos[0] - location[0] + w // 2)
+        y = int(pos[1] - location[1] + h // 2)
+        if not (0 <= x < w and 0 <= y < h):
+            return -1
+        hue = int(self._lut[y, x])
+        if hue < 0:
+            return -1
+        return (hue + self._shift_sign * int(round(steps))) % len(self.colors)
+
+    def _rendered_hue_at(self, pos, location):
+        # Slow fallback: looks up the colour of the rendered pixel at the location
+        rendered = self.rendered if self.rendered is not None else self.render()
+        h, w = rendered.shape[:2]
+        x = int(pos[0] - location[0] + w // 2)
+        y = int(pos[1] - location[1] + h // 2)
+        if not (0 <= x < w and 0 <= y < h) or rendered[y, x, 3] == 0:
+            return -1
+        palette = np.asarray([c[:3] for c in self.colors], dtype=np.uint8)
+        return int(nearest_color_index(palette, [rendered[y, x, :3]])[0][0])
+
+    def color_at(self, pos, location):
+        """Gets the wheel colour at a given screen location.
+
+        Takes the same arguments as :meth:`hue_at`.
+
+        Returns:
+            tuple: The colour at the given location, or None if the location
+            isn't on the ring.
+
+        """
+        hue = self.hue_at(pos, location)
+        return None if hue < 0 else self.colors[hue]
+
+    def location_of(self, color, location):
+        """Gets a screen location on the middle of the ring with a given colour.
+
+        Args:
+            color (tuple): The wheel colour to find.
+            location (tuple): The (x, y) screen coordinates of the centre of
+                the wheel.
+
+        Returns:
+            tuple: The (x, y) screen coordinates of a pixel of the ring with
+            the given colour, or None if the wheel has no index or the colour
+            isn't on the wheel.
+
+        """
+        if self._lut is None:
+            return None
+        steps = self.rotation * len(self.colors) / 360.0
+        if abs(steps - round(steps)) > 1e-6:
+            return None
+        palette = [tuple(c[:3]) for c in self.colors]
+        try:
+            hue = palette.index(tuple(color[:3]))
+        except ValueError:
+            return None
+        base_hue = (hue - self._shift_sign * int(round(steps))) % len(self.colors)
+        ys, xs = np.nonzero(self._lut == base_hue)
+        if not len(xs):
+            return None
+        # Use the pixel closest to the middle of the hue's part of the ring
+        i = np.argmin((xs - xs.mean()) ** 2 + (ys - ys.mean()) ** 2)
+        h, w = self._lut.shape
+        return (int(location[0] + xs[i] - w // 2), int(location[1] + ys[i] - h // 2))
+
+    def render(self):
+        if self._base is None:
+            return super(IndexedColorWheel, self).render()
+        steps = self.rotation * len(self.colors) / 360.0
+        if abs(steps - round(steps)) > 1e-6:
+            return super(IndexedColorWheel, self).render()
+        # Shift the hue of every ring pixel to match the current rotation
+        shift = self._shift_sign * int(round(steps))
+        rendered = self._base.copy()
+        flat = rendered.reshape(-1, rendered.shape[-1])
+        flat[self._ring_px, :3] = self._palette[(self._ring_hues + shift) % len(self.colors)]
+        self.rendered = rendered
+        return rendered
+
+    @property
+    def indexed(self):
+        """bool: Whether the wheel is using fast index-based rendering.
+        """
+        return self._base is not None
@@ -2,6 +2,11 @@
 
 __author__ = "Austin Hurst"
 
+# Time how long the experiment's imports take (for startup profiling)
+
+import time
+_import_start = time.perf_counter()
+
 # Import required KLibs classes and functions
 
 import klibs
@@ -11,25 +16,36 @@ from klibs.KLUtilities import deg_to_px
 from klibs.KLBoundary import CircleBoundary
 from klibs.KLTime import Stopwatch
 from klibs.KLEventQueue import pump, flush
+from klibs.KLResponseCollectors import ResponseCollector, ColorWheelResponse
 from klibs.KLUserInterface import any_key, ui_request, key_pressed, smart_sleep, hide_cursor
+from klibs.KLUserInterface import show_cursor
 from klibs.KLGraphics import KLDraw as kld
 from klibs.KLGraphics import fill, flip, blit
-from klibs.KLGraphics import NumpySurface as NpS
-from klibs.KLResponseCollectors import (
-    ResponseCollector, KeyPressResponse, ColorWheelResponse,
-)
 from klibs.KLEventInterface import TrialEventTicket as ET
 from klibs.KLCommunication import message
 
 # Import additional required libraries
 
-import time
+import os
 import math
 import random
-from copy import copy
 
-from colormath.color_objects import LCHuvColor, sRGBColor
-from colormath.color_conversions import convert_color
+from spectrum import load_spectrum, lchuv_to_srgb, HueIndex
+from cache import TextCache
+from stimuli import dot_grid
+from wheel import IndexedColorWheel
+from timing import PresentationLog, FrameScheduler, LuminanceRamp, AllocationMonitor
+from timing import StartupProfiler, StageTimer
+from gaze import GazeStream, DriftCorrectPolicy, read_eyelink_samples, read_mouse_samples
+from datastore import AsyncWriter
+from pupil import PupilCalibration
+from planner import BlockPlanner
+from layout import StaticLayout
+from pool import StimulusPool, RecolorableEllipse
+from session_log import SessionRecorder
+from markers import MarkerChannel
+
+IMPORT_TIME = time.perf_counter() - _import_start
 
 
 # Define colours for the experiment
@@ -40,6 +56,10 @@ DARK_GREY = [64, 64, 64, 255]
 MED_GREY = [128, 128, 128, 255]
 LIGHT_GREY = [192, 192, 192, 255]
 
+GAZE_COLS = [
+    "participant_id", "block_num", "trial_num", "time", "x", "y", "pupil", "in_bounds"
+]
+
 
 mixed_instructions = (
     "During this block, you will need to remember the colours of targets on some "
@@ -53,17 +73,25 @@ mixed_instructions = (
 class ColourWheelEffort(klibs.Experiment):
 
     def setup(self):
+
+        # Time each phase of setup (reported at the end of setup if startup
+        # profiling is enabled)
+        profile = P.profile_startup or "CWE_PROFILE_STARTUP" in os.environ
+        self.startup = StartupProfiler(enabled=profile)
+        self.startup.add("experiment imports", IMPORT_TIME)
         
-        # Colour spectrum
-        cieluv = []
-        for i in range(0, 360):
-            rgb = convert_color(LCHuvColor(75, 59, i, illuminant='d65'), sRGBColor)
-            cieluv.append(rgb.get_upscaled_value_tuple())
+        # Colour spectrum (cached to disk after first launch)
+        cache_dir = os.path.join(P.resources_dir, "cache")
+        cieluv = load_spectrum(
+            75, 59, P.spectrum_resolution, illuminant='d65', cache_dir=cache_dir
+        )
+        self.hue_index = HueIndex(cieluv)
+        self.wheel_colors = cieluv
+        self.startup.lap("colour spectrum")
 
         # Other colors
         self.bg_fill = P.default_fill_color
-        stim_grey = convert_color(LCHuvColor(75, 0, 0, illuminant='d65'), sRGBColor)
-        self.stim_grey = stim_grey.get_upscaled_value_tuple()
+        self.stim_grey = tuple(lchuv_to_srgb(75, 0, 0, illuminant='d65')[0].tolist())
 
         # Stimulus Sizes
         probe_area = 0.4 # degrees^2
@@ -95,78 +123,148 @@ class ColourWheelEffort(klibs.Experiment):
             x, y = offsets
             dc_pts += [(-x, y), (x, -y), (y, x), (-y, -x)]
         
+        # Initialize the pool of fixation/cue stimuli that get recoloured in place
+        # between trials
+        self.stim_pool = StimulusPool({
+            cue_type: self._render_stimulus(cue_type, self.stim_grey)
+            for cue_type in self.cue_pts.keys()
+        })
+        self.startup.lap("fixation/cue stimuli")
+
         # Stimulus Drawbjects (the rest are generated dynamically in trial_prep)
         self.dc_fixation = dot_grid(
             dc_pts, self.dot_size, self.dot_spacing, self.stim_grey
         )
-        self.fixation = dot_grid(
-            self.cue_pts["fixation"], self.dot_size, self.dot_spacing, self.stim_grey
-        )
+        self.fixation = self.render_fixation(self.stim_grey)
         self.box = kld.Rectangle(box_size)
         self.box.stroke = [self.box_stroke, self.stim_grey, STROKE_INNER]
-        self.wheel  = kld.ColorWheel(wheel_size, thickness=wheel_thickness, colors=cieluv)
         self.placeholder = kld.Ellipse(self.probe_diameter, fill=self.stim_grey)
+        self.probe = RecolorableEllipse(self.probe_diameter, fill=self.stim_grey)
+        self.probe.recolor(self.stim_grey)
+        self.startup.lap("drawbjects")
+
+        # Colour wheel (its hue index is cached to disk after first launch)
+        self.wheel = IndexedColorWheel(wheel_size, thickness=wheel_thickness, colors=cieluv)
+        self.wheel.build_index(cache_dir=cache_dir)
+        self.startup.lap("colour wheel index")
         
         # Layout
         box_offset = deg_to_px(6.0)
         self.box_l_pos = (P.screen_c[0]-box_offset, P.screen_c[1])
         self.box_r_pos = (P.screen_c[0]+box_offset, P.screen_c[1])
+        self.probe_region = (box_size, box_size)
+
+        # Pre-composite the static parts of the trial screen (boxes and
+        # placeholders) into a single surface
+        self.layout = StaticLayout(self.bg_fill)
+        for stim in (self.box, self.placeholder):
+            self.layout.add(stim, self.box_l_pos)
+            self.layout.add(stim, self.box_r_pos)
 
         # Timing
         self.probe_duration = 150 # ms
         self.detection_timeout = (1000 + self.probe_duration) / 1000 # seconds
-        
+        self.wheel_timeout = 60 # seconds
+        self.presentation = PresentationLog(P.refresh_rate)
+        self.scheduler = FrameScheduler(P.refresh_rate, P.idle_wake_ms / 1000.0)
+        self.allocations = AllocationMonitor(P.defer_gc)
+        self.startup.lap("layout and timing")
+
         # Initialize colour wheel ResponseCollector
         self.wheel_rc = ResponseCollector(uses=[ColorWheelResponse])
-        self.wheel_rc.terminate_after = [60, TK_S]
+        self.wheel_rc.terminate_after = [self.wheel_timeout, TK_S]
         self.wheel_rc.display_callback = self.wheel_callback
         self.wheel_rc.color_listener.interrupts = True
         self.wheel_rc.color_listener.color_response = True
         self.wheel_rc.color_listener.set_wheel(self.wheel)
-
+        
         # Add fixation boundary to eye tracker
         fix_bounds = CircleBoundary('fixation', P.screen_c, fixation_size * 3.0)
         self.el.add_boundary(fix_bounds)
+        self.startup.lap("fixation boundary")
+
+        # Initialize the session input log (if enabled) for replaying sessions
+        log_path = None
+        if P.record_sessions:
+            log_name = "p{0}_{1}.cwlog".format(P.participant_id, P.random_seed)
+            log_path = os.path.join(P.data_dir, "sessions", log_name)
+        self.session = SessionRecorder(
+            log_path, P.random_seed, (P.screen_x, P.screen_y), P.ppd, P.refresh_rate
+        )
+
+        # Initialize batched gaze sample stream for monitoring fixation
+        reader = read_mouse_samples if "TryLink" in self.el.version else read_eyelink_samples
+        self.gaze = GazeStream(
+            lambda: self.session.gaze(reader(self.el)), P.screen_c, fixation_size * 3.0,
+            P.gaze_break_ms
+        )
+
+        # Initialize policy for skipping drift correction while gaze error stays
+        # low, and timer for the stages of each trial's preparation
+        self.drift_policy = DriftCorrectPolicy(
+            P.adaptive_drift_correct, deg_to_px(P.drift_skip_threshold),
+            P.drift_skip_window, P.drift_max_skips
+        )
+        self.prep_timer = StageTimer()
+        self.trial_end = None
+
+        # Initialize background writer for trial, timing, and gaze data
+        self.writer = AsyncWriter(P.database_path, P.db_queue_size)
+
+        # Initialize channel for sending stimulus event markers to the tracker
+        # in batches, backdated to their flip times
+        self.markers = MarkerChannel(self.el.write)
+        self.startup.lap("gaze stream and database writer")
 
         # Add separate practice blocks for easy/difficult trials
         self.num_practice_blocks = 0
+        self.practice_block_size = 16
         if P.run_practice_blocks:
-            self.insert_practice_block(1, 16, factor_mask={'easy_trial': True})
-            self.insert_practice_block(2, 16, factor_mask={'easy_trial': False})
+            n = self.practice_block_size
+            self.insert_practice_block(1, n, factor_mask={'easy_trial': True})
+            self.insert_practice_block(2, n, factor_mask={'easy_trial': False})
             self.num_practice_blocks = 2
 
+        # Pre-render all fixed messages (block messages, breaks, and error feedback)
+        # so they can be shown without any text layout delay
+        self.text_cache = TextCache(self._render_text, P.text_cache_size)
+        fixed_msgs = [
+            ("Press any key to start.", None, "left"),
+            ("Take a break if you need one!", None, "left"),
+            ("When ready, press any key to start the next trial.", None, "left"),
+        ]
+        for err in ["Responded too soon!", "Looked away!", "Too slow!"]:
+            fixed_msgs.append((err, "alert", "left"))
+        for block_num in range(1, P.blocks_per_experiment + 1):
+            fixed_msgs.append((self.block_message(block_num), None, "center"))
+        self.text_cache.prefill(fixed_msgs)
+        self.startup.lap("message pre-rendering")
+
         # Before we start, measure the size range of the participant's pupil
         self.get_pupil_range()
+        self.startup.lap("pupil calibration (participant-paced)")
 
         # Show the task instructions to the participant
         self.task_demo()
+        self.startup.lap("task demo (participant-paced)")
+
+        # Move everything created during setup out of the garbage collector's
+        # reach so collections between trials stay quick
+        self.allocations.freeze()
+        self.startup.lap("garbage collector freeze")
+        self.startup.report()
     
 
     def block(self):
-        # At the start of each block, display a start message.
-        if P.practicing:
-            block = P.block_number
-            n_blocks = self.num_practice_blocks
-            txt = "Practice Block {0} of {1}".format(block, n_blocks)
-        else:
-            block = P.block_number - self.num_practice_blocks
-            n_blocks = P.blocks_per_experiment - self.num_practice_blocks
-            txt = "Block {0} of {1}".format(block, n_blocks)
+        # Plan the random parameters of every trial in the block from a recorded
+        # seed
+        n_trials = self.practice_block_size if P.practicing else P.trials_per_block
+        seed = "{0}-{1}".format(P.random_seed, P.block_number)
+        self.planner = BlockPlanner(seed, self._plan_trial)
+        self.planner.plan(n_trials)
 
-        if P.run_practice_blocks and P.block_number == 1:
-            txt += "\n\n" + (
-                "During this block, you do not need to pay attention to the colour "
-                "of the\ntargets. Just try to respond quickly when targets appear."
-            )
-        elif P.run_practice_blocks and P.block_number == 2:
-            txt += "\n\n" + (
-                "During this block, please pay attention to the colour of each target "
-                "as you\nwill be asked to accurately identify its colour at the end of "
-                "each trial."
-            )
-        else:
-            txt += "\n\n" + mixed_instructions
-        msg = message(txt, align="center", blit_txt=False)
+        # At the start of each block, display a start message.
+        msg = self.text_cache.text(self.block_message(P.block_number), align="center")
 
         # Show block message and wait 1500 ms before allowing block start
         fill()
@@ -174,25 +272,48 @@ class ColourWheelEffort(klibs.Experiment):
         flip()
         smart_sleep(1500)
         
-        start_msg = message("Press any key to start.", blit_txt=False)
+        start_msg = self.text_cache.text("Press any key to start.")
         fill()
         blit(msg, 8, (P.screen_c[0], P.screen_y * 0.35))
         blit(start_msg, 5, (P.screen_c[0], P.screen_y * 0.7))
         flip()
         any_key()
 
+        # Always drift correct at the start of a block
+        self.drift_policy.reset()
 
-    def trial_prep(self):
 
-        # Reset the colour probe at the start of each trial
-        self.probe = kld.Ellipse(self.probe_diameter, fill=None)
+    def trial_prep(self):
+        # Clear the last trial's gaze samples and event markers and start
+        # counting allocations
+        self.prep_timer.start()
+        self.gaze.start_trial()
+        self.markers.clear()
+        self.allocations.start()
+
+        # Start recording the trial's inputs (if enabled)
+        self.session.start_trial(P.block_number, P.trial_number, {
+            "probe_location": self.probe_location,
+            "catch_trial": self.catch_trial,
+            "cue_validity": self.cue_validity,
+            "easy_trial": self.easy_trial,
+            "practicing": P.practicing,
+        })
+
+        # Get the planned wheel rotation, probe colour, and probe onset for the
+        # trial and recolour the probe to match
+        plan = self.planner.next()
+        self.probe.recolor(plan['color'])
         self.wheel_rc.color_listener.set_target(self.probe)
+        self.probe_angle = plan['probe_angle']
+        self.probe_onset = plan['probe_onset']
+        self.prep_timer.lap("plan")
         
-        # Set up colour probe and colour wheel
-        self.wheel.rotation = random.randrange(0, 360, 1)
+        # Set up colour wheel (re-rendering the wheel just remaps the hues of the
+        # pre-drawn ring to the new rotation)
+        self.wheel.rotation = plan['rotation']
         self.wheel.render()
-        self.probe.fill = self.wheel.color_from_angle(random.randrange(0, 360, 1))
-        self.probe.render()
+        self.prep_timer.lap("wheel_render")
 
         # Determine probe location and cue type for the trial
         self.probe_loc = self.box_l_pos if self.probe_location == "L" else self.box_r_pos
@@ -203,26 +324,57 @@ class ColourWheelEffort(klibs.Experiment):
         else:
             cue_type = "neutral"
         
-        # Dynamically alter the fixation/cue stimuli between trials
-        fix_col = self.probe.fill_color if self.easy_trial else self.stim_grey
-        self.fixation = self.render_fixation(fix_col)
-        self.cue = self.render_cue(cue_type, fix_col)
+        # Dynamically recolour the fixation/cue stimuli between trials
+        fix_col = plan['color'] if self.easy_trial else self.stim_grey
+        self.fixation = self.stim_pool.recolor("fixation", fix_col)
+        self.cue = self.stim_pool.recolor(cue_type, fix_col)
+        self.prep_timer.lap("stim_render")
         
         # Add timecourse of events to EventManager
-        self.probe_onset = random.randrange(1000, 1550, 50)
         events = []
         events.append([1000, 'cue_on'])
         events.append([1000 + self.probe_onset, 'probe_on'])
         events.append([events[-1][0] + self.probe_duration, 'probe_off'])
         for e in events:
             self.evm.register_ticket(ET(e[1], e[0]))
-
-        # If it's been 40 trials since the last block or break, present break message
+        self.scheduler.plan(events)
+        self.prep_timer.lap("tickets")
+
+        # Log requested stimulus timings for comparison with actual flip times
+        self.presentation.start_trial()
+        self.presentation.request('cue_on', 'fix_on', 1000)
+        self.presentation.request('probe_on', 'cue_on', self.probe_onset)
+        self.presentation.request('probe_off', 'probe_on', self.probe_duration)
+
+        # Record which planned trial was used for the trial
+        self.writer.insert("trial_plan", {
+            "participant_id": P.participant_id,
+            "block_num": P.block_number,
+            "trial_num": P.trial_number,
+            "seed": self.planner.seed,
+            "plan_index": plan['plan_index'],
+            "wheel_rotation": plan['rotation'],
+            "probe_angle": self.probe_angle,
+            "probe_onset": self.probe_onset,
+        })
+        self.prep_timer.lap("data_writes")
+
+        # If it's been 40 trials since the last block or break, present break
+        # message (and make sure the next trial is drift corrected)
         if P.trial_number > 1 and P.trial_number % 40 == 1:
             self.break_msg()
-
-        # Perform drift correct before each trial
-        self.el.drift_correct(target=self.dc_fixation)
+            self.drift_policy.reset()
+        self.prep_timer.lap("break_msg")
+
+        # Perform drift correct before each trial, unless adaptive drift correction
+        # is enabled and gaze error has stayed low since the last one
+        self.gaze_error = self.drift_policy.recent_error / P.ppd
+        if self.drift_policy.skip():
+            self.drift_outcome = "skipped"
+        else:
+            self.el.drift_correct(target=self.dc_fixation)
+            self.drift_outcome = "corrected"
+        self.prep_timer.lap("drift_correct")
         
 
     def trial(self):
@@ -241,77 +393,97 @@ class ColourWheelEffort(klibs.Experiment):
             "angle_err": "NA",
             "probe_col": str(tuple(self.probe.fill_color[:3])),
             "response_col": "NA",
-            "probe_angle": self.wheel.angle_from_color(self.probe.fill_color),
+            "probe_angle": self.probe_angle,
             "response_angle": "NA",
             "trial_err": "NA",
         }
 
+        # Defer garbage collection until the end of the trial (if enabled)
+        self.allocations.hold()
+
         # Draw fixation + cue placeholders to the screen
         self.draw_screen_layout()
         blit(self.fixation, 5, P.screen_c)
         flip()
+        fix_on = self.presentation.stamp('fix_on')
+        self.markers.add('trial_start', fix_on)
+        self.iti = None if self.trial_end is None else (fix_on - self.trial_end) * 1000
+        self.session.mark('fix_on')
+        self.scheduler.start()
 
         # Wait for cue onset and ensure gaze stays within fixation
-        self.el.write("trial_start b{0} t{1}".format(P.block_number, P.trial_number))
-        while self.evm.before('cue_on'):
-            if key_pressed(' '):
+        while self.scheduler.before('cue_on'):
+            if self.session.key(' ', key_pressed(' ')):
                 trialdat["trial_err"] = "too_soon"
                 self.err_msg("Responded too soon!")
                 return trialdat
-            if self.el.saccade_from_boundary('fixation'):
+            if self.gaze.poll():
                 #if not self.el.within_boundary('fixation', EL_GAZE_POS):
                 trialdat["trial_err"] = "gaze_err"
                 self.err_msg("Looked away!")
                 return trialdat
+            self.scheduler.idle('cue_on')
 
         # Replace fixation with isoluminant cue stimulus
         self.draw_screen_layout()
         blit(self.cue, 5, P.screen_c)
         flip()
+        self.markers.add('cue_on', self.presentation.stamp('cue_on'))
+        self.session.mark('cue_on')
         
         # Wait for probe onset and ensure gaze stays within fixation
-        self.el.write("cue_on b{0} t{1}".format(P.block_number, P.trial_number))
-        while self.evm.before('probe_on'):
-            if key_pressed(' '):
+        while self.scheduler.before('probe_on'):
+            if self.session.key(' ', key_pressed(' ')):
                 trialdat["trial_err"] = "too_soon"
                 self.err_msg("Responded too soon!")
                 return trialdat
-            if self.el.saccade_from_boundary('fixation'):
+            if self.gaze.poll():
                 #if not self.el.within_boundary('fixation', EL_GAZE_POS):
                 trialdat["trial_err"] = "gaze_err"
                 self.err_msg("Looked away!")
                 return trialdat
+            self.scheduler.idle('probe_on')
         
         # Present probe (unless catch trial)
-        self.draw_screen_layout()
+        if P.dirty_rect_updates:
+            self.restore_region(P.screen_c, self.cue.shape[1::-1])
+        else:
+            self.draw_screen_layout()
         blit(self.cue, 5, P.screen_c)
         if not self.catch_trial:
             blit(self.probe, 5, self.probe_loc)
         flip()
+        self.markers.add('probe_on', self.presentation.stamp('probe_on'))
+        self.session.mark('probe_on')
 
         # Enter collection loop for detection response
         probe_on = True
         timer = Stopwatch()
-        self.el.write("probe_on b{0} t{1}".format(P.block_number, P.trial_number))
+        probe_off_at = time.perf_counter() + self.scheduler.lead_time(self.probe_duration)
         flush()
         while timer.elapsed() < self.detection_timeout:
             q = pump(True)
             # Log RT immediately on space bar press
-            if key_pressed(' ', queue=q):
+            if self.session.key(' ', key_pressed(' ', queue=q)):
                 trialdat["probe_rt"] = timer.elapsed() * 1000
                 break
             # Stop trial and show error if gaze leaves fixation before response
-            if self.el.saccade_from_boundary('fixation'):
+            if self.gaze.poll():
                 #if not self.el.within_boundary('fixation', EL_GAZE_POS):
                 trialdat["trial_err"] = "gaze_err"
                 self.err_msg("Looked away!")
                 return trialdat
             # Remove probe after probe duration elapsed
-            if probe_on and (timer.elapsed() * 1000) > self.probe_duration:
-                self.draw_screen_layout()
-                blit(self.cue, 5, P.screen_c)
+            if probe_on and time.perf_counter() >= probe_off_at:
+                if P.dirty_rect_updates:
+                    self.restore_region(self.probe_loc, self.probe_region)
+                else:
+                    self.draw_screen_layout()
+                    blit(self.cue, 5, P.screen_c)
                 flip()
+                self.markers.add('probe_off', self.presentation.stamp('probe_off'))
                 probe_on = False
+            self.scheduler.idle(probe_off_at if probe_on else None)
 
         # Show error if participant responds on a catch trial or times out on a
         # non-catch trial
@@ -329,8 +501,7 @@ class ColourWheelEffort(klibs.Experiment):
         # If difficult trial, present the colour wheel and wait for a response
         if not self.catch_trial and not self.easy_trial:
 
-            self.el.write("wheel_on b{0} t{1}".format(P.block_number, P.trial_number))
-            self.wheel_rc.collect()
+            self.collect_wheel_response()
 
             if self.wheel_rc.color_listener.timed_out:
                 trialdat["wheel_rt"] = "timeout"
@@ -339,13 +510,77 @@ class ColourWheelEffort(klibs.Experiment):
                 trialdat["wheel_rt"] = self.wheel_rc.color_listener.response(value=False)
                 trialdat["angle_err"] = wheel_resp[0]
                 trialdat["response_col"] = str(tuple(wheel_resp[1][:3]))
-                trialdat["response_angle"] = self.wheel.angle_from_color(wheel_resp[1])
+                trialdat["response_angle"] = self.hue_index.angle(wheel_resp[1])
 
         return trialdat
 
 
     def trial_clean_up(self):
         self.wheel_rc.reset()
+        self.trial_end = time.perf_counter()
+        self.scheduler.stop()
+
+        # Send any unsent event markers for the trial to the tracker, and log
+        # all of the trial's markers to the database
+        self.markers.flush(self.marker_suffix())
+        t0 = self.markers.sent[0][1] if self.markers.sent else 0.0
+        rows = [
+            (P.participant_id, P.block_number, P.trial_number, label, (t - t0) * 1000, offset)
+            for label, t, offset in self.markers.sent
+        ]
+        cols = ['participant_id', 'block_num', 'trial_num', 'label', 'flip_time', 'offset']
+        self.writer.insert_many("trial_events", cols, rows)
+
+        # Log memory allocations and garbage collections during the trial
+        mem = self.allocations.stop()
+        mem['participant_id'] = P.participant_id
+        mem['block_num'] = P.block_number
+        mem['trial_num'] = P.trial_number
+        mem['gc_deferred'] = P.defer_gc
+        self.writer.insert("trial_memory", mem)
+
+        # Log the measured vs. requested stimulus timings for the trial
+        for interval in self.presentation.trial_intervals():
+            interval['participant_id'] = P.participant_id
+            interval['block_num'] = P.block_number
+            interval['trial_num'] = P.trial_number
+            self.writer.insert("trial_timing", interval)
+
+        # Write all gaze samples recorded during the trial to the database
+        if P.log_gaze_samples:
+            trial_info = (P.participant_id, P.block_number, P.trial_number)
+            rows = [
+                trial_info + tuple(s[:4]) + (int(s[4]), )
+                for s in self.gaze.samples().tolist()
+            ]
+            self.writer.insert_many("gaze_samples", GAZE_COLS, rows)
+
+        # Log how long each stage of the trial's preparation took, along with
+        # the gaze error the drift correction policy was based on
+        timing = dict(self.prep_timer.stages)
+        timing.update({
+            "participant_id": P.participant_id,
+            "block_num": P.block_number,
+            "trial_num": P.trial_number,
+            "drift_outcome": self.drift_outcome,
+            "gaze_error": None if math.isnan(self.gaze_error) else self.gaze_error,
+            "prep_total": self.prep_timer.total(),
+            "iti": self.iti,
+        })
+        self.writer.insert("trial_prep_timing", timing)
+        self.drift_policy.record(self.gaze.fixation_error())
+
+
+    def __log_trial__(self, trial_data):
+        # Queue trial data for the background writer instead of writing it to
+        # the database synchronously between trials
+        row = {"participant_id": P.participant_id}
+        row.update(trial_data)
+        self.writer.insert(P.primary_table, row)
+
+        # Write the trial's recorded inputs to the session log (if enabled)
+        self.session.trial_data(trial_data)
+        self.session.flush()
 
 
     def clean_up(self):
@@ -362,18 +597,78 @@ class ColourWheelEffort(klibs.Experiment):
             message("Transferring EyeLink data, please wait...", location=P.screen_c)
             flip()
 
+        # Make sure all queued data and session inputs have been written
+        self.writer.close()
+        self.session.close()
+
+        # Print the session's timing, memory, and database stats (in development
+        # mode only)
+        if P.development_mode:
+            self.print_session_stats()
+
+
+    def print_session_stats(self):
+        sched = self.scheduler.report()
+        print("Trial loop CPU use: {0:.1f}%, max gap between input checks: {1:.2f} ms"
+              .format(sched['cpu_utilisation'] * 100, sched['max_poll_gap_ms']))
+        print("Wake-up latency histogram (ms): " + ", ".join(
+            "<={0}: {1}".format(edge, n) for edge, n in sched['wake_latency_ms']))
+        mem = self.allocations.summary()
+        print("Memory blocks allocated per trial: mean = {mean_blocks:.1f}, max = "
+              "{max_blocks}; {collections} garbage collections during {trials_with_gc} "
+              "of {n} trials".format(**mem))
+        print("Drift correction skipped on {0} trials".format(self.drift_policy.skipped))
+        for event, t in self.presentation.summary().items():
+            print("Timing error for {0} (n = {1}): mean = {2:.2f} ms, SD = {3:.2f} ms, "
+                  "max overshoot = {4:.2f} ms".format(
+                      event, t['n'], t['mean'], t['sd'], t['max_over']))
+        print("Database writer: {written}/{queued} rows written in {commits} "
+              "commits (max queue depth = {max_depth}, mean commit = "
+              "{mean_commit_ms:.2f} ms, max commit = {max_commit_ms:.2f} ms)"
+              .format(**self.writer.stats))
+
 
     def draw_screen_layout(self):
         fill(self.bg_fill)
-        blit(self.box, 5, self.box_l_pos)
-        blit(self.box, 5, self.box_r_pos)
-        blit(self.placeholder, 5, self.box_l_pos)
-        blit(self.placeholder, 5, self.box_r_pos)
+        blit(self.layout.surface, 7, self.layout.origin)
+
+
+    def restore_region(self, location, size):
+        # Redraw the static layout over a region of the previous frame (only safe
+        # when the back buffer keeps the previous trial screen between flips)
+        patch, corner = self.layout.patch(location, size)
+        blit(patch, 7, corner)
+
+
+    def block_message(self, block_num):
+        # Get the start message for a given block
+        if block_num <= self.num_practice_blocks:
+            n_blocks = self.num_practice_blocks
+            txt = "Practice Block {0} of {1}".format(block_num, n_blocks)
+        else:
+            block = block_num - self.num_practice_blocks
+            n_blocks = P.blocks_per_experiment - self.num_practice_blocks
+            txt = "Block {0} of {1}".format(block, n_blocks)
+
+        if P.run_practice_blocks and block_num == 1:
+            txt += "\n\n" + (
+                "During this block, you do not need to pay attention to the colour "
+                "of the\ntargets. Just try to respond quickly when targets appear."
+            )
+        elif P.run_practice_blocks and block_num == 2:
+            txt += "\n\n" + (
+                "During this block, please pay attention to the colour of each target "
+                "as you\nwill be asked to accurately identify its colour at the end of "
+                "each trial."
+            )
+        else:
+            txt += "\n\n" + mixed_instructions
+        return txt
 
 
     def break_msg(self):
-        msg1 = message("Take a break if you need one!")
-        msg2 = message("When ready, press any key to start the next trial.")
+        msg1 = self.text_cache.text("Take a break if you need one!")
+        msg2 = self.text_cache.text("When ready, press any key to start the next trial.")
         fill()
         blit(msg1, 2, P.screen_c)
         flip()
@@ -386,29 +681,135 @@ class ColourWheelEffort(klibs.Experiment):
 
 
     def err_msg(self, msg):
-        err = message(msg, "alert", blit_txt=False)
+        err = self.text_cache.text(msg, "alert")
         fill()
         blit(err, 5, P.screen_c)
         flip()
         smart_sleep(1000)
 
     
-    def wheel_callback(self):
+    def marker_suffix(self):
+        # Identifies the current trial in the tracker's event marker messages
+        return " b{0} t{1}".format(P.block_number, P.trial_number)
+
+
+    def draw_wheel(self):
         fill(self.bg_fill)
         blit(self.wheel, location=P.screen_c, registration=5)
         flip()
 
 
+    def wheel_callback(self):
+        # The wheel is drawn once before collection starts and never changes, so
+        # there's nothing to redraw between input checks
+        self.scheduler.idle()
+
+
+    def collect_wheel_response(self):
+        # Show the colour wheel and collect a click on its ring with KLibs'
+        # ColorWheelResponse, which also scores the response's angular error
+        self.draw_wheel()
+        self.markers.add('wheel_on')
+
+        # Send the trial's markers (including wheel onset) to the tracker now
+        # that timing-critical presentation is over, so they arrive while the
+        # trial's pupil epoch is still recent
+        self.markers.flush(self.marker_suffix())
+        flush() # ignore any clicks made before the wheel appeared
+        show_cursor()
+        self.session.mark('wheel_on')
+        self.wheel_rc.collect()
+        hide_cursor()
+
+        # Record where on the ring the response colour was (if recording)
+        listener = self.wheel_rc.color_listener
+        if not listener.timed_out:
+            color = listener.response(rt=False)[1]
+            pos = self.wheel.location_of(color, P.screen_c)
+            if pos is not None:
+                self.session.click(pos, offset=listener.response(value=False) / 1000.0)
+
+
+    def _render_text(self, text, style, align):
+        return message(text, style, align=align, blit_txt=False)
+
+
     def render_fixation(self, color):
-        fix_pts = self.cue_pts["fixation"]
-        return dot_grid(fix_pts, self.dot_size, self.dot_spacing, color)
+        return self._render_stimulus("fixation", color)
 
 
     def render_cue(self, cue_type, color):
+        return self._render_stimulus(cue_type, color)
+
+
+    def _render_stimulus(self, cue_type, color):
         cue_pts = self.cue_pts[cue_type]
         return dot_grid(cue_pts, self.dot_size, self.dot_spacing, color)
 
 
+    def _plan_trial(self, rng):
+        # Randomly select the wheel rotation, probe colour, and probe onset for
+        # a trial (must only use the provided random generator)
+        color = self.wheel_colors[rng.randrange(len(self.wheel_colors))]
+        return {
+            'rotation': rng.randrange(0, 360, 1),
+            'color': color,
+            'probe_angle': self.hue_index.angle(color),
+            'probe_onset': rng.randrange(1000, 1550, 50),
+        }
+
+
+    def calibration_hold(self, duration, phase, luminance):
+        # Hold the current screen for a given duration (in ms), collecting pupil
+        # samples in the meantime
+        end = time.perf_counter() + duration / 1000.0
+        while time.perf_counter() < end:
+            ui_request()
+            self.update_pupil_stats(phase, luminance)
+            time.sleep(0.01)
+
+
+    def luminance_ramp(self, phase, start, end):
+        # Ramp the screen between two grey levels over a fixed duration,
+        # regardless of refresh rate
+        ramp = LuminanceRamp(start, end, P.pupil_ramp_duration, P.refresh_rate)
+        last_ui = [0.0]
+        def present(level):
+            # Only check for quit/pause requests every 100 ms during the ramp
+            if time.perf_counter() - last_ui[0] > 0.1:
+                ui_request()
+                last_ui[0] = time.perf_counter()
+            fill((level, level, level))
+            flip()
+            self.update_pupil_stats(phase, level)
+        flips = ramp.run(present)
+
+        # Log each change in the presented grey level to the EDF (backdated to
+        # its flip time) and every presented frame to the database in single
+        # batches after the ramp is done
+        self.markers.clear()
+        prev_level = None
+        for frame, level, t in flips:
+            if level != prev_level:
+                self.markers.add("PUPIL_LUMINANCE {0} {1}".format(phase, level), t)
+                prev_level = level
+        self.markers.flush()
+        self.markers.clear()
+        t0 = flips[0][2]
+        rows = [
+            (P.participant_id, phase, frame, level, (t - t0) * 1000)
+            for frame, level, t in flips
+        ]
+        cols = ['participant_id', 'phase', 'frame', 'luminance', 'flip_time']
+        self.writer.insert_many("luminance_log", cols, rows)
+
+
+    def update_pupil_stats(self, phase, luminance):
+        # Add any new pupil samples to the running calibration stats
+        pupil = [s[3] if s[3] > 0 else float('nan') for s in self.gaze.reader()]
+        self.pupil_cal.add(phase, luminance, pupil)
+
+
     def show_demo_text(self, msgs, stim_set, duration=1.0, wait=True, msg_y=None):
         msg_x = int(P.screen_x / 2)
         msg_y = int(P.screen_y * 0.25) if msg_y is None else msg_y
@@ -437,7 +838,8 @@ class ColourWheelEffort(klibs.Experiment):
         # Render stimuli
         target_col = self.wheel.color_from_angle(random.randrange(0, 360, 1))
         cue = self.render_cue(cue_type, self.stim_grey)
-        target = kld.Ellipse(self.probe_diameter, fill=target_col)
+        self.probe.recolor(target_col)
+        target = self.probe
         # Show example event sequence
         if pretarget:
             self.show_demo_text(
@@ -459,8 +861,7 @@ class ColourWheelEffort(klibs.Experiment):
 
     def task_demo(self):
         # Initialize task stimuli for the demo
-        self.probe = kld.Ellipse(self.probe_diameter, fill=None)
-        self.probe.fill = self.wheel.color_from_angle(90)
+        self.probe.recolor(self.wheel.color_from_angle(90))
         fixation_grey = self.render_fixation(self.stim_grey)
         base_layout = [
             (self.box, self.box_l_pos),
@@ -468,6 +869,7 @@ class ColourWheelEffort(klibs.Experiment):
             (self.placeholder, self.box_l_pos),
             (self.placeholder, self.box_r_pos),
         ]
+        self.startup.lap("demo preparation")
         
         # Actually run through demo
         self.show_demo_text(
@@ -521,7 +923,7 @@ class ColourWheelEffort(klibs.Experiment):
             [(self.wheel, P.screen_c)], msg_y=int(P.screen_y * 0.1)
         )
         demo_col = self.wheel.color_from_angle(180)
-        self.probe.fill = demo_col
+        self.probe.recolor(demo_col)
         fixation_col = self.render_fixation(demo_col)
         self.show_demo_text(
             ("On the other hand, if the trial starts with a *colorful* fixation cross, "
@@ -562,6 +964,7 @@ class ColourWheelEffort(klibs.Experiment):
         fill()
         blit(msg1, 2, P.screen_c)
         flip()
+        self.startup.lap("first screen")
         # Wait 1500 ms before allowing participant to start
         smart_sleep(1500)
         fill()
@@ -576,56 +979,36 @@ class ColourWheelEffort(klibs.Experiment):
         flip()
 
         # Start recording and hold on black screen for 4 sec
+        self.pupil_cal = PupilCalibration()
         self.el.start(trial_number=0)
         self.el.write("PUPIL_BASELINE START")
-        smart_sleep(5000)
+        self.calibration_hold(5000, "START", l)
 
         # Slowly ramp up to maximum brigthness (~4 sec)
         self.el.write("PUPIL_BASELINE INCREASE")
-        while l < 255:
-            ui_request()
-            fill((l, l, l))
-            flip()
-            l += 1
+        self.luminance_ramp("INCREASE", 0, 255)
+        l = 255
 
         # Hold at maximum brightness for 4 sec
         self.el.write("PUPIL_BASELINE MAXIMUM")
-        smart_sleep(4000)
+        self.calibration_hold(4000, "MAXIMUM", l)
 
         # Slowly ramp down to minimum brightness (~4 sec)
         self.el.write("PUPIL_BASELINE DECREASE")
-        while l > 0:
-            ui_request()
-            fill((l, l, l))
-            flip()
-            l -= 1
+        self.luminance_ramp("DECREASE", 255, 0)
+        l = 0
 
         # Hold at minimum brightness for 4 sec, then stop recording
         self.el.write("PUPIL_BASELINE MINIMUM")
-        smart_sleep(5000)
+        self.calibration_hold(5000, "MINIMUM", l)
         self.el.write("PUPIL_BASELINE END")
         self.el.stop()
 
-
-
-def dot_grid(points, diameter, spacing, color):
-    # Determine canvas size
-    x_max, y_max = (0, 0)
-    for x, y in points:
-        x_max = abs(x) if abs(x) > x_max else x_max
-        y_max = abs(y) if abs(y) > y_max else y_max
-    surf_w = (x_max * 2) * spacing + diameter
-    surf_h = (y_max * 2) * spacing + diameter
-
-    # Render point and surface
-    pt = kld.Ellipse(diameter, fill=color)
-    surf = NpS(width=surf_w, height=surf_h)
-
-    # Draw points on surface
-    sc_x, sc_y = surf.surface_c
-    for x, y in points:
-        loc = (sc_x + x * spacing, sc_y + y * spacing)
-        surf.blit(pt, 5, loc, blend=False)
-    
-    return surf.render()
-
+        # Save the participant's pupil range and luminance-response curve
+        pupil_range = self.pupil_cal.overall.summary()
+        pupil_range['participant_id'] = P.participant_id
+        self.writer.insert("pupil_range", pupil_range)
+        curve = self.pupil_cal.curve()
+        cols = ['participant_id'] + list(curve[0].keys())
+        rows = [(P.participant_id, ) + tuple(step.values()) for step in curve]
+        self.writer.insert_many("pupil_luminance", cols, rows)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""Fits a mixture model to colour wheel errors for each participant and condition.
+
+Usage:
+    python scripts/analyse_wheel.py [--db PATH | --store PATH] [--out FILE] [--boot N]
+
+For every participant and cue validity condition, the angular errors of all
+non-practice trials with a wheel response are fit with a von Mises + uniform
+mixture model (Zhang & Luck, 2008), giving the probability of a random guess
+(g) and the precision of non-guess responses (kappa, along with the matching
+circular SD in degrees). Cells are fit in parallel, and percentile bootstrap
+confidence intervals can be added with --boot.
+
+Data is read from the column store written by export_columnar.py if it exists
+(or is given with --store), and from the experiment database otherwise.
+Results are printed and, if --out is given, written to a tab-separated file.
+"""
+
+__author__ = "Austin Hurst"
+
+import os
+import sys
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(PROJECT_DIR, "ExpAssets", "Resources", "code"))
+from circstats import fit_mixture, bootstrap_mixture
+from columnar import ColumnStore, TRUE_VALUES
+
+DEFAULT_DB = os.path.join(PROJECT_DIR, "ExpAssets", "Data", "ColourWheelEffort.db")
+DEFAULT_STORE = os.path.join(PROJECT_DIR, "ExpAssets", "Data", "columnar")
+
+PARAMS = ["g", "kappa", "sd"]
+
+
+def load_store(path):
+    # Loads the participant, cue validity and error columns from a column store
+    store = ColumnStore(path)
+    if not store.rows:
+        return None
+    return (
+        np.asarray(store.column("participant_id")),
+        store.decode("cue_validity"),
+        np.asarray(store.column("angle_err")),
+        np.asarray(store.column("practice")),
+    )
+
+
+def load_db(path):
+    # Loads the participant, cue validity and error columns from the database
+    conn = sqlite3.connect(path)
+    rows = conn.execute(
+        "SELECT participant_id, cue_validity, angle_err, practice FROM trials"
+    ).fetchall()
+    conn.close()
+    if not rows:
+        return None
+    pid, cue, err, practice = zip(*rows)
+    err = np.array([v if v not in ("NA", None) else np.nan for v in err], dtype=np.float64)
+    practice = np.array([str(v).lower() in TRUE_VALUES for v in practice])
+    return np.array(pid), np.array(cue, dtype=object), err, practice
+
+
+def split_cells(pid, cue, err, practice):
+    # Groups the errors (in radians) of valid responses by participant and cue validity
+    keep = ~practice & np.isfinite(err)
+    pid, cue, err = pid[keep], cue[keep], np.radians(err[keep])
+    cells = []
+    for p in np.unique(pid):
+        in_p = pid == p
+        for c in sorted(set(cue[in_p])):
+            cells.append((int(p), c, err[in_p & (cue == c)]))
+    return cells
+
+
+def _fit_cell(job):
+    # Worker function: fits (and optionally bootstraps) a single cell
+    p, cue, errors, n_boot, seed = job
+    fit = fit_mixture(errors)
+    result = {name: float(fit[name]) for name in PARAMS}
+    result["sd"] = np.degrees(result["sd"])
+    if n_boot:
+        ci = bootstrap_mixture(errors, n_boot, seed=seed)
+        for name in PARAMS:
+            lo, hi = ci[name]
+            if name == "sd":
+                lo, hi = np.degrees(lo), np.degrees(hi)
+            result[name + "_lo"], result[name + "_hi"] = lo, hi
+    return p, cue, len(errors), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--db", default=DEFAULT_DB, help="path of the experiment database")
+    parser.add_argument("--store", default=None, help="path of an exported column store")
+    parser.add_argument("--out", default=None, help="tab-separated file to write results to")
+    parser.add_argument("--boot", type=int, default=0, help="number of bootstrap resamples per cell")
+    parser.add_argument("--seed", type=int, default=1, help="seed for bootstrap resampling")
+    parser.add_argument("--min-trials", type=int, default=20, help="skip cells with fewer trials")
+    parser.add_argument("--jobs", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    store_path = args.store or DEFAULT_STORE
+    if args.store or os.path.isfile(os.path.join(store_path, "manifest.json")):
+        data = load_store(store_path)
+    elif os.path.isfile(args.db):
+        data = load_db(args.db)
+    else:
+        sys.exit("No data found at '{0}'.".format(args.db))
+    if data is None:
+        sys.exit("No trials to analyse.")
+
+    jobs = []
+    for i, (p, cue, errors) in enumerate(split_cells(*data)):
+        if len(errors) < args.min_trials:
+            print("Skipping participant {0} ({1}): only {2} trials.".format(p, cue, len(errors)))
+            continue
+        jobs.append((p, cue, errors, args.boot, args.seed + i))
+
+    cols = ["participant_id", "cue_validity", "n"] + PARAMS
+    if args.boot:
+        cols += [name + suffix for name in PARAMS for suffix in ("_lo", "_hi")]
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        for p, cue, n, result in pool.map(_fit_cell, jobs):
+            rows.append([p, cue, n] + [result[name] for name in cols[3:]])
+
+    print("\t".join(cols))
+    for row in rows:
+        print("\t".join(v if isinstance(v, str) else "{0:.4g}".format(v) for v in row))
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write("\t".join(cols) + "\n")
+            for row in rows:
+                f.write("\t".join(str(v) for v in row) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark comparing the NumPy dot_grid renderer to the old KLibs one.
+
+Usage:
+    python scripts/bench_dot_grid.py [--repeats N]
+
+The legacy renderer requires KLibs (and aggdraw) to be installed. If they are
+not available, only the NumPy renderer is timed.
+"""
+
+__author__ = "Austin Hurst"
+
+import os
+import sys
+import timeit
+import argparse
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(__file__), "..", "ExpAssets", "Resources", "code")
+)
+from stimuli import dot_grid
+
+
+def legacy_dot_grid(points, diameter, spacing, color):
+    # The original per-point blitting renderer, kept here for comparison
+    from klibs.KLGraphics import KLDraw as kld
+    from klibs.KLGraphics import NumpySurface as NpS
+
+    x_max, y_max = (0, 0)
+    for x, y in points:
+        x_max = abs(x) if abs(x) > x_max else x_max
+        y_max = abs(y) if abs(y) > y_max else y_max
+    surf_w = (x_max * 2) * spacing + diameter
+    surf_h = (y_max * 2) * spacing + diameter
+
+    pt = kld.Ellipse(diameter, fill=color)
+    surf = NpS(width=surf_w, height=surf_h)
+
+    sc_x, sc_y = surf.surface_c
+    for x, y in points:
+        loc = (sc_x + x * spacing, sc_y + y * spacing)
+        surf.blit(pt, 5, loc, blend=False)
+
+    return surf.render()
+
+
+def point_sets():
+    line_h_pts = [(offset, 0) for offset in (-2, -1, 0, 1, 2)]
+    dense = [(x, y) for x in range(-10, 10) for y in range(-10, 10)]
+    return [
+        ("fixation (9 dots)", line_h_pts + [(0, 2), (0, 1), (0, -1), (0, -2)]),
+        ("drift correct (9 dots)", [(0, 0), (-2, 0), (2, 0), (0, 2), (0, -2),
+                                    (-1, 1), (1, -1), (1, 1), (-1, -1)]),
+        ("dense grid (400 dots)", dense),
+    ]
+
+
+def time_renderer(func, pts, repeats):
+    # Returns the best-of-5 mean time per call, in microseconds
+    timer = timeit.Timer(lambda: func(pts, 4, 6, (185, 185, 185)))
+    return min(timer.repeat(5, repeats)) / repeats * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--repeats", type=int, default=500)
+    args = parser.parse_args()
+
+    try:
+        legacy_dot_grid([(0, 0)], 4, 6, (185, 185, 185))
+        have_legacy = True
+    except ImportError:
+        print("KLibs not available, skipping legacy renderer.\n")
+        have_legacy = False
+
+    print("{0:<24} {1:>12} {2:>12} {3:>9}".format("points", "numpy (us)", "legacy (us)", "speedup"))
+    for label, pts in point_sets():
+        new = time_renderer(dot_grid, pts, args.repeats)
+        if have_legacy:
+            old = time_renderer(legacy_dot_grid, pts, max(1, args.repeats // 10))
+            print("{0:<24} {1:>12.1f} {2:>12.1f} {3:>8.1f}x".format(label, new, old, old / new))
+        else:
+            print("{0:<24} {1:>12.1f} {2:>12} {3:>9}".format(label, new, "-", "-"))
+
+
+if __name__ == "__main__":
+    main()
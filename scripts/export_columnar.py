@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Exports trial and participant data to a typed, memory-mappable column store.
+
+Usage:
+    python scripts/export_columnar.py [--db PATH] [--out PATH] [--rebuild]
+
+Unlike 'klibs export', which writes one text file per participant, this writes
+the trials of every participant (joined with their participant info) to a
+single store in ExpAssets/Data/columnar, with numeric columns as floats (NaN
+for NA/timeout values) and text columns as category codes. Re-running the
+export only appends trials that have been added since the last export, so
+participants whose sessions were in progress are picked up where they left off.
+
+To load the exported data in Python:
+
+    from columnar import ColumnStore
+    store = ColumnStore("ExpAssets/Data/columnar")
+    rt = store.column("probe_rt")            # memory-mapped float array
+    cue = store.decode("cue_validity")       # category codes -> strings
+"""
+
+__author__ = "Austin Hurst"
+
+import os
+import sys
+import sqlite3
+import argparse
+import shutil
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(PROJECT_DIR, "ExpAssets", "Resources", "code"))
+from columnar import ColumnStore, column_kind, is_timeout, TIMEOUT_COLS
+
+DEFAULT_DB = os.path.join(PROJECT_DIR, "ExpAssets", "Data", "ColourWheelEffort.db")
+DEFAULT_OUT = os.path.join(PROJECT_DIR, "ExpAssets", "Data", "columnar")
+
+# Columns to leave out of the export (mirrors exclude_data_cols in params)
+EXCLUDE_COLS = ["created"]
+
+
+def table_columns(conn, table):
+    # Returns (name, declared type) pairs for a table's columns
+    return [(row[1], row[2]) for row in conn.execute("PRAGMA table_info({0})".format(table))]
+
+
+def export(db_path, out_path, chunk_size=5000):
+    """Appends all trials added since the last export to the column store.
+
+    Returns:
+        tuple: The number of participants with new trials and the number of
+        trials exported.
+
+    """
+    store = ColumnStore(out_path)
+    if store.rows and "last_trial_id" not in store.meta:
+        raise ValueError(
+            "'{0}' was exported by an older version of this script; re-run the "
+            "export with --rebuild.".format(out_path)
+        )
+    last_id = store.meta.get("last_trial_id", 0)
+    conn = sqlite3.connect(db_path)
+
+    # Work out the columns and types for the joined trials/participants data
+    trial_cols = [
+        c for c in table_columns(conn, "trials") if c[0] not in ["id"] + EXCLUDE_COLS
+    ]
+    p_cols = [
+        c for c in table_columns(conn, "participants")
+        if c[0] not in ["id"] + EXCLUDE_COLS
+    ]
+    select = ["t.{0}".format(c[0]) for c in trial_cols]
+    select += ["p.{0}".format(c[0]) for c in p_cols]
+    names = [c[0] for c in trial_cols + p_cols]
+    for name, decl in trial_cols + p_cols:
+        store.define(name, column_kind(name, decl))
+    for src, flag in TIMEOUT_COLS.items():
+        if src in names:
+            store.define(flag, "bool")
+
+    # Stream the joined rows of all trials added since the last export out of
+    # the database in chunks
+    query = (
+        "SELECT t.id, {0} FROM trials AS t "
+        "JOIN participants AS p ON t.participant_id = p.id "
+        "WHERE t.id > ? ORDER BY t.id"
+    ).format(", ".join(select))
+    cursor = conn.execute(query, (last_id, ))
+    new_ids = set()
+    n_trials = 0
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        data = {name: [r[i + 1] for r in rows] for i, name in enumerate(names)}
+        for src, flag in TIMEOUT_COLS.items():
+            if src in data:
+                data[flag] = [is_timeout(v) for v in data[src]]
+        new_ids.update(data["participant_id"])
+        store.append(data)
+        n_trials += len(rows)
+    conn.close()
+
+    if n_trials:
+        store.meta["last_trial_id"] = last_id
+        store.save()
+    return (len(new_ids), n_trials)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--db", default=DEFAULT_DB, help="path of the database to export")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="folder to export data to")
+    parser.add_argument(
+        "--rebuild", action="store_true", help="delete and re-export any existing data"
+    )
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.isdir(args.out):
+        shutil.rmtree(args.out)
+    try:
+        n_ids, n_trials = export(args.db, args.out)
+    except ValueError as e:
+        sys.exit(str(e))
+    print("Exported {0} new trials from {1} participants to {2}".format(
+        n_trials, n_ids, os.path.abspath(args.out)))
+
+
+if __name__ == "__main__":
+    main()
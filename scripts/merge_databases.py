@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+"""Merges the databases from one or more testing stations into a single study database.
+
+Usage:
+    python scripts/merge_databases.py SOURCES [...] [--into PATH]
+
+Each source database (e.g. a copy of ExpAssets/Data/ColourWheelEffort.db from
+a lab PC) is copied into the study database, with participants matched by
+userhash and the participant IDs in every other table remapped to the study
+database's IDs. Any tables in a source that don't exist in the study database
+yet are created first (so a new study database can be started just by merging
+into a path that doesn't exist).
+
+The ID of the last row copied from each table of each source is recorded in
+the study database, so merging the same source again later only copies rows
+that have been added since. Sources are identified by their absolute path (or
+by --name, if merging a single source), so copies of a station's database
+should be kept in the same place between merges. Each source is merged in a
+single transaction, so an interrupted merge can simply be re-run.
+
+Station databases are written in WAL mode, so recently-written rows may only
+be in the database's '-wal' file until it is checkpointed. If a source has a
+'-wal' file, it is checkpointed into the database before merging (which fails
+if a session is still writing to it). Copies of a station's database should
+include its '-wal' and '-shm' files if it has them: a source with a '-shm'
+file but no '-wal' file is refused, since rows may be missing from it.
+"""
+
+__author__ = "Austin Hurst"
+
+import os
+import sys
+import sqlite3
+import argparse
+import pathlib
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DEFAULT_OUT = os.path.join(PROJECT_DIR, "ExpAssets", "Data", "ColourWheelEffort_study.db")
+
+WATERMARK_TABLE = "_merge_watermarks"
+
+
+def table_sql(conn):
+    # Gets the CREATE statement for each (non-internal) table in a database
+    q = "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+    return {name: sql for name, sql in conn.execute(q) if name != WATERMARK_TABLE}
+
+
+def table_columns(conn, table):
+    # Gets the names of a table's columns, in order
+    return [row[1] for row in conn.execute("PRAGMA table_info({0})".format(table))]
+
+
+def get_watermarks(conn, source):
+    # Gets the last-merged row ID for each table of a given source
+    q = "SELECT tbl, last_id FROM {0} WHERE source = ?".format(WATERMARK_TABLE)
+    return dict(conn.execute(q, (source, )).fetchall())
+
+
+def checkpoint_source(src_path):
+    """Moves any rows in a source database's write-ahead log into the database.
+
+    Args:
+        src_path (str): The path of the source database.
+
+    Raises:
+        ValueError: If the source's '-wal' file is missing when its '-shm' file
+            isn't, or if it couldn't be fully checkpointed (e.g. because a
+            session is still writing to it).
+
+    """
+    wal_path, shm_path = src_path + "-wal", src_path + "-shm"
+    if not os.path.exists(wal_path):
+        if os.path.exists(shm_path):
+            raise ValueError(
+                "'{0}' has a -shm file but no -wal file, so its most recent rows may be "
+                "missing (was it copied without its -wal file?).".format(src_path)
+            )
+        return
+    src = sqlite3.connect(src_path)
+    try:
+        busy, _, _ = src.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    finally:
+        src.close()
+    if busy:
+        raise ValueError(
+            "could not checkpoint '{0}' (is a session still running?).".format(wal_path)
+        )
+
+
+def merge_source(dest, src_path, source, chunk_size=10000):
+    """Copies all new rows from a source database into the study database.
+
+    Args:
+        dest (:obj:`sqlite3.Connection`): The study database.
+        src_path (str): The path of the source database.
+        source (str): The name to track the source's merge progress under.
+        chunk_size (int, optional): The number of rows to insert at a time.
+
+    Returns:
+        dict: The number of rows copied from each table.
+
+    """
+    # Make sure all rows written to the source are in its main database file
+    checkpoint_source(src_path)
+
+    # Read the source within a single transaction, so rows added while merging
+    # (e.g. from a running session) are left for the next merge
+    src_uri = pathlib.Path(src_path).resolve().as_uri() + "?mode=ro"
+    src = sqlite3.connect(src_uri, uri=True)
+    src.execute("BEGIN")
+    try:
+        src_tables = table_sql(src)
+        if "participants" not in src_tables:
+            raise ValueError("'{0}' has no participants table.".format(src_path))
+        watermarks = get_watermarks(dest, source)
+        copied = {}
+
+        with dest:
+            # Create any tables that don't exist in the study database yet
+            dest_tables = table_sql(dest)
+            for name, sql in src_tables.items():
+                if name not in dest_tables:
+                    dest.execute(sql)
+
+            # Add any new participants, matching existing ones by userhash
+            src_cols = table_columns(src, "participants")
+            cols = [c for c in table_columns(dest, "participants") if c in src_cols and c != "id"]
+            last_id = watermarks.get("participants", 0)
+            max_id = src.execute("SELECT max(id) FROM participants").fetchone()[0] or 0
+            if max_id < last_id:
+                raise ValueError(
+                    "'{0}' has fewer participants than when it was last merged as "
+                    "'{1}' (was its database rebuilt?). Merge it under a new --name "
+                    "instead.".format(src_path, source)
+                )
+            known = dict(dest.execute("SELECT userhash, id FROM participants"))
+            q = "SELECT {0} FROM participants WHERE id > ? ORDER BY id".format(", ".join(cols))
+            insert = "INSERT INTO participants ({0}) VALUES ({1})".format(
+                ", ".join(cols), ", ".join(["?"] * len(cols))
+            )
+            hash_col = cols.index("userhash")
+            copied["participants"] = 0
+            for row in src.execute(q, (last_id, )).fetchall():
+                if row[hash_col] not in known:
+                    known[row[hash_col]] = dest.execute(insert, row).lastrowid
+                    copied["participants"] += 1
+            pid_map = {
+                pid: known[userhash]
+                for pid, userhash in src.execute("SELECT id, userhash FROM participants")
+                if userhash in known
+            }
+            watermarks["participants"] = max_id
+
+            # Copy new rows from all other tables, remapping their participant IDs
+            for name in sorted(src_tables):
+                if name == "participants":
+                    continue
+                src_cols = table_columns(src, name)
+                dest_cols = table_columns(dest, name)
+                if "id" not in src_cols:
+                    print("Skipping table '{0}': no 'id' column to track merges by.".format(name))
+                    continue
+                cols = [c for c in src_cols if c in dest_cols and c != "id"]
+                dropped = [c for c in src_cols if c not in dest_cols]
+                if dropped:
+                    print("Table '{0}': ignoring columns not in study database: {1}".format(
+                        name, ", ".join(dropped)))
+                pid_col = cols.index("participant_id") if "participant_id" in cols else None
+                last_id = watermarks.get(name, 0)
+                q = "SELECT id, {0} FROM {1} WHERE id > ? ORDER BY id".format(", ".join(cols), name)
+                insert = "INSERT INTO {0} ({1}) VALUES ({2})".format(
+                    name, ", ".join(cols), ", ".join(["?"] * len(cols))
+                )
+                cursor = src.execute(q, (last_id, ))
+                copied[name] = 0
+                while True:
+                    chunk = cursor.fetchmany(chunk_size)
+                    if not chunk:
+                        break
+                    last_id = chunk[-1][0]
+                    rows = [list(row[1:]) for row in chunk]
+                    if pid_col is not None:
+                        for row in rows:
+                            row[pid_col] = pid_map[row[pid_col]]
+                    dest.executemany(insert, rows)
+                    copied[name] += len(rows)
+                watermarks[name] = last_id
+
+            # Record how far each table has been merged
+            dest.executemany(
+                "INSERT OR REPLACE INTO {0} (source, tbl, last_id) VALUES (?, ?, ?)".format(
+                    WATERMARK_TABLE),
+                [(source, tbl, wm) for tbl, wm in watermarks.items()]
+            )
+
+    finally:
+        src.close()
+    return copied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("sources", nargs="+", help="station databases to merge")
+    parser.add_argument("--into", default=DEFAULT_OUT, help="path of the study database")
+    parser.add_argument("--name", default=None, help="name to track a single source under")
+    args = parser.parse_args()
+
+    if args.name and len(args.sources) > 1:
+        sys.exit("--name can only be used when merging a single source.")
+    dest = sqlite3.connect(args.into)
+    dest.execute(
+        "CREATE TABLE IF NOT EXISTS {0} (source text not null, tbl text not null, "
+        "last_id integer not null, primary key (source, tbl))".format(WATERMARK_TABLE)
+    )
+
+    for path in args.sources:
+        source = args.name or os.path.abspath(path)
+        if os.path.abspath(path) == os.path.abspath(args.into):
+            sys.exit("Cannot merge the study database into itself.")
+        try:
+            copied = merge_source(dest, path, source)
+        except (ValueError, sqlite3.DatabaseError) as e:
+            dest.close()
+            sys.exit("Error merging '{0}': {1}".format(path, e))
+        summary = ", ".join("{0} {1}".format(n, t) for t, n in copied.items() if n)
+        print("{0}: {1}".format(source, summary or "no new rows"))
+
+    dest.close()
+
+
+if __name__ == "__main__":
+    main()
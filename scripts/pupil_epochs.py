@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Extracts pre-target pupil epochs from converted EyeLink (ASC) recordings.
+
+Usage:
+    python scripts/pupil_epochs.py [ASC_FILES ...] [--db PATH] [--out PATH]
+
+EDF files need to be converted to ASC first with SR Research's 'edf2asc'
+utility. Each file is parsed line-by-line (never loaded into memory all at
+once), and files are processed in parallel. Epochs are aligned to each trial's
+'cue_on' marker by default and cut off at its 'probe_on' marker, then joined
+to the matching rows of the 'trials' table by participant, block and trial
+number.
+
+Output (in ExpAssets/Data/pupil_epochs by default):
+    epochs.f32: raw float32 pupil data, memory-mappable with shape
+        (n_epochs, n_samples) as given in epochs.json
+    index/: a column store (see export_columnar.py) with one row per epoch
+    baseline/: a column store with pupil stats for each participant's
+        baseline calibration phases
+
+The participant ID for each file is taken from the first number in its file
+name (e.g. 'p12_2021-06-01.asc' -> 12), which can be changed with --id-regex.
+Files that have already been processed are skipped on later runs.
+"""
+
+__author__ = "Austin Hurst"
+
+import os
+import re
+import sys
+import glob
+import json
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(PROJECT_DIR, "ExpAssets", "Resources", "code"))
+from asc import epoch_asc
+from columnar import ColumnStore
+
+DEFAULT_DB = os.path.join(PROJECT_DIR, "ExpAssets", "Data", "ColourWheelEffort.db")
+DEFAULT_OUT = os.path.join(PROJECT_DIR, "ExpAssets", "Data", "pupil_epochs")
+
+# Trial columns to join onto each epoch
+TRIAL_COLS = [
+    "practice", "difficulty", "catch_trial", "cue_validity", "probe_loc",
+    "probe_onset", "probe_rt", "angle_err", "trial_err",
+]
+
+
+def _process(job):
+    # Worker function: parses a single ASC file
+    path, participant_id, opts = job
+    data, info, baseline = epoch_asc(path, **opts)
+    return path, participant_id, data, info, baseline
+
+
+def load_trials(db_path):
+    # Gets the joinable trial info for every trial, keyed by participant/block/trial
+    if not db_path or not os.path.isfile(db_path):
+        return {}
+    conn = sqlite3.connect(db_path)
+    cols = ", ".join(["participant_id", "block_num", "trial_num"] + TRIAL_COLS)
+    trials = {}
+    for row in conn.execute("SELECT {0} FROM trials".format(cols)):
+        trials[tuple(row[:3])] = row[3:]
+    conn.close()
+    return trials
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("files", nargs="*", help="ASC files to process (default: ExpAssets/EDF/*.asc)")
+    parser.add_argument("--db", default=DEFAULT_DB, help="path of the experiment database")
+    parser.add_argument("--out", default=DEFAULT_OUT, help="folder to write epochs to")
+    parser.add_argument("--align", default="cue_on", help="marker to align epochs to")
+    parser.add_argument("--pre", type=int, default=1000, help="ms of data before the marker")
+    parser.add_argument("--post", type=int, default=1500, help="ms of data after the marker")
+    parser.add_argument(
+        "--truncate", default="probe_on", help="marker to end each epoch at ('none' to disable)"
+    )
+    parser.add_argument("--id-regex", default=r"(\d+)", help="regex for participant IDs in file names")
+    parser.add_argument("--jobs", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+
+    files = args.files or sorted(glob.glob(os.path.join(PROJECT_DIR, "ExpAssets", "EDF", "*.asc")))
+    opts = {
+        "align": args.align, "pre": args.pre, "post": args.post,
+        "truncate": None if args.truncate == "none" else args.truncate,
+    }
+
+    # Load existing output, checking that it was made with the same settings
+    manifest_path = os.path.join(args.out, "epochs.json")
+    manifest = {"n_epochs": 0, "n_samples": None, "options": opts, "files": []}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        if manifest["options"] != opts:
+            sys.exit("Existing epochs in '{0}' use different settings.".format(args.out))
+
+    jobs = []
+    for path in files:
+        if os.path.basename(path) in manifest["files"]:
+            continue
+        match = re.search(args.id_regex, os.path.basename(path))
+        if not match:
+            print("Skipping '{0}': no participant ID in file name.".format(path))
+            continue
+        jobs.append((path, int(match.group(1)), opts))
+    if not jobs:
+        print("No new files to process.")
+        return
+
+    if not os.path.isdir(args.out):
+        os.makedirs(args.out)
+    trials = load_trials(args.db)
+    index = ColumnStore(os.path.join(args.out, "index"))
+    for name, kind in [("participant_id", "int"), ("block_num", "int"), ("trial_num", "int"),
+                       ("onset", "float"), ("cutoff", "float"), ("file", "category")]:
+        index.define(name, kind)
+    for name in TRIAL_COLS:
+        index.define(name, "float" if name in ("probe_onset", "probe_rt", "angle_err") else "category")
+    baseline = ColumnStore(os.path.join(args.out, "baseline"))
+    for name, kind in [("participant_id", "int"), ("phase", "category"), ("mean", "float"),
+                       ("min", "float"), ("max", "float")]:
+        baseline.define(name, kind)
+
+    # Parse files in parallel, appending each one's epochs as it finishes
+    missing = [None] * len(TRIAL_COLS)
+    with open(os.path.join(args.out, "epochs.f32"), "ab") as out, \
+            ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        out.truncate(manifest["n_epochs"] * (manifest["n_samples"] or 0) * 4)
+        for path, pid, data, info, base in pool.map(_process, jobs):
+            fname = os.path.basename(path)
+            if len(info):
+                if manifest["n_samples"] is None:
+                    manifest["n_samples"] = data.shape[1]
+                elif data.shape[1] != manifest["n_samples"]:
+                    print("Skipping '{0}': sample rate differs from other files.".format(fname))
+                    continue
+                out.write(np.ascontiguousarray(data, dtype="<f4").tobytes())
+                rows = {name: [] for name in index.columns}
+                for block, trial, onset, cutoff in info:
+                    extra = trials.get((pid, block, trial), missing)
+                    for name, value in zip(
+                        index.columns,
+                        [pid, block, trial, onset, cutoff, fname] + list(extra)
+                    ):
+                        rows[name].append(value)
+                index.append(rows)
+            if base:
+                baseline.append({
+                    "participant_id": [pid] * len(base),
+                    "phase": list(base.keys()),
+                    "mean": [s[0] for s in base.values()],
+                    "min": [s[1] for s in base.values()],
+                    "max": [s[2] for s in base.values()],
+                })
+            manifest["n_epochs"] += len(info)
+            manifest["files"].append(fname)
+            print("{0}: {1} epochs".format(fname, len(info)))
+
+    index.save()
+    baseline.save()
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+
+
+def load_epochs(path=DEFAULT_OUT):
+    """Loads extracted epochs as a memory-mapped (n_epochs, n_samples) array.
+    """
+    with open(os.path.join(path, "epochs.json"), "r") as f:
+        manifest = json.load(f)
+    shape = (manifest["n_epochs"], manifest["n_samples"] or 0)
+    return np.memmap(os.path.join(path, "epochs.f32"), dtype="<f4", mode="r", shape=shape)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+# -*- coding: utf-8 -*-
+"""Replays a recorded session of the ColourWheelEffort task.
+
+Usage:
+    python scripts/replay.py LOG [--realtime] [--db PATH] [--rt-tolerance MS]
+                             [--baseline FILE] [--save-baseline FILE]
+
+Sessions are recorded to ExpAssets/Data/sessions when 'record_sessions' is
+enabled in the params file (or with simulate.py --record). Replaying a
+session runs the experiment's real trial code in the same headless harness
+as simulate.py, with the session's random seed and trial factors, and with
+every recorded key press, wheel click, and batch of gaze samples fed back to
+the experiment at the same time relative to the stimulus event it followed.
+
+By default the session is replayed on a virtual clock as fast as possible;
+with --realtime it's replayed at its original pace on the real clock.
+
+The data of each replayed trial is checked against the data recorded during
+the session, and any differences are reported. Since replayed inputs can
+only arrive when the experiment checks for them, response times are allowed
+to differ by up to --rt-tolerance ms (1 ms by default). Timings for each phase
+of the task are reported in the same way as simulate.py, and can be saved
+as or compared to a baseline in the same way.
+
+Since each trial's random parameters are drawn in order from its block's
+seed, a session can only be replayed if every recorded trial up to the last
+one was completed and each block's trials are numbered consecutively from 1.
+Sessions with an unfinished trial partway through (e.g. a recycled trial) are
+refused, with the block and trial where the gap is.
+"""
+
+__author__ = "Austin Hurst"
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import itertools
+
+import numpy as np
+
+from simulate import (
+    Simulation, VirtualClock, create_database, report_timings, SimulatedWheelCollector,
+    _now
+)
+from session_log import read_session
+
+# Trial data columns that hold response times (in ms)
+RT_COLS = ["probe_rt", "wheel_rt"]
+
+
+class RealtimeClock(object):
+    """A stand-in for the :mod:`time` module that runs in real time, with flips
+    waiting until the start of the next (simulated) display frame. Like
+    :class:`VirtualClock`, sleeps end early for the next expected input if
+    ``wake`` is set.
+    """
+    def __init__(self, refresh_rate):
+        self.frame_s = 1.0 / refresh_rate
+        self.wake = None
+        self._start = time.perf_counter()
+
+    @property
+    def now(self):
+        return time.perf_counter() - self._start
+
+    def perf_counter(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def process_time(self):
+        return time.process_time()
+
+    def sleep(self, secs):
+        wake = self.wake() if self.wake else None
+        if wake is not None:
+            secs = min(secs, wake - self.now)
+        time.sleep(max(0.0, secs))
+
+    def flip(self):
+        now = self.now
+        self.sleep((int(now / self.frame_s) + 1) * self.frame_s - now)
+
+
+class _NoParticipant(object):
+    # Simulated participant that never responds (inputs come from the log)
+
+    def start_trial(self, t, catch_trial):
+        pass
+
+    def on_event(self, event, t):
+        pass
+
+    def pressed(self, t):
+        return False
+
+    def looked_away(self, t):
+        return False
+
+
+class ReplaySource(object):
+    """Feeds the recorded inputs of a session back to the experiment.
+
+    Takes the place of the experiment's :class:`SessionRecorder`, so instead
+    of passing live inputs through, it returns the recorded inputs for each
+    trial once the clock reaches their recorded times (relative to the
+    stimulus events marked by the experiment). The data returned by each
+    trial is compared to the recorded data.
+
+    Args:
+        trials (list): The :class:`TrialInputs` of each trial to replay.
+        clock: The clock the task is running on.
+        rt_tolerance (float, optional): How much replayed response times (in
+            ms) can differ from the recorded ones.
+
+    """
+    def __init__(self, trials, clock, rt_tolerance=1.0):
+        self.trials = trials
+        self.clock = clock
+        self.rt_tolerance = rt_tolerance
+        self.mismatches = []
+        self.current = None
+        self._index = -1
+        self._anchors = {}
+        self._latest = None
+        self._keys = []
+        self._clicks = []
+        self._gaze = []
+
+    def _due(self, pending):
+        # Checks whether the next of a list of recorded inputs is due yet
+        if not pending:
+            return False
+        anchor, offset, _ = pending[0]
+        t0 = self._anchors.get(anchor)
+        return t0 is not None and self.clock.now >= t0 + offset
+
+    def next_time(self):
+        """Gets the clock time of the next recorded input following the latest
+        stimulus event (or None if there isn't one).
+        """
+        if self._latest is None:
+            return None
+        t0 = self._anchors[self._latest]
+        times = [
+            t0 + pending[0][1] for pending in (self._keys, self._clicks, self._gaze)
+            if pending and pending[0][0] == self._latest
+        ]
+        return min(times) if times else None
+
+    def start_trial(self, block, trial, factors):
+        self._index += 1
+        self.current = self.trials[self._index]
+        if (block, trial) != (self.current.block, self.current.trial):
+            raise RuntimeError(
+                "Replay out of sync: expected block {0} trial {1}, got block {2} trial "
+                "{3}.".format(self.current.block, self.current.trial, block, trial)
+            )
+        self._keys = list(self.current.keys)
+        self._clicks = list(self.current.clicks)
+        self._gaze = list(self.current.gaze)
+        self._anchors = {}
+        self.mark("trial_start")
+
+    def mark(self, event):
+        self._anchors[event] = self.clock.now
+        self._latest = event
+
+    def key(self, key, pressed):
+        if self._due(self._keys) and self._keys[0][2] == key:
+            self._keys.pop(0)
+            return True
+        return False
+
+    def poll_click(self):
+        """Gets the location of the next recorded wheel click once it's due.
+
+        Returns:
+            tuple: The (x, y) location of the click, or None if it isn't due yet.
+
+        """
+        if self._due(self._clicks):
+            return tuple(self._clicks.pop(0)[2])
+        return None
+
+    def score(self, color):
+        # KLibs' angular error for a response can't be computed headlessly, so
+        # replayed responses get the error recorded for the trial
+        return self.current.data.get("angle_err")
+
+    def click(self, pos, offset=None):
+        pass
+
+    def gaze(self, samples):
+        batches = []
+        while self._due(self._gaze):
+            batches.append(self._gaze.pop(0)[2])
+        return np.concatenate(batches) if batches else []
+
+    def trial_data(self, data):
+        # Compare the replayed trial's data to the recorded data
+        recorded = self.current.data
+        if recorded is None:
+            return
+        replayed = json.loads(json.dumps(data, default=str))
+        for col in sorted(set(recorded) | set(replayed)):
+            old, new = recorded.get(col), replayed.get(col)
+            if col in RT_COLS and _is_number(old) and _is_number(new):
+                if abs(old - new) <= self.rt_tolerance:
+                    continue
+            elif old == new:
+                continue
+            self.mismatches.append((self.current.block, self.current.trial, col, old, new))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def check_trials(trials):
+    """Checks that a recorded session's trials can be replayed in order.
+
+    Args:
+        trials (list): The :class:`TrialInputs` of each recorded trial.
+
+    Returns:
+        list: The completed trials, i.e. all but an unfinished final trial.
+
+    Raises:
+        ValueError: If a trial other than the last one is unfinished, or if a
+            block's trial numbers skip or repeat a trial.
+
+    """
+    expected = {}
+    for i, t in enumerate(trials):
+        n = expected.get(t.block, 1)
+        if t.trial != n:
+            raise ValueError(
+                "block {0} has trial {1} where trial {2} was expected, so it and the "
+                "trials after it can't be replayed.".format(t.block, t.trial, n)
+            )
+        if t.data is None and i < len(trials) - 1:
+            raise ValueError(
+                "block {0} trial {1} was not finished (was it recycled?), so the trials "
+                "after it can't be replayed.".format(t.block, t.trial)
+            )
+        expected[t.block] = n + 1
+    return [t for t in trials if t.data is not None]
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class Replay(Simulation):
+    """Runs a recorded session of the task with inputs from a :class:`ReplaySource`.
+    """
+    def __init__(self, info, trials, db_path, realtime=False, rt_tolerance=1.0):
+        refresh_rate = info["refresh_rate"]
+        clock = RealtimeClock(refresh_rate) if realtime else VirtualClock(refresh_rate)
+        super(Replay, self).__init__(
+            _NoParticipant(), db_path, info["seed"], refresh_rate=refresh_rate,
+            ppd=info["ppd"], screen=info["screen"], clock=clock
+        )
+        self.trials = trials
+        self.source = ReplaySource(trials, clock, rt_tolerance)
+
+    def connect(self, exp):
+        exp.session = self.source
+        exp.wheel_rc = SimulatedWheelCollector(
+            exp, self.clock, self.P.screen_c, self.source.poll_click, self.source.score
+        )
+        self.clock.wake = self.source.next_time
+
+    def run(self):
+        """Replays every recorded trial, block by block.
+        """
+        for block_num, block in itertools.groupby(self.trials, key=lambda t: t.block):
+            block = list(block)
+            self.P.practicing = block[0].factors["practicing"]
+            self.run_block(block_num, len(block), [t.factors for t in block])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("log", help="session log to replay")
+    parser.add_argument("--realtime", action="store_true", help="replay at the original pace")
+    parser.add_argument("--db", default=None, help="database to write (default: temporary)")
+    parser.add_argument(
+        "--rt-tolerance", type=float, default=1.0,
+        help="allowed difference (in ms) between recorded and replayed RTs (default: 1.0)"
+    )
+    parser.add_argument("--baseline", help="JSON timings from an earlier run to compare to")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25,
+        help="allowed proportional increase in 95th percentile times (default: 0.25)"
+    )
+    parser.add_argument("--save-baseline", help="file to save this run's timings to")
+    args = parser.parse_args()
+
+    # Only replay trials that were finished during the session
+    info, trials = read_session(args.log)
+    try:
+        trials = check_trials(trials)
+    except ValueError as e:
+        sys.exit("Cannot replay '{0}': {1}".format(args.log, e))
+    if not trials:
+        sys.exit("No complete trials in '{0}'.".format(args.log))
+
+    db_path = args.db
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(), "replay.db")
+    create_database(db_path)
+
+    replay = Replay(info, trials, db_path, args.realtime, args.rt_tolerance)
+    replay.setup()
+    start = _now()
+    replay.run()
+    elapsed = _now() - start
+    replay.finish()
+
+    # Report the results
+    print("Replayed {0} trials ({1:.1f} session min) in {2:.1f} s ({3:.0f} trials/s)".format(
+        len(trials), replay.clock.now / 60, elapsed, len(trials) / elapsed))
+    mismatches = replay.source.mismatches
+    for block, trial, col, old, new in mismatches[:20]:
+        print("MISMATCH: block {0} trial {1} {2}: recorded {3!r}, replayed {4!r}".format(
+            block, trial, col, old, new))
+    if len(mismatches) > 20:
+        print("... and {0} more mismatches".format(len(mismatches) - 20))
+    if not mismatches:
+        print("All trial data matches the recorded session")
+    passed = report_timings(
+        replay.timer.summary(), args.save_baseline, args.baseline, args.tolerance
+    )
+    if mismatches or not passed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,725 @@
+# -*- coding: utf-8 -*-
+"""Headless simulation and throughput benchmark for the ColourWheelEffort task.
+
+Usage:
+    python scripts/simulate.py [--trials N] [--participant TYPE] [--seed SEED]
+                               [--baseline FILE] [--save-baseline FILE]
+                               [--record FILE] [--log-gaze]
+
+Runs the experiment's real setup, block, trial_prep, trial, and clean-up code
+with the display, keyboard, and eye tracker replaced by simulated stand-ins,
+and with a virtual clock so that trials run as fast as the code allows. A
+simulated participant responds to each trial with randomly-drawn detection
+RTs, anticipations, misses, gaze breaks, and colour wheel errors.
+
+Real (wall-clock) timings are reported for trial_prep, draw_screen_layout,
+dot_grid, wheel.render, data writes, and the total inter-trial latency
+(trial_clean_up + data logging + trial_prep). If a baseline file from an
+earlier run is given, the script exits with an error if the 95th percentile
+of any phase has grown by more than the allowed tolerance, so it can be used
+as a regression test. The simulated session's inputs can also be saved with
+--record, for replaying with replay.py.
+
+Trial factors are read from the project's independent variables file, so the
+simulated trials follow the current design. Gaze samples (around 2,600 rows
+per trial) are only written to the database with --log-gaze, so that the
+data write timings aren't dominated by them by default.
+
+Requires KLibs (and its dependencies) to be installed. Trial data is written
+to a temporary database built from the project's schema.
+"""
+
+__author__ = "Austin Hurst"
+
+import os
+import sys
+import ast
+import json
+import math
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import threading
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+CODE_DIR = os.path.join(PROJECT_DIR, "ExpAssets", "Resources", "code")
+CONFIG_DIR = os.path.join(PROJECT_DIR, "ExpAssets", "Config")
+sys.path.insert(0, CODE_DIR)
+sys.path.insert(0, PROJECT_DIR)
+
+# Real timer for measuring the experiment code (experiment modules get the
+# virtual clock instead)
+_now = time.perf_counter
+
+# Simulated participant types (overrides of SimulatedParticipant defaults)
+PARTICIPANTS = {
+    "typical": {},
+    "fast": {"rt_mu": 260, "rt_tau": 40, "false_alarm_rate": 0.2, "guess_rate": 0.2},
+    "distractible": {
+        "gaze_break_rate": 0.15, "anticipation_rate": 0.05, "miss_rate": 0.05,
+        "guess_rate": 0.35,
+    },
+}
+
+PHASES = [
+    "trial_prep", "draw_screen_layout", "dot_grid", "wheel.render", "db_queue",
+    "trial_clean_up", "log_trial", "inter_trial",
+]
+
+
+class VirtualClock(object):
+    """A stand-in for the :mod:`time` module that only advances when asked to.
+
+    Sleeping advances the clock instantly, and flips advance it to the start
+    of the next display frame. Every read also advances the clock by a tiny
+    amount, so busy-wait loops still make progress.
+
+    If ``wake`` is set to a function returning the time of the next expected
+    input (or None), sleeps end early at that time instead of overshooting it
+    (or are skipped if that time has already passed).
+    """
+    def __init__(self, refresh_rate, tick=1e-5):
+        self.frame_s = 1.0 / refresh_rate
+        self.tick = tick
+        self.now = 0.0
+        self.wake = None
+        self._lock = threading.Lock()
+
+    def perf_counter(self):
+        with self._lock:
+            self.now += self.tick
+            return self.now
+
+    def time(self):
+        return self.perf_counter()
+
+    def process_time(self):
+        return time.process_time()
+
+    def sleep(self, secs):
+        wake = self.wake() if self.wake else None
+        with self._lock:
+            end = self.now + max(0.0, secs)
+            if wake is not None and wake < end:
+                end = max(self.now, wake)
+            self.now = end
+
+    def flip(self):
+        with self._lock:
+            self.now = (math.floor(self.now / self.frame_s) + 1) * self.frame_s
+
+
+class VirtualStopwatch(object):
+    """A :class:`klibs.KLTime.Stopwatch` that runs on a virtual clock.
+    """
+    def __init__(self, clock):
+        self._clock = clock
+        self._start = clock.perf_counter()
+
+    def elapsed(self):
+        return self._clock.perf_counter() - self._start
+
+
+class SimulatedParticipant(object):
+    """A simulated participant with simple models of detection, fixation, and
+    colour memory performance.
+
+    Detection RTs (in ms) are drawn from an ex-Gaussian distribution, and
+    colour wheel errors from a mixture of a von Mises distribution centred on
+    the probe colour and uniform guessing.
+    """
+    def __init__(self, rng, rt_mu=350, rt_sigma=40, rt_tau=80, miss_rate=0.02,
+                 anticipation_rate=0.01, false_alarm_rate=0.08, gaze_break_rate=0.03,
+                 wheel_kappa=8.0, guess_rate=0.1, wheel_rt_ms=1500):
+        self.rng = rng
+        self.rt_mu = rt_mu
+        self.rt_sigma = rt_sigma
+        self.rt_tau = rt_tau
+        self.miss_rate = miss_rate
+        self.anticipation_rate = anticipation_rate
+        self.false_alarm_rate = false_alarm_rate
+        self.gaze_break_rate = gaze_break_rate
+        self.wheel_kappa = wheel_kappa
+        self.guess_rate = guess_rate
+        self.wheel_rt_ms = wheel_rt_ms
+        self.press_at = None
+        self.break_at = None
+        self._catch = False
+
+    def start_trial(self, t, catch_trial):
+        # Decide whether the participant anticipates or looks away this trial
+        self._catch = catch_trial
+        self.press_at = None
+        self.break_at = None
+        if self.rng.random() < self.anticipation_rate:
+            self.press_at = t + self.rng.uniform(0.0, 2.0)
+        if self.rng.random() < self.gaze_break_rate:
+            self.break_at = t + self.rng.uniform(0.0, 2.5)
+
+    def on_event(self, event, t):
+        # Plan a detection response once the probe (or catch interval) starts
+        if event != "probe_on" or self.press_at is not None:
+            return
+        respond = self.rng.random()
+        if self._catch and respond < self.false_alarm_rate:
+            self.press_at = t + self.detection_rt() / 1000.0
+        elif not self._catch and respond >= self.miss_rate:
+            self.press_at = t + self.detection_rt() / 1000.0
+
+    def detection_rt(self):
+        rt = self.rng.gauss(self.rt_mu, self.rt_sigma) + self.rng.expovariate(1.0 / self.rt_tau)
+        return max(100.0, rt)
+
+    def pressed(self, t):
+        return self.press_at is not None and t >= self.press_at
+
+    def looked_away(self, t):
+        return self.break_at is not None and t >= self.break_at
+
+    def wheel_error(self):
+        # Colour report error (in degrees) for the current trial
+        if self.rng.random() < self.guess_rate:
+            return self.rng.uniform(-180.0, 180.0)
+        err = math.degrees(self.rng.vonmisesvariate(0.0, self.wheel_kappa))
+        return (err + 180.0) % 360.0 - 180.0
+
+    def wheel_rt(self):
+        return self.rng.gammavariate(4.0, self.wheel_rt_ms / 4.0)
+
+
+class SimulatedTracker(object):
+    """A stand-in for the eye tracker that reports the participant's gaze.
+
+    The version string contains 'TryLink' so the experiment reads gaze with
+    the mouse-based sample reader.
+    """
+    version = "TryLink (simulated)"
+
+    def __init__(self, participant, clock, center, away):
+        self.participant = participant
+        self.clock = clock
+        self.center = center
+        self.away = away
+        self.messages = 0
+
+    def gaze(self):
+        if self.participant.looked_away(self.clock.now):
+            return self.away
+        return self.center
+
+    def write(self, msg):
+        self.messages += 1
+
+    def add_boundary(self, boundary):
+        pass
+
+    def drift_correct(self, *args, **kwargs):
+        pass
+
+
+class SimulatedEventManager(object):
+
+    def register_ticket(self, ticket):
+        pass
+
+
+class SimulatedWheelCollector(object):
+    """A stand-in for the experiment's KLibs colour wheel ResponseCollector.
+
+    Like KLibs' collector, it calls its display callback between input
+    checks until a click lands on the wheel's ring or the experiment's wheel
+    timeout passes, with the RT measured from the start of collection. The
+    clicked colour is looked up on the wheel. KLibs' ColorWheelResponse can't
+    run headlessly, so the response's angular error is given by ``score``.
+
+    Args:
+        exp: The experiment.
+        clock: The clock the task is running on.
+        center (tuple): The screen location of the centre of the wheel.
+        poll (callable): Returns the (x, y) location of the next click once
+            it's due, or None.
+        score (callable): Takes a response colour and returns its angular
+            error.
+
+    """
+    def __init__(self, exp, clock, center, poll, score):
+        self.exp = exp
+        self.clock = clock
+        self.center = center
+        self.poll = poll
+        self.score = score
+        self.display_callback = exp.wheel_callback
+        self.color_listener = self
+        self.timed_out = False
+        self._response = None
+
+    def collect(self):
+        self.reset()
+        start = self.clock.perf_counter()
+        while True:
+            pos = self.poll()
+            color = None if pos is None else self.exp.wheel.color_at(pos, self.center)
+            if color is not None:
+                rt = (self.clock.perf_counter() - start) * 1000
+                self._response = ([self.score(color), color], rt)
+                return
+            if self.clock.perf_counter() - start >= self.exp.wheel_timeout:
+                self.timed_out = True
+                return
+            self.display_callback()
+
+    def set_target(self, target):
+        self.target = target
+
+    def response(self, value=True, rt=True):
+        if value and rt:
+            return list(self._response)
+        return self._response[0] if value else self._response[1]
+
+    def reset(self):
+        self.timed_out = False
+        self._response = None
+
+
+class SimulatedWheelResponse(object):
+    """Plans the simulated participant's colour wheel clicks.
+
+    When the wheel is shown, the participant's response colour and RT are
+    drawn and a click is planned on the part of the ring with that colour.
+    The click is then returned by :meth:`poll` once its time comes.
+    """
+    def __init__(self, exp, participant, clock, center):
+        self.exp = exp
+        self.participant = participant
+        self.clock = clock
+        self.center = center
+        self.click_at = None
+        self.pos = (0, 0)
+
+    def start(self):
+        err = self.participant.wheel_error()
+        rt = self.participant.wheel_rt()
+        colors = self.exp.wheel_colors
+        hue = self.exp.hue_index.hue(self.exp.probe.fill_color)
+        color = colors[int(round(hue + err * len(colors) / 360.0)) % len(colors)]
+        self.pos = self.exp.wheel.location_of(color, self.center)
+        self.click_at = self.clock.now + rt / 1000.0
+
+    def score(self, color):
+        # Simulated angular error of a response: the wrapped difference between
+        # the probe and response angles on the unrotated wheel
+        response_angle = self.exp.hue_index.angle(color)
+        return (self.exp.probe_angle - response_angle + 180) % 360 - 180
+
+    def poll(self):
+        if self.click_at is not None and self.clock.now >= self.click_at:
+            self.click_at = None
+            return self.pos
+        return None
+
+    def next_time(self):
+        return self.click_at
+
+
+class _Text(object):
+    # Placeholder for rendered text
+    width = 400
+    height = 40
+
+
+class PhaseTimer(object):
+    """Collects wall-clock durations (in ms) for named phases of the task.
+    """
+    def __init__(self):
+        self.times = {}
+        self._lock = threading.Lock()
+
+    def add(self, phase, ms):
+        with self._lock:
+            self.times.setdefault(phase, []).append(ms)
+
+    def wrap(self, phase, func):
+        def timed(*args, **kwargs):
+            start = _now()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(phase, (_now() - start) * 1000)
+        return timed
+
+    def summary(self):
+        out = {}
+        for phase, ms in self.times.items():
+            ms = sorted(ms)
+            pct = lambda p: ms[min(len(ms) - 1, int(round(p * (len(ms) - 1))))]
+            out[phase] = {
+                'n': len(ms), 'mean': sum(ms) / len(ms), 'median': pct(0.5),
+                'p95': pct(0.95), 'p99': pct(0.99), 'max': ms[-1],
+            }
+        return out
+
+
+def load_params(P):
+    # Load the project's parameter overrides into KLibs' params module
+    params = {}
+    with open(os.path.join(CONFIG_DIR, "ColourWheelEffort_params.py")) as f:
+        exec(f.read(), params)
+    for name, value in params.items():
+        if not name.startswith("_"):
+            setattr(P, name, value)
+
+
+def create_database(path):
+    # Build an empty database from the project schema
+    with open(os.path.join(CONFIG_DIR, "ColourWheelEffort_schema.sql")) as f:
+        schema = f.read()
+    conn = sqlite3.connect(path)
+    conn.executescript(schema)
+    conn.execute(
+        "INSERT INTO participants (userhash, gender, age, handedness, created) "
+        "VALUES ('simulated', 'NA', 0, 'NA', 'NA')"
+    )
+    conn.commit()
+    conn.close()
+
+
+def load_factors(path=None):
+    """Reads the trial factors and their weights from the project's
+    independent variables file.
+
+    The file's ``add_variable`` calls are parsed rather than run, so KLibs'
+    trial factory isn't needed to get the design.
+
+    Args:
+        path (str, optional): The independent variables file to read. Defaults
+            to the project's.
+
+    Returns:
+        dict: The (level, weight) pairs of each factor, in the order the
+        factors are added in the file.
+
+    """
+    if path is None:
+        path = os.path.join(CONFIG_DIR, "ColourWheelEffort_independent_variables.py")
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    factors = {}
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)):
+            continue
+        if node.func.attr != "add_variable":
+            continue
+        name = ast.literal_eval(node.args[0])
+        levels = []
+        for level in ast.literal_eval(node.args[2]):
+            levels.append(level if isinstance(level, tuple) else (level, 1))
+        factors[name] = levels
+    if not factors:
+        raise ValueError("No factors found in '{0}'.".format(path))
+    return factors
+
+
+# Trial factors and weights, as defined in the independent variables file
+FACTORS = load_factors()
+
+
+def draw_factors(rng):
+    # Draws the factor levels for a trial, respecting the factor weights
+    trial = {}
+    for name, levels in FACTORS.items():
+        values = [v for v, w in levels for _ in range(w)]
+        trial[name] = rng.choice(values)
+    return trial
+
+
+class Simulation(object):
+    """Runs the ColourWheelEffort task headlessly with a simulated participant.
+
+    Args:
+        participant (:class:`SimulatedParticipant`): The simulated participant.
+        db_path (str): The path of the database to write trial data to.
+        seed (int): The random seed for the session.
+        refresh_rate (float, optional): The simulated refresh rate (in Hz).
+        ppd (float, optional): The simulated pixels per degree.
+        screen (tuple, optional): The simulated screen resolution.
+        clock (optional): The clock to run the task on. Defaults to a
+            :class:`VirtualClock` at the given refresh rate.
+        log_gaze (bool, optional): Whether to write each trial's gaze samples
+            to the database. Defaults to False.
+
+    """
+    def __init__(self, participant, db_path, seed, refresh_rate=60, ppd=40,
+                 screen=(1920, 1080), clock=None, log_gaze=False):
+        from klibs import P
+        import experiment as exp_module
+        import timing
+        import gaze
+        import markers
+        import session_log
+
+        self.P = P
+        self.module = exp_module
+        self.participant = participant
+        self.timer = PhaseTimer()
+        self.clock = clock or VirtualClock(refresh_rate)
+        self.rng = random.Random(seed)
+
+        # Configure the runtime params normally set by KLibs on launch
+        load_params(P)
+        P.screen_x, P.screen_y = screen
+        P.screen_c = (screen[0] // 2, screen[1] // 2)
+        P.refresh_rate = refresh_rate
+        P.ppd = ppd
+        P.random_seed = seed
+        P.participant_id = 1
+        P.database_path = db_path
+        P.resources_dir = os.path.join(PROJECT_DIR, "ExpAssets", "Resources")
+        P.run_practice_blocks = False
+        P.practicing = False
+        P.block_number = 0
+        P.trial_number = 0
+        P.log_gaze_samples = log_gaze
+
+        # Idle between input checks instead of busy-waiting: on the simulated
+        # clock, sleeps end exactly when the next simulated input is due, so
+        # this doesn't delay RTs and avoids spinning through virtual time
+        P.idle_wake_ms = 1.0
+
+        # Swap the display, input, and clock functions used by the experiment
+        # for simulated ones
+        clock = self.clock
+        def flip():
+            clock.flip()
+        def smart_sleep(ms, *args, **kwargs):
+            clock.sleep(ms / 1000.0)
+        noop = lambda *args, **kwargs: None
+        patches = {
+            'fill': noop, 'blit': noop, 'flip': flip, 'flush': noop, 'pump': noop,
+            'any_key': noop, 'ui_request': noop, 'hide_cursor': noop, 'show_cursor': noop,
+            'smart_sleep': smart_sleep,
+            'message': lambda *args, **kwargs: _Text(),
+            'key_pressed': lambda *args, **kwargs: participant.pressed(clock.now),
+            'Stopwatch': lambda *args, **kwargs: VirtualStopwatch(clock),
+            'dot_grid': self.timer.wrap("dot_grid", exp_module.dot_grid),
+            'time': clock,
+        }
+        for name, func in patches.items():
+            setattr(exp_module, name, func)
+        timing.time = clock
+        gaze.time = clock
+        markers.time = clock
+        session_log.time = clock
+
+        # Create the experiment without KLibs' runtime environment, using
+        # simulated stand-ins for the tracker and event manager
+        class SimulatedExperiment(exp_module.ColourWheelEffort):
+            el = None
+            evm = None
+            def __init__(self):
+                pass
+        self.exp = SimulatedExperiment()
+        self.exp.el = SimulatedTracker(participant, clock, P.screen_c, (0, 0))
+        self.exp.evm = SimulatedEventManager()
+        self.exp.get_pupil_range = noop
+        self.exp.task_demo = noop
+
+    def setup(self):
+        exp = self.exp
+        start = _now()
+        exp.setup()
+        self.timer.add("setup", (_now() - start) * 1000)
+
+        # Time the phases of interest and hook up the simulated participant
+        exp.draw_screen_layout = self.timer.wrap("draw_screen_layout", exp.draw_screen_layout)
+        exp.wheel.render = self.timer.wrap("wheel.render", exp.wheel.render)
+        exp.writer.insert = self.timer.wrap("db_queue", exp.writer.insert)
+        exp.writer.insert_many = self.timer.wrap("db_queue", exp.writer.insert_many)
+        self.connect(exp)
+
+    def connect(self, exp):
+        # Feed the simulated participant's responses to the experiment
+        wheel = SimulatedWheelResponse(exp, self.participant, self.clock, self.P.screen_c)
+        exp.wheel_rc = SimulatedWheelCollector(
+            exp, self.clock, self.P.screen_c, wheel.poll, wheel.score
+        )
+        self.clock.wake = wheel.next_time
+        draw_wheel = exp.draw_wheel
+        def show_wheel():
+            draw_wheel()
+            wheel.start()
+        exp.draw_wheel = show_wheel
+        stamp = exp.presentation.stamp
+        def stamp_event(event):
+            t = stamp(event)
+            self.participant.on_event(event, self.clock.now)
+            return t
+        exp.presentation.stamp = stamp_event
+
+    def record(self, path):
+        """Records the inputs of the simulated session to a session log.
+        """
+        from session_log import SessionRecorder
+        P = self.P
+        self.exp.session = SessionRecorder(
+            path, P.random_seed, (P.screen_x, P.screen_y), P.ppd, P.refresh_rate
+        )
+
+    def run_block(self, block_num, n_trials, factors=None):
+        # Runs a block of trials, with each trial's factors either given or
+        # randomly drawn
+        P, exp = self.P, self.exp
+        P.block_number = block_num
+        P.trials_per_block = n_trials
+        exp.block()
+        errors = {}
+        last_clean_up = None
+        for trial_num in range(1, n_trials + 1):
+            P.trial_number = trial_num
+            trial = factors[trial_num - 1] if factors else draw_factors(self.rng)
+            for name in FACTORS:
+                setattr(exp, name, trial[name])
+
+            start = _now()
+            exp.trial_prep()
+            prep_ms = (_now() - start) * 1000
+            self.timer.add("trial_prep", prep_ms)
+            if last_clean_up is not None:
+                self.timer.add("inter_trial", last_clean_up + prep_ms)
+
+            self.participant.start_trial(self.clock.now, exp.catch_trial)
+            data = exp.trial()
+            err = data["trial_err"]
+            errors[err] = errors.get(err, 0) + 1
+
+            # Log the trial before cleaning up, in the same order as KLibs
+            start = _now()
+            exp.__log_trial__(data)
+            clean_up_start = _now()
+            exp.trial_clean_up()
+            end = _now()
+            self.timer.add("log_trial", (clean_up_start - start) * 1000)
+            self.timer.add("trial_clean_up", (end - clean_up_start) * 1000)
+            last_clean_up = (end - start) * 1000
+        return errors
+
+    def finish(self):
+        self.exp.writer.close()
+        self.exp.session.close()
+        return self.exp.writer.stats
+
+
+def check_regressions(summary, baseline, tolerance):
+    # Returns a list of per-trial phases whose 95th percentile times have
+    # regressed (one-off setup times are too noisy to compare)
+    failed = []
+    for phase in PHASES:
+        if phase not in summary or phase not in baseline:
+            continue
+        old, new = baseline[phase]['p95'], summary[phase]['p95']
+        if new > old * (1 + tolerance):
+            failed.append((phase, old, new))
+    return failed
+
+
+def report_timings(summary, save_baseline=None, baseline=None, tolerance=0.25):
+    """Prints a table of phase timings, optionally saving them as a baseline
+    or comparing them to an earlier one.
+
+    Returns:
+        bool: False if any phase regressed compared to the baseline, otherwise
+        True.
+
+    """
+    print("\n{0:<20}{1:>8}{2:>10}{3:>10}{4:>10}{5:>10}{6:>10}".format(
+        "phase (ms)", "n", "mean", "median", "p95", "p99", "max"))
+    for phase in ["setup"] + PHASES:
+        if phase in summary:
+            s = summary[phase]
+            print("{0:<20}{1:>8}{2:>10.3f}{3:>10.3f}{4:>10.3f}{5:>10.3f}{6:>10.3f}".format(
+                phase, s['n'], s['mean'], s['median'], s['p95'], s['p99'], s['max']))
+
+    if save_baseline:
+        with open(save_baseline, "w") as f:
+            json.dump(summary, f, indent=1)
+
+    if baseline:
+        with open(baseline, "r") as f:
+            old = json.load(f)
+        failed = check_regressions(summary, old, tolerance)
+        for phase, old_p95, new_p95 in failed:
+            print("REGRESSION: {0} p95 = {1:.3f} ms (baseline {2:.3f} ms)".format(
+                phase, new_p95, old_p95))
+        if failed:
+            return False
+        print("\nNo regressions (tolerance = {0:.0%})".format(tolerance))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--trials", type=int, default=2000, help="total number of trials")
+    parser.add_argument(
+        "--block-size", type=int, default=120, help="number of trials per block"
+    )
+    parser.add_argument(
+        "--participant", choices=sorted(PARTICIPANTS.keys()), default="typical",
+        help="type of simulated participant"
+    )
+    parser.add_argument("--seed", type=int, default=1, help="random seed for the session")
+    parser.add_argument("--refresh-rate", type=float, default=60, help="simulated refresh rate")
+    parser.add_argument("--db", default=None, help="database to write (default: temporary)")
+    parser.add_argument("--baseline", help="JSON timings from an earlier run to compare to")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25,
+        help="allowed proportional increase in 95th percentile times (default: 0.25)"
+    )
+    parser.add_argument("--save-baseline", help="file to save this run's timings to")
+    parser.add_argument("--record", help="session log to record the simulated inputs to")
+    parser.add_argument(
+        "--log-gaze", action="store_true", help="write each trial's gaze samples to the database"
+    )
+    args = parser.parse_args()
+
+    tmp = None
+    db_path = args.db
+    if db_path is None:
+        tmp = tempfile.mkdtemp()
+        db_path = os.path.join(tmp, "simulated.db")
+    create_database(db_path)
+
+    rng = random.Random(args.seed)
+    participant = SimulatedParticipant(rng, **PARTICIPANTS[args.participant])
+    sim = Simulation(
+        participant, db_path, args.seed, refresh_rate=args.refresh_rate, log_gaze=args.log_gaze
+    )
+    sim.setup()
+    if args.record:
+        sim.record(args.record)
+
+    # Run the simulated session
+    start = _now()
+    errors = {}
+    block, remaining = 1, args.trials
+    while remaining > 0:
+        n = min(args.block_size, remaining)
+        for err, count in sim.run_block(block, n).items():
+            errors[err] = errors.get(err, 0) + count
+        remaining -= n
+        block += 1
+    elapsed = _now() - start
+    writer = sim.finish()
+
+    # Report the results
+    print("Simulated {0} trials ({1:.1f} virtual min) in {2:.1f} s ({3:.0f} trials/s)".format(
+        args.trials, sim.clock.now / 60, elapsed, args.trials / elapsed))
+    print("Trial outcomes: " + ", ".join(
+        "{0} = {1}".format(k, v) for k, v in sorted(errors.items())))
+    print("Database: {written} rows, mean commit = {mean_commit_ms:.2f} ms, "
+          "max commit = {max_commit_ms:.2f} ms".format(**writer))
+    if not report_timings(sim.timer.summary(), args.save_baseline, args.baseline, args.tolerance):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import os
+import sys
+
+PROJECT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(PROJECT_DIR, "ExpAssets", "Resources", "code"))
+sys.path.insert(0, os.path.join(PROJECT_DIR, "scripts"))
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import numpy as np
+
+from asc import epoch_asc, iter_asc
+
+
+def write_asc(path, start, end, messages):
+    # Writes a 1000 Hz ASC file where each sample's pupil size is its time,
+    # with each (arrival time, text) message written after that sample
+    lines = ["SAMPLES\tGAZE\tLEFT\tRATE\t1000.00\tTRACKING\tCR\n"]
+    msgs = dict(messages)
+    for t in range(start, end):
+        lines.append("{0}\t 512.0\t 384.0\t {1}.0\t...\n".format(t, t))
+        if t in msgs:
+            lines.append("MSG\t{0} {1}\n".format(t, msgs[t]))
+    path.write_text("".join(lines))
+
+
+def test_backdated_messages(tmp_path):
+    path = tmp_path / "test.asc"
+    write_asc(path, 1000, 1010, [(1005, "3 cue_on b1 t1"), (1006, "probe_on b1 t1")])
+    msgs = [(t, text) for kind, t, text in iter_asc(str(path)) if kind == "msg"]
+    assert msgs == [(1002, "cue_on b1 t1"), (1006, "probe_on b1 t1")]
+
+
+def test_epochs_with_late_markers(tmp_path):
+    # The first trial's markers arrive after its whole epoch was recorded, and
+    # the second's arrive partway through its epoch
+    path = tmp_path / "test.asc"
+    write_asc(path, 1000, 6000, [
+        (3500, "1500 cue_on b1 t1"),
+        (3501, "1301 probe_on b1 t1"),
+        (4005, "5 cue_on b1 t2"),
+    ])
+    data, info, _ = epoch_asc(str(path), pre=500, post=500)
+    assert [i[:3] for i in info] == [(1, 1, 2000), (1, 2, 4000)]
+    assert info[0][3] == 2200
+
+    # Samples before the probe are kept, samples after it are dropped
+    assert np.array_equal(data[0][:700], np.arange(1500, 2200, dtype=np.float32))
+    assert np.all(np.isnan(data[0][700:]))
+    assert np.array_equal(data[1], np.arange(3500, 4500, dtype=np.float32))
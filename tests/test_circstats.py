@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import numpy as np
+
+from circstats import wrap
+
+
+def test_wrap():
+    # Angles are wrapped to [-pi, pi)
+    angles = np.radians([10.0, 180.0, 185.0, -190.0, 359.0, -180.0])
+    expected = np.radians([10.0, -180.0, -175.0, 170.0, -1.0, -180.0])
+    assert np.allclose(wrap(angles), expected)
+    wrapped = wrap(np.linspace(-20, 20, 101))
+    assert np.all((wrapped >= -np.pi) & (wrapped < np.pi))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import sqlite3
+
+import numpy as np
+
+from columnar import ColumnStore, is_timeout
+from export_columnar import export
+
+
+def make_store(path):
+    store = ColumnStore(str(path))
+    store.define("rt", "float")
+    store.define("block", "int")
+    store.define("easy", "bool")
+    store.define("cue", "category")
+    return store
+
+
+def test_round_trip(tmp_path):
+    store = make_store(tmp_path / "store")
+    store.append({
+        "rt": ["312.5", None, "TIMEOUT"], "block": [1, 1, 2],
+        "easy": ["True", "False", 1], "cue": ["valid", None, "neutral"],
+    })
+    store.save()
+
+    store = ColumnStore(str(tmp_path / "store"))
+    assert store.rows == 3
+    assert store.columns == ["rt", "block", "easy", "cue"]
+    assert np.array_equal(store.column("rt"), [312.5, np.nan, np.nan], equal_nan=True)
+    assert store.column("block").tolist() == [1, 1, 2]
+    assert store.column("easy").tolist() == [True, False, True]
+    assert store.decode("cue").tolist() == ["valid", None, "neutral"]
+
+
+def test_incremental_append(tmp_path):
+    store = make_store(tmp_path / "store")
+    store.append({"rt": [300], "block": [1], "easy": [True], "cue": ["valid"]})
+    store.save()
+
+    # Reopen the store and simulate an interrupted append before adding more
+    # rows, which should drop the partial write
+    store = ColumnStore(str(tmp_path / "store"))
+    with open(store._file("rt"), "ab") as f:
+        f.write(b"\x00" * 3)
+    store.append({
+        "rt": [400, 500], "block": [1, 2], "easy": [False, True], "cue": ["invalid", "valid"],
+    })
+    store.save()
+
+    store = ColumnStore(str(tmp_path / "store"))
+    assert store.rows == 3
+    assert store.column("rt").tolist() == [300, 400, 500]
+    assert store.levels("cue") == ["valid", "invalid"]
+    assert store.decode("cue").tolist() == ["valid", "invalid", "valid"]
+
+
+def test_is_timeout():
+    # Probe timeouts use KLibs' sentinel and wheel timeouts a lowercase one
+    assert is_timeout("TIMEOUT") and is_timeout("timeout")
+    assert not is_timeout("350.2") and not is_timeout(None)
+
+
+def make_db(path):
+    conn = sqlite3.connect(str(path))
+    conn.executescript("""
+        CREATE TABLE participants (id integer primary key, userhash text, created text);
+        CREATE TABLE trials (
+            id integer primary key, participant_id integer, trial_num integer,
+            probe_rt text, easy_trial boolean
+        );
+    """)
+    conn.execute("INSERT INTO participants (userhash, created) VALUES ('a', 'now')")
+    return conn
+
+
+def test_export_appends_new_trials(tmp_path):
+    db_path, out = tmp_path / "exp.db", str(tmp_path / "columnar")
+    conn = make_db(db_path)
+    insert = "INSERT INTO trials (participant_id, trial_num, probe_rt, easy_trial) VALUES (?, ?, ?, ?)"
+    conn.executemany(insert, [(1, 1, "350", 1), (1, 2, "timeout", 0)])
+    conn.commit()
+    assert export(str(db_path), out) == (1, 2)
+
+    # Trials added later for the same (in-progress) participant are appended
+    conn.execute(insert, (1, 3, "410", 1))
+    conn.commit()
+    assert export(str(db_path), out) == (1, 1)
+    assert export(str(db_path), out) == (0, 0)
+
+    store = ColumnStore(out)
+    assert store.column("trial_num").tolist() == [1, 2, 3]
+    assert np.array_equal(store.column("probe_rt"), [350, np.nan, 410], equal_nan=True)
+    assert store.column("probe_timeout").tolist() == [False, True, False]
+    assert "created" not in store.columns
+    conn.close()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import os
+import sqlite3
+
+import pytest
+
+from datastore import AsyncWriter
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "test.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE trials (id integer primary key, v integer)")
+    conn.execute("CREATE TABLE gaze (id integer primary key, v integer not null)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def count(path, table):
+    conn = sqlite3.connect(path)
+    n = conn.execute("SELECT count(*) FROM {0}".format(table)).fetchone()[0]
+    conn.close()
+    return n
+
+
+def test_writes_all_rows(db_path):
+    writer = AsyncWriter(db_path)
+    for i in range(50):
+        writer.insert("trials", {"v": i})
+    writer.insert_many("gaze", ["v"], [(i, ) for i in range(500)])
+    writer.close()
+    assert count(db_path, "trials") == 50
+    assert count(db_path, "gaze") == 500
+    assert writer.stats["written"] == 550
+
+
+def test_failed_row_only_loses_itself(db_path):
+    writer = AsyncWriter(db_path)
+    writer.insert("trials", {"v": 1})
+    writer.insert_many("gaze", ["v"], [(1, ), (None, ), (3, )])
+    writer.insert("trials", {"v": 2})
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.flush()
+    writer.close()
+    assert count(db_path, "trials") == 2
+    assert count(db_path, "gaze") == 2
+    assert writer.stats["failed"] == 1
+
+
+def test_error_raised_by_next_insert(db_path):
+    writer = AsyncWriter(db_path)
+    writer.insert_many("gaze", ["v"], [(None, )])
+    writer._queue.join()
+    with pytest.raises(sqlite3.IntegrityError):
+        writer.insert("trials", {"v": 1})
+    writer.close()
+
+
+def test_open_failure_is_raised(tmp_path):
+    path = os.path.join(str(tmp_path), "missing", "test.db")
+    writer = AsyncWriter(path, max_queue=2)
+    writer._thread.join()
+    # Inserts fail instead of blocking once the queue would be full
+    for _ in range(3):
+        with pytest.raises(sqlite3.OperationalError):
+            writer.insert("trials", {"v": 1})
+    with pytest.raises(sqlite3.OperationalError):
+        writer.close()
+
+
+def test_close_raises_if_rows_unwritten(tmp_path):
+    path = os.path.join(str(tmp_path), "missing", "test.db")
+    writer = AsyncWriter(path)
+    writer._thread.join()
+    writer._fatal = None
+    writer.rows_queued = 3
+    with pytest.raises(RuntimeError):
+        writer.close()
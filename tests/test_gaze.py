@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import numpy as np
+
+from gaze import GazeStream, MISSING_DATA
+
+CENTER = (500, 500)
+
+
+class QueuedReader(object):
+    # Stand-in for the tracker's link queue, returning all queued samples at once
+    def __init__(self):
+        self.queue = []
+
+    def add(self, t, x, y=500):
+        self.queue.append((t, x, y, 1000.0))
+
+    def __call__(self):
+        samples, self.queue = self.queue, []
+        return samples
+
+
+def make_stream(break_ms=10):
+    reader = QueuedReader()
+    return reader, GazeStream(reader, CENTER, 50, break_ms)
+
+
+def test_break_within_batch():
+    reader, stream = make_stream()
+    for t in range(0, 20):
+        reader.add(t, 500 if t < 5 else 600)
+    assert stream.poll()
+    assert len(stream.samples()) == 20
+
+
+def test_short_excursion_is_not_a_break():
+    reader, stream = make_stream()
+    for t in range(0, 20):
+        reader.add(t, 600 if 5 <= t < 12 else 500)
+    assert not stream.poll()
+
+
+def test_run_carries_over_between_batches():
+    # A run of out-of-bounds samples that spans several polls counts from
+    # its first sample
+    reader, stream = make_stream()
+    for t in range(0, 5):
+        reader.add(t, 500)
+    for t in range(5, 10):
+        reader.add(t, 600)
+    assert not stream.poll()
+    for t in range(10, 14):
+        reader.add(t, 600)
+    assert not stream.poll()
+    reader.add(15, 600)
+    assert stream.poll()
+
+
+def test_run_starting_a_batch_carries_over():
+    # A batch that starts out of bounds continues the last batch's run
+    reader, stream = make_stream()
+    reader.add(0, 500)
+    reader.add(1, 600)
+    assert not stream.poll()
+    for t in range(2, 12):
+        reader.add(t, 600)
+    assert stream.poll()
+
+
+def test_return_to_fixation_ends_run():
+    reader, stream = make_stream()
+    for t in range(0, 8):
+        reader.add(t, 600)
+    assert not stream.poll()
+    reader.add(8, 500)
+    for t in range(9, 15):
+        reader.add(t, 600)
+    assert not stream.poll()
+
+
+def test_missing_samples_are_not_breaks():
+    reader, stream = make_stream()
+    for t in range(0, 30):
+        reader.add(t, MISSING_DATA, MISSING_DATA)
+    assert not stream.poll()
+    assert np.isnan(stream.fixation_error())
+
+
+def test_start_trial_drops_queued_samples():
+    # Samples queued during the last trial can't cause a break in the next one
+    reader, stream = make_stream()
+    for t in range(0, 5):
+        reader.add(t, 600)
+    assert not stream.poll()
+    for t in range(5, 30):
+        reader.add(t, 600)
+    stream.start_trial()
+    for t in range(100, 105):
+        reader.add(t, 600)
+    assert not stream.poll()
+    assert len(stream.samples()) == 5
+    assert stream.fixation_error() == 100
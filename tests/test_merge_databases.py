@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import sqlite3
+
+import pytest
+
+from merge_databases import WATERMARK_TABLE, merge_source
+
+SCHEMA = """
+CREATE TABLE participants (id integer primary key, userhash text not null);
+CREATE TABLE trials (id integer primary key, participant_id integer not null, rt real);
+"""
+
+
+def make_station(path, userhash, n_trials):
+    # Creates a station database in WAL mode, like the task's writer does
+    conn = sqlite3.connect(str(path))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    pid = conn.execute("INSERT INTO participants (userhash) VALUES (?)", (userhash, )).lastrowid
+    conn.executemany(
+        "INSERT INTO trials (participant_id, rt) VALUES (?, ?)",
+        [(pid, 300.0 + i) for i in range(n_trials)]
+    )
+    conn.commit()
+    return conn
+
+
+def make_study(path):
+    dest = sqlite3.connect(str(path))
+    dest.execute(
+        "CREATE TABLE {0} (source text not null, tbl text not null, "
+        "last_id integer not null, primary key (source, tbl))".format(WATERMARK_TABLE)
+    )
+    return dest
+
+
+def test_merge_checkpoints_wal(tmp_path):
+    # Rows only in a source's -wal file are still merged
+    station = make_station(tmp_path / "station.db", "abc", 5)
+    assert (tmp_path / "station.db-wal").exists()
+    dest = make_study(tmp_path / "study.db")
+    copied = merge_source(dest, str(tmp_path / "station.db"), "station")
+    assert copied == {"participants": 1, "trials": 5}
+    station.close()
+
+
+@pytest.mark.parametrize("name", ["station?1.db", "station#1.db", "station%201.db"])
+def test_merge_path_with_uri_characters(tmp_path, name):
+    # Paths containing characters with special meaning in URIs can be merged
+    station = make_station(tmp_path / name, "abc", 3)
+    dest = make_study(tmp_path / "study.db")
+    copied = merge_source(dest, str(tmp_path / name), "station")
+    assert copied == {"participants": 1, "trials": 3}
+    station.close()
+
+
+def test_merge_refuses_missing_wal(tmp_path):
+    # A source with a -shm file but no -wal file may be missing rows
+    make_station(tmp_path / "station.db", "abc", 5).close()
+    (tmp_path / "station.db-shm").write_bytes(b"")
+    dest = make_study(tmp_path / "study.db")
+    with pytest.raises(ValueError, match="no -wal file"):
+        merge_source(dest, str(tmp_path / "station.db"), "station")
+
+
+def test_merge_refuses_busy_wal(tmp_path):
+    # A source can't be merged while a session holds a read on its log
+    station = make_station(tmp_path / "station.db", "abc", 5)
+    reader = sqlite3.connect(str(tmp_path / "station.db"))
+    reader.execute("BEGIN")
+    reader.execute("SELECT count(*) FROM trials").fetchone()
+    station.execute("INSERT INTO trials (participant_id, rt) VALUES (1, 1.0)")
+    station.commit()
+    dest = make_study(tmp_path / "study.db")
+    with pytest.raises(ValueError, match="could not checkpoint"):
+        merge_source(dest, str(tmp_path / "station.db"), "station")
+    reader.close()
+    station.close()
+
+
+def test_merge_is_idempotent(tmp_path):
+    # Re-merging a source only copies rows added since the last merge, and
+    # participants from different stations are re-keyed by userhash
+    a = make_station(tmp_path / "a.db", "abc", 3)
+    b = make_station(tmp_path / "b.db", "def", 2)
+    dest = make_study(tmp_path / "study.db")
+    merge_source(dest, str(tmp_path / "a.db"), "a")
+    merge_source(dest, str(tmp_path / "b.db"), "b")
+    assert merge_source(dest, str(tmp_path / "a.db"), "a") == {"participants": 0, "trials": 0}
+
+    a.execute("INSERT INTO trials (participant_id, rt) VALUES (1, 999.0)")
+    a.commit()
+    assert merge_source(dest, str(tmp_path / "a.db"), "a") == {"participants": 0, "trials": 1}
+
+    ids = dict(dest.execute("SELECT userhash, id FROM participants"))
+    counts = dict(dest.execute(
+        "SELECT participant_id, count(*) FROM trials GROUP BY participant_id"
+    ))
+    assert counts == {ids["abc"]: 4, ids["def"]: 2}
+    a.close()
+    b.close()
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import math
+
+import numpy as np
+import pytest
+
+from pupil import P2Quantile, RunningStats
+
+
+@pytest.mark.parametrize("p", [0.05, 0.5, 0.95])
+@pytest.mark.parametrize("dist", ["normal", "gamma", "uniform"])
+def test_p2_matches_percentile(p, dist):
+    # P² estimates should be close to the exact percentile of the stream
+    rng = np.random.default_rng(1)
+    if dist == "normal":
+        data = rng.normal(4000, 300, 20000)
+    elif dist == "gamma":
+        data = rng.gamma(2.0, 500.0, 20000)
+    else:
+        data = rng.uniform(2000, 6000, 20000)
+    q = P2Quantile(p)
+    for x in data.tolist():
+        q.add(x)
+    exact = np.percentile(data, p * 100)
+    spread = np.percentile(data, 97.5) - np.percentile(data, 2.5)
+    assert abs(q.value - exact) < 0.02 * spread
+
+
+def test_p2_linear_stream():
+    # Evenly-spaced values are interpolated exactly, even when sorted
+    q = P2Quantile(0.5)
+    for x in range(1000):
+        q.add(float(x))
+    assert q.value == pytest.approx(np.percentile(np.arange(1000.0), 50), abs=1)
+
+
+@pytest.mark.parametrize("p", [0.05, 0.5, 0.95])
+def test_p2_small_samples_are_exact(p):
+    # Up to exact_n values, estimates match numpy's percentiles exactly (a
+    # luminance ramp step only gets a handful of samples)
+    data = np.random.default_rng(2).normal(4000, 300, 50)
+    q = P2Quantile(p)
+    for n, x in enumerate(data.tolist(), 1):
+        q.add(x)
+        assert q.value == pytest.approx(np.percentile(data[:n], p * 100))
+
+
+@pytest.mark.parametrize("p", [0.05, 0.5, 0.95])
+def test_p2_switch_from_exact(p):
+    # P² markers start from the exact buffer, so estimates stay close after
+    # the switch
+    data = np.random.default_rng(3).normal(4000, 300, 500)
+    q = P2Quantile(p, exact_n=50)
+    for n, x in enumerate(data.tolist(), 1):
+        q.add(x)
+        exact = np.percentile(data[:n], p * 100)
+        if n == 51:
+            assert q.value == pytest.approx(exact)
+        elif n in (60, 100, 500):
+            assert abs(q.value - exact) < 150
+
+
+def test_p2_small_samples():
+    q = P2Quantile(0.5)
+    assert math.isnan(q.value)
+    for x in [5.0, 1.0, 3.0]:
+        q.add(x)
+    assert q.value == 3.0
+
+
+def test_running_stats_ignores_nan():
+    stats = RunningStats()
+    for x in [1.0, float('nan'), 3.0]:
+        stats.add(x)
+    summary = stats.summary()
+    assert summary['n'] == 2
+    assert summary['mean'] == 2.0
+    assert (summary['min'], summary['max']) == (1.0, 3.0)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import pytest
+
+from session_log import TrialInputs
+from replay import check_trials
+
+
+def make_trials(numbers, unfinished=()):
+    trials = []
+    for block, trial in numbers:
+        t = TrialInputs(block, trial, {})
+        if (block, trial) not in unfinished:
+            t.data = {}
+        trials.append(t)
+    return trials
+
+
+def test_check_trials_drops_unfinished_last_trial():
+    trials = make_trials([(1, 1), (1, 2), (2, 1), (2, 2)], unfinished=[(2, 2)])
+    assert [(t.block, t.trial) for t in check_trials(trials)] == [(1, 1), (1, 2), (2, 1)]
+
+
+def test_check_trials_refuses_gap():
+    trials = make_trials([(1, 1), (1, 2), (1, 4)])
+    with pytest.raises(ValueError, match="block 1 has trial 4 where trial 3"):
+        check_trials(trials)
+
+
+def test_check_trials_refuses_recycled_trial():
+    trials = make_trials([(1, 1), (1, 2), (1, 2), (1, 3)], unfinished=[(1, 2)])
+    with pytest.raises(ValueError, match="block 1 trial 2 was not finished"):
+        check_trials(trials)
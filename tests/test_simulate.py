@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+from simulate import load_factors
+
+
+def test_load_factors(tmp_path):
+    # Unweighted levels get a weight of 1, weighted ones keep theirs
+    path = tmp_path / "ind_vars.py"
+    path.write_text(
+        "ivs = IndependentVariableSet()\n"
+        "ivs.add_variable('side', str, ['L', 'R'])\n"
+        "ivs.add_variable('catch', bool, [True, (False, 4)])\n"
+    )
+    factors = load_factors(str(path))
+    assert factors == {
+        'side': [('L', 1), ('R', 1)],
+        'catch': [(True, 1), (False, 4)],
+    }
+
+
+def test_project_factors():
+    factors = load_factors()
+    assert set(factors) == {'probe_location', 'catch_trial', 'cue_validity', 'easy_trial'}
+    assert ('valid', 4) in factors['cue_validity']
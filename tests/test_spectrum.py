@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+__author__ = "Austin Hurst"
+
+import numpy as np
+import pytest
+
+from spectrum import lchuv_to_srgb, build_spectrum, HueIndex, ILLUMINANTS
+
+
+def _colormath_srgb(l, c, h, illuminant):
+    # Converts a single colour with colormath, upscaling its clamped values
+    from colormath.color_objects import LCHuvColor, sRGBColor
+    from colormath.color_conversions import convert_color
+    rgb = convert_color(LCHuvColor(l, c, h, illuminant=illuminant), sRGBColor)
+    values = (rgb.clamped_rgb_r, rgb.clamped_rgb_g, rgb.clamped_rgb_b)
+    return [int(np.floor(0.5 + v * 255)) for v in values]
+
+
+@pytest.mark.parametrize("illuminant", sorted(ILLUMINANTS.keys()))
+def test_matches_colormath(illuminant):
+    pytest.importorskip("colormath")
+    hues = np.arange(0, 360, 5)
+    for l, c in [(75, 59), (50, 30), (90, 10), (30, 20)]:
+        ours = lchuv_to_srgb(l, c, hues, illuminant)
+        ref = np.array([_colormath_srgb(l, c, h, illuminant) for h in hues])
+        assert np.array_equal(ours.astype(int), ref)
+
+
+def test_grey_has_equal_channels():
+    rgb = lchuv_to_srgb(75, 0, 0)[0]
+    assert rgb[0] == rgb[1] == rgb[2]
+
+
+def test_hue_index_round_trip():
+    colors = build_spectrum(75, 59, resolution=2.0)
+    index = HueIndex(colors)
+    for hue in (0, 45, 179):
+        assert index.angle(colors[hue]) == hue * 2